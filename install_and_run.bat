@@ -12,4 +12,5 @@ echo Running migrations...
 python manage.py migrate
 echo.
 echo Starting server...
+start "Outbox dispatcher" python manage.py dispatch_outbox
 python manage.py runserver
\ No newline at end of file
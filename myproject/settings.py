@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,11 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'started.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'started.principal.PrincipalMiddleware',
+    'started.routers.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +61,8 @@ ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for RequestMetricsMiddleware
+        'BACKEND': 'started.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'started.principal.principal',
             ],
         },
     },
@@ -78,9 +86,47 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests instead of reconnecting
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds the sqlite3 driver waits on a locked database
+            'timeout': 20,
+        },
     }
 }
 
+# Take the write lock at BEGIN so concurrent writers queue on busy_timeout
+# instead of failing when upgrading a read transaction (Django 5.1+)
+if django.VERSION >= (5, 1):
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Tests use an in-memory database unless FINDMYROOM_TEST_DB names a file;
+# the concurrency tests need a file (in-memory SQLite can't make racing
+# writers wait on each other)
+if os.environ.get('FINDMYROOM_TEST_DB'):
+    DATABASES['default']['TEST'] = {'NAME': os.environ['FINDMYROOM_TEST_DB']}
+
+# Optional read replica for read-heavy views (see started/routers.py).
+# Set FINDMYROOM_REPLICA_DB to the replica's database file to enable it.
+READ_REPLICA_ALIAS = 'replica'
+READ_REPLICA_STICKY_SECONDS = 5  # Read-your-writes window after a POST
+
+if os.environ.get('FINDMYROOM_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'NAME': os.environ['FINDMYROOM_REPLICA_DB'],
+        # Not default's TEST, which may name FINDMYROOM_TEST_DB's file
+        'TEST': {},
+    }
+
+DATABASE_ROUTERS = ['started.routers.ReplicaRouter']
+
+# PRAGMAs run on every new SQLite connection (see started/sqlite.py);
+# entries here override the defaults, None disables one
+SQLITE_PRAGMAS = {}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,15 +177,99 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Channels Configuration
 ASGI_APPLICATION = 'myproject.asgi.application'
 
+REDIS_URL = os.environ.get('FINDMYROOM_REDIS_URL')
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [('127.0.0.1', 6379)],
+            'hosts': [REDIS_URL or ('127.0.0.1', 6379)],
+        },
+    },
+}
+
+# Shared cache: Redis when configured, otherwise per-process memory (fine
+# for a single worker). started/tiered_cache.py puts an in-process LRU in
+# front of it for the hottest documents.
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'findmyroom',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
+# Workers keep hot cache entries in memory and evict them on messages sent
+# over the channel layer; see started/invalidation.py
+CACHE_INVALIDATION_BUS = os.environ.get('FINDMYROOM_INVALIDATION_BUS', '1') == '1'
+
+# Deliver outbox events from a background thread once their transaction
+# commits; `manage.py dispatch_outbox` retries what this misses
+OUTBOX_DISPATCH_ON_COMMIT = os.environ.get('FINDMYROOM_OUTBOX_ON_COMMIT', '1') == '1'
+
+# Keeps `manage.py test` off Redis; see started/test_runner.py
+TEST_RUNNER = 'started.test_runner.HermeticTestRunner'
+
+# Logging (see started/log.py)
+# 'started.*' loggers write JSON lines through a non-blocking queue handler
+LOG_LEVEL = os.environ.get('FINDMYROOM_LOG_LEVEL', 'INFO')
+# Fraction of DEBUG records kept when LOG_LEVEL is DEBUG
+DEBUG_LOG_SAMPLE_RATE = float(os.environ.get('FINDMYROOM_DEBUG_LOG_SAMPLE_RATE', '0.1'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample_debug': {
+            '()': 'started.log.SampleFilter',
+            'rate': DEBUG_LOG_SAMPLE_RATE,
+        },
+    },
+    'formatters': {
+        'json': {
+            '()': 'started.log.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'started.log.QueueStreamHandler',
+            'formatter': 'json',
+            'filters': ['sample_debug'],
+        },
+    },
+    'loggers': {
+        'started': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
         },
     },
 }
 
+# Request instrumentation (see started/instrumentation.py)
+# Per-view query budgets by URL name; these override @query_budget
+QUERY_BUDGETS = {}
+# Raise instead of logging when a view goes over budget (turned on in tests)
+QUERY_BUDGETS_ENFORCED = False
+# Addresses allowed to scrape /metrics/ without a staff login
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+# Keep filterable room columns in memory (NumPy) in each process and only
+# load the page of rooms being shown (see started/room_index.py)
+ROOM_INDEX_ENABLED = os.environ.get('FINDMYROOM_ROOM_INDEX', '') == '1'
+
+# Conversations idle for this long are moved to MessageArchive by
+# `manage.py archive_messages`
+MESSAGE_ARCHIVE_AFTER_DAYS = 180
+
 # Stripe Configuration (Optional - only needed for card payments)
 STRIPE_PUBLISHABLE_KEY = ''
 STRIPE_SECRET_KEY = ''
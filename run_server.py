@@ -25,8 +25,14 @@ def main():
         print("Press Ctrl+C to stop the server")
         print("=" * 50)
         
+        # Retries emails and notifications that weren't delivered on commit
+        dispatcher = subprocess.Popen([sys.executable, 'manage.py', 'dispatch_outbox'])
+        
         # Start the development server
-        subprocess.run([sys.executable, 'manage.py', 'runserver'], check=True)
+        try:
+            subprocess.run([sys.executable, 'manage.py', 'runserver'], check=True)
+        finally:
+            dispatcher.terminate()
         
     except KeyboardInterrupt:
         print("\nServer stopped.")
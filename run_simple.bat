@@ -2,4 +2,5 @@
 cd /d "C:\myproject"
 pip install -r requirements.txt
 python manage.py migrate
+start "Outbox dispatcher" python manage.py dispatch_outbox
 python manage.py runserver
\ No newline at end of file
@@ -16,6 +16,7 @@ echo To create an admin user, run: python manage.py createsuperuser
 echo.
 
 REM Start the development server
+start "Outbox dispatcher" python manage.py dispatch_outbox
 echo Starting Django development server...
 echo Server will be available at: http://127.0.0.1:8000
 echo Press Ctrl+C to stop the server
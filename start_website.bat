@@ -28,6 +28,7 @@ python manage.py migrate
 
 echo.
 echo [3/3] Starting Django development server...
+start "Outbox dispatcher" python manage.py dispatch_outbox
 echo.
 echo ========================================
 echo   Website URLs:
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Room, Payment, ChatAccess, Message, Owner, Client, UserProfile, ClientPayment
+from django.db.models import Q
+from .models import Room, Payment, ChatAccess, Message, Owner, Client, UserProfile, ClientPayment, Outbox
+from .exports import streaming_export_response
+from .fulltext import fts_query, message_fts_available, message_ids_matching
+from .paginators import EstimatedCountPaginator
 
 
 # Customize the site header, title, index title
@@ -8,48 +12,109 @@ admin.site.site_title = "FindMyRoom Dashboard"
 admin.site.index_title = "Welcome to FindMyRoom Admin Panel"
 
 
+class ExportActionsMixin:
+    """Admin actions that stream the selected rows as CSV or NDJSON"""
+    actions = ['export_as_csv', 'export_as_ndjson']
+
+    @admin.action(description='Export selected as CSV')
+    def export_as_csv(self, request, queryset):
+        return streaming_export_response(queryset, 'csv')
+
+    @admin.action(description='Export selected as NDJSON')
+    def export_as_ndjson(self, request, queryset):
+        return streaming_export_response(queryset, 'ndjson')
+
+
+class ListPerformanceMixin:
+    """Changelist settings that keep large tables cheap to browse
+
+    Each admin also sets list_select_related for the relations shown in
+    list_display (and used by __str__), so a page is a single query.
+    Usernames are searched by prefix (^) so the lookup can use their
+    index; emails keep a substring search so a domain still finds users,
+    and opaque ids must match exactly (=).
+    """
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) behind "N total" on searches
+    show_full_result_count = False
+    list_per_page = 50
+
+
 @admin.register(Room)
-class RoomAdmin(admin.ModelAdmin):
+class RoomAdmin(ExportActionsMixin, ListPerformanceMixin, admin.ModelAdmin):
     list_display = ['title', 'room_type', 'location', 'price', 'created_at']
     list_filter = ['room_type', 'created_at']
     search_fields = ['title', 'location']
+    date_hierarchy = 'created_at'
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(ListPerformanceMixin, admin.ModelAdmin):
     list_display = ['user', 'amount', 'status', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['user__username', 'stripe_payment_intent_id']
+    list_select_related = ['user']
+    search_fields = ['^user__username', '=stripe_payment_intent_id']
 
 @admin.register(ChatAccess)
-class ChatAccessAdmin(admin.ModelAdmin):
+class ChatAccessAdmin(ListPerformanceMixin, admin.ModelAdmin):
     list_display = ['user', 'payment', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
+    list_select_related = ['user', 'payment__user']
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(ExportActionsMixin, ListPerformanceMixin, admin.ModelAdmin):
     list_display = ['sender', 'receiver', 'room', 'content', 'read_status', 'timestamp']
     list_filter = ['read_status', 'timestamp']
-    search_fields = ['sender__username', 'receiver__username', 'content']
+    list_select_related = ['sender', 'receiver', 'room']
+    search_fields = ['^sender__username', '^receiver__username', 'content']
+    date_hierarchy = 'timestamp'
+
+    def get_search_results(self, request, queryset, search_term):
+        # Content goes through the FTS5 index where there is one, instead
+        # of a LIKE scan over every message
+        term = search_term.strip()
+        if not term or not message_fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        matches = Q(sender__username__istartswith=term) | Q(receiver__username__istartswith=term)
+        if fts_query(term):
+            matches |= Q(id__in=message_ids_matching(term))
+        return queryset.filter(matches), False
 
 @admin.register(ClientPayment)
-class ClientPaymentAdmin(admin.ModelAdmin):
+class ClientPaymentAdmin(ExportActionsMixin, ListPerformanceMixin, admin.ModelAdmin):
     list_display = ['client', 'owner', 'room', 'amount', 'status', 'paid_at', 'created_at']
     list_filter = ['status', 'paid_at', 'created_at']
-    search_fields = ['client__user__username', 'owner__user__username', 'transaction_id']
+    list_select_related = ['client__user', 'owner__user', 'room']
+    search_fields = ['^client__user__username', '^owner__user__username', '=transaction_id']
+    date_hierarchy = 'created_at'
 
 @admin.register(Owner)
-class OwnerAdmin(admin.ModelAdmin):
+class OwnerAdmin(ListPerformanceMixin, admin.ModelAdmin):
     list_display = ['user', 'phone', 'created_at']
-    search_fields = ['user__username', 'user__email', 'phone']
+    search_fields = ['^user__username', 'user__email', 'phone']
     list_filter = ['created_at']
+    list_select_related = ['user']
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(ListPerformanceMixin, admin.ModelAdmin):
     list_display = ['user', 'phone', 'preferred_location', 'created_at']
-    search_fields = ['user__username', 'user__email', 'phone', 'preferred_location']
+    search_fields = ['^user__username', 'user__email', 'phone', 'preferred_location']
     list_filter = ['created_at']
+    list_select_related = ['user']
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(ListPerformanceMixin, admin.ModelAdmin):
     list_display = ['user', 'phone_number']
-    search_fields = ['user__username', 'user__email', 'phone_number']
+    search_fields = ['^user__username', 'user__email', 'phone_number']
+    list_select_related = ['user']
+
+@admin.register(Outbox)
+class OutboxAdmin(ListPerformanceMixin, admin.ModelAdmin):
+    list_display = ['id', 'topic', 'created_at', 'dispatched_at', 'attempts', 'last_error']
+    list_filter = ['topic', 'dispatched_at']
+    search_fields = ['=topic']
+    readonly_fields = ['topic', 'payload', 'created_at', 'claimed_by', 'claimed_until', 'dispatched_at', 'attempts', 'last_error']
+    actions = ['retry']
+
+    @admin.action(description='Retry selected events')
+    def retry(self, request, queryset):
+        queryset.filter(dispatched_at__isnull=True).update(attempts=0, claimed_until=None, last_error='')
@@ -0,0 +1,173 @@
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import Booking, ClientPayment, FavoriteRoom, Message, Room, RoomStats
+
+# ============================================================================
+# OWNER ANALYTICS
+# ============================================================================
+# Per-room activity is rolled up into one RoomStats row per room per day by
+# `manage.py rollup_room_stats`. A day is computed with one grouped query
+# per source table (each a range scan on an indexed date column) and
+# written with a single upsert, so re-running a day just refreshes it.
+#
+# Bookings count on the day they were created, by their current status. A
+# booking confirmed or cancelled later changes an older day's counts, so
+# rolling up a day also re-rolls the days of the bookings whose status
+# changed on it (see rollup_days).
+#
+# The owner analytics endpoint and page read two queries: the owner's rooms
+# with their RoomStats totals (a grouped LEFT JOIN) and the daily series.
+
+STAT_FIELDS = ['bookings_pending', 'bookings_confirmed', 'bookings_cancelled', 'unlocks', 'favorites', 'messages']
+DEFAULT_ANALYTICS_DAYS = 30
+MAX_ANALYTICS_DAYS = 365
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _on_day(queryset, date_field, day):
+    start, end = _day_range(day)
+    return queryset.filter(**{f'{date_field}__gte': start, f'{date_field}__lt': end})
+
+
+def compute_room_stats(day):
+    """{room_id: {stat: count}} of the activity on day, in four queries"""
+    stats = {}
+
+    def add(room_id, field, count):
+        stats.setdefault(room_id, dict.fromkeys(STAT_FIELDS, 0))[field] += count
+
+    bookings = _on_day(Booking.objects.order_by(), 'created_at', day)
+    for room_id, status, count in bookings.values('room_id', 'status').annotate(n=Count('id')).values_list('room_id', 'status', 'n'):
+        add(room_id, f'bookings_{status}', count)
+
+    sources = (
+        ('unlocks', _on_day(ClientPayment.objects.filter(status='success'), 'paid_at', day)),
+        ('favorites', _on_day(FavoriteRoom.objects.all(), 'created_at', day)),
+        ('messages', _on_day(Message.objects.all(), 'timestamp', day)),
+    )
+    for field, queryset in sources:
+        # order_by() drops Message's default ordering from the GROUP BY
+        for room_id, count in queryset.order_by().values('room_id').annotate(n=Count('id')).values_list('room_id', 'n'):
+            add(room_id, field, count)
+    return stats
+
+
+def rollup_room_stats(day):
+    """Write (or rewrite) the RoomStats rows for day; returns how many"""
+    stats = compute_room_stats(day)
+    owners = dict(Room.objects.filter(id__in=stats).values_list('id', 'owner_id'))
+    rows = [
+        RoomStats(room_id=room_id, owner_id=owners[room_id], date=day, **counts)
+        for room_id, counts in stats.items() if room_id in owners
+    ]
+    with transaction.atomic():
+        # Rooms with no activity left on a re-run (e.g. rows deleted since)
+        RoomStats.objects.filter(date=day).exclude(room_id__in=owners).delete()
+        RoomStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['room', 'date'],
+            update_fields=STAT_FIELDS + ['owner', 'updated_at'],
+        )
+    return len(rows)
+
+
+def days_with_status_changes(day):
+    """The days bookings were created on, of those whose status changed on day"""
+    changed = _on_day(Booking.objects.order_by(), 'status_changed_at', day)
+    return set(changed.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct())
+
+
+def rollup_days(days):
+    """Roll up days and the earlier days their booking status changes touch
+
+    Returns {day: rooms written}, in date order.
+    """
+    days = set(days)
+    for day in list(days):
+        days |= days_with_status_changes(day)
+    return {day: rollup_room_stats(day) for day in sorted(days)}
+
+
+def increment_room_stats(field, counts):
+    """Add {(room_id, day): n} to RoomStats as events arrive
+
+    Keeps today's rows current between rollups (the outbox dispatcher calls
+    this); the next rollup of a day replaces the counts with exact ones.
+    One INSERT ... ON CONFLICT adds to existing rows, so concurrent
+    dispatchers can't lose each other's increments.
+    """
+    if field not in STAT_FIELDS:
+        raise ValueError(f'Unknown RoomStats field: {field}')
+    owners = dict(Room.objects.filter(id__in={room_id for room_id, _ in counts}).values_list('id', 'owner_id'))
+    rows = [(room_id, day, count) for (room_id, day), count in counts.items() if room_id in owners]
+    if not rows:
+        return
+
+    meta, ops, qn = RoomStats._meta, connection.ops, connection.ops.quote_name
+    table = qn(meta.db_table)
+    columns = [meta.get_field(name).column for name in ['room', 'owner', 'date', *STAT_FIELDS, 'updated_at']]
+    now = ops.adapt_datetimefield_value(timezone.now())
+    params = []
+    for room_id, day, count in rows:
+        params += [room_id, owners[room_id], ops.adapt_datefield_value(day)]
+        params += [count if name == field else 0 for name in STAT_FIELDS]
+        params.append(now)
+
+    column, updated_at = qn(field), qn('updated_at')
+    if connection.vendor == 'mysql':
+        upsert = f'ON DUPLICATE KEY UPDATE {column} = {column} + VALUES({column}), {updated_at} = VALUES({updated_at})'
+    else:
+        # PostgreSQL and SQLite
+        upsert = (
+            f'ON CONFLICT ({qn(meta.get_field("room").column)}, {qn("date")}) DO UPDATE SET '
+            f'{column} = {table}.{column} + excluded.{column}, {updated_at} = excluded.{updated_at}'
+        )
+    row = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(qn(c) for c in columns)}) '
+            f'VALUES {", ".join([row] * len(rows))} {upsert}',
+            params,
+        )
+
+
+def _totals(prefix='', **filters):
+    return {field: Sum(prefix + field, filter=Q(**filters) if filters else None) for field in STAT_FIELDS}
+
+
+def owner_analytics(owner_id, days=DEFAULT_ANALYTICS_DAYS):
+    """Per-room totals and a daily series of an owner's rooms over the last days"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    stats = RoomStats.objects.filter(owner_id=owner_id, date__gte=since)
+    daily = {row['date']: row for row in stats.values('date').annotate(**_totals()).order_by()}
+
+    def counts(row):
+        return {field: row.get(field) or 0 for field in STAT_FIELDS}
+
+    # Every room is listed, including those with no activity yet
+    rooms = [
+        {'room_id': row['id'], 'title': row['title'], **counts(row)}
+        for row in Room.objects.filter(owner_id=owner_id).values('id', 'title').annotate(
+            **_totals('daily_stats__', daily_stats__date__gte=since)
+        ).order_by('title')
+    ]
+    series = []
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        series.append({'date': day.isoformat(), **counts(daily.get(day, {}))})
+
+    return {
+        'since': since.isoformat(),
+        'days': days,
+        'totals': {field: sum(room[field] for room in rooms) for field in STAT_FIELDS},
+        'rooms': rooms,
+        'daily': series,
+    }
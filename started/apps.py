@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class StartedConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'started'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
+        from . import outbox_handlers  # noqa: F401
+        from . import sqlite  # noqa: F401
@@ -0,0 +1,112 @@
+import json
+import zlib
+from datetime import datetime
+from django.db import transaction
+from django.db.models import Max
+from .models import Conversation, Message, MessageArchive
+from .versioning import bump_version
+
+# ============================================================================
+# MESSAGE ARCHIVE
+# ============================================================================
+# Conversations with no message newer than the cutoff are "cold". Their
+# messages are moved into MessageArchive, one compressed row per
+# (conversation, month), keeping their original ids so paging by id works
+# the same across the hot table and the archive.
+
+ARCHIVE_COMPRESSION_LEVEL = 6
+
+
+def serialize_message(message):
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'receiver_id': message.receiver_id,
+        'content': message.content,
+        'image': message.image.name if message.image else None,
+        'read_status': message.read_status,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+
+def compress_messages(rows):
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode(), ARCHIVE_COMPRESSION_LEVEL)
+
+
+def decompress_messages(payload):
+    return json.loads(zlib.decompress(bytes(payload)))
+
+
+def inactive_conversations(cutoff):
+    """Conversations whose newest hot message is older than the cutoff"""
+    return Conversation.objects.annotate(
+        last_message_at=Max('messages__timestamp')
+    ).filter(last_message_at__lt=cutoff)
+
+
+def _write_segment(conversation, month, rows):
+    archive = MessageArchive.objects.select_for_update().filter(
+        conversation=conversation, month=month
+    ).first()
+    if archive is not None:
+        # Merge with a segment from an earlier run
+        rows = sorted(decompress_messages(archive.payload) + rows, key=lambda row: row['id'])
+    else:
+        archive = MessageArchive(conversation=conversation, room_id=conversation.room_id, month=month)
+
+    archive.first_message_id = rows[0]['id']
+    archive.last_message_id = rows[-1]['id']
+    archive.first_timestamp = datetime.fromisoformat(rows[0]['timestamp'])
+    archive.last_timestamp = datetime.fromisoformat(rows[-1]['timestamp'])
+    archive.message_count = len(rows)
+    archive.payload = compress_messages(rows)
+    archive.save()
+
+
+def archive_conversation(conversation, cutoff, chunk_size=2000):
+    """Move the conversation's messages older than cutoff into the archive"""
+    archived = 0
+    with transaction.atomic():
+        messages = conversation.messages.filter(timestamp__lt=cutoff).order_by('id')
+
+        month, rows, ids, participants = None, [], [], set()
+        last_id = 0
+        while True:
+            # Keyset pagination rather than an open cursor, since segments
+            # are written while we read
+            batch = list(messages.filter(id__gt=last_id)[:chunk_size])
+            if not batch:
+                break
+            for message in batch:
+                message_month = message.timestamp.strftime('%Y-%m')
+                if rows and message_month != month:
+                    _write_segment(conversation, month, rows)
+                    rows = []
+                month = message_month
+                rows.append(serialize_message(message))
+                ids.append(message.id)
+                participants.update((message.sender_id, message.receiver_id))
+            last_id = batch[-1].id
+        if rows:
+            _write_segment(conversation, month, rows)
+
+        # Nothing references Message, so skip the collector and the per-row
+        # post_delete signals; these messages are cold by definition
+        for start in range(0, len(ids), chunk_size):
+            batch = Message.objects.filter(id__in=ids[start:start + chunk_size])
+            archived += batch._raw_delete(batch.db)
+        # Nor message_changed: unread counts and inboxes may have changed
+        bump_version(participants, 'messages')
+    return archived
+
+
+def archived_messages(archives, before_id=None):
+    """Yield archived message dicts newest first, optionally older than before_id"""
+    archives = archives.order_by('-last_message_id')
+    if before_id is not None:
+        archives = archives.filter(first_message_id__lt=before_id)
+
+    for segment in archives.iterator():
+        for row in reversed(decompress_messages(segment.payload)):
+            if before_id is None or row['id'] < before_id:
+                yield row
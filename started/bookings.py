@@ -0,0 +1,217 @@
+import logging
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import Booking, Client, Owner
+from . import recommendations
+from .outbox import emit
+from .versioning import bump_version
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# BOOKINGS
+# ============================================================================
+# Every booking status change goes through transition(), a conditional
+#   UPDATE ... SET status = <to> WHERE id IN (...) AND status = <from>
+# so of two concurrent requests for the same change exactly one applies it
+# and the other sees zero rows updated. Only applied transitions notify
+# anyone: they emit a 'booking.changed' outbox event in the same
+# transaction, and the outbox dispatcher sends the emails (see outbox.py).
+#
+# New bookings are created normally (their post_save signals run), but
+# UPDATEs don't send model signals, so _bookings_changed() does what the
+# Booking signal handlers would (version stamps and recommendations).
+
+PENDING, CONFIRMED, CANCELLED = 'pending', 'confirmed', 'cancelled'
+
+# Allowed (from, to) status changes
+TRANSITIONS = {
+    PENDING: {CONFIRMED, CANCELLED},   # owner confirms or rejects; client cancels
+    CANCELLED: {PENDING},              # client requests again
+    CONFIRMED: set(),
+}
+
+OWNER_ACTIONS = {'confirm': CONFIRMED, 'reject': CANCELLED}
+MAX_BULK_BOOKINGS = 100
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def _bookings_changed(rows):
+    """Signal-handler work for (client_id, owner_id, room_id, status) rows"""
+    if not rows:
+        return
+    client_ids = {row[0] for row in rows}
+    owner_ids = {row[1] for row in rows}
+    user_ids = list(Client.objects.filter(pk__in=client_ids).values_list('user_id', flat=True))
+    user_ids += Owner.objects.filter(pk__in=owner_ids).values_list('user_id', flat=True)
+    bump_version(user_ids, 'bookings')
+    for client_id, _, room_id, status in rows:
+        if status == CANCELLED:
+            recommendations.invalidate_recommendations(client_id)
+        else:
+            recommendations.record_interaction(client_id, room_id, 'booking')
+
+
+def transition(booking_ids, from_status, to_status, actor='client', **filters):
+    """Move the bookings in from_status to to_status; returns the ids changed
+
+    Bookings no longer in from_status (changed by a concurrent request) are
+    left alone. Extra filters (e.g. owner_id=...) restrict which may change.
+    actor ('client' or 'owner') decides who is emailed about the change.
+    """
+    if to_status not in TRANSITIONS[from_status]:
+        raise InvalidTransition(f'{from_status} -> {to_status}')
+    with transaction.atomic():
+        bookings = Booking.objects.filter(id__in=booking_ids, status=from_status, **filters)
+        # Locks the rows where the backend supports it; SQLite already holds
+        # the write lock from BEGIN IMMEDIATE
+        rows = list(bookings.select_for_update().values_list('id', 'client_id', 'owner_id', 'room_id'))
+        changed = [row[0] for row in rows]
+        if changed:
+            Booking.objects.filter(id__in=changed, status=from_status).update(
+                status=to_status, status_changed_at=timezone.now(),
+            )
+            emit('booking.changed', booking_ids=changed, status=to_status, actor=actor)
+    _bookings_changed([(client_id, owner_id, room_id, to_status) for _, client_id, owner_id, room_id in rows])
+    return changed
+
+
+def request_booking(client_id, room):
+    """Book a room for a client, or cancel the pending request (a toggle)
+
+    Returns the booking's resulting status, or raises InvalidTransition for
+    a confirmed booking.
+    """
+    current = Booking.objects.filter(client_id=client_id, room=room).values_list('id', 'status').first()
+    if current is None:
+        try:
+            with transaction.atomic():
+                booking = Booking.objects.create(client_id=client_id, room=room, owner_id=room.owner_id, status=PENDING)
+                emit('booking.changed', booking_ids=[booking.id], status=PENDING, actor='client')
+        except IntegrityError:
+            # A concurrent request created it first; that one notifies
+            return Booking.objects.filter(client_id=client_id, room=room).values_list('status', flat=True).first()
+        return PENDING
+
+    booking_id, status = current
+    if status == CONFIRMED:
+        raise InvalidTransition('Booking already confirmed')
+    to_status = CANCELLED if status == PENDING else PENDING
+    if not transition([booking_id], status, to_status):
+        # Changed concurrently; report where it ended up
+        return Booking.objects.filter(pk=booking_id).values_list('status', flat=True).first()
+    return to_status
+
+
+def owner_update_bookings(owner_id, booking_ids, action):
+    """Confirm or reject an owner's pending bookings: (changed ids, skipped ids)"""
+    changed = transition(booking_ids, PENDING, OWNER_ACTIONS[action], actor='owner', owner_id=owner_id)
+    skipped = sorted(set(booking_ids) - set(changed))
+    return changed, skipped
+
+
+# ============================================================================
+# NOTIFICATIONS
+# ============================================================================
+
+def _display_name(user):
+    return user.get_full_name() or user.username
+
+
+def _owner_request_email(booking):
+    room, client = booking.room, booking.client
+    return (
+        f'New Booking Request - {room.title}',
+        f'''Dear {_display_name(booking.owner.user)},
+
+You have received a new booking request for your property:
+
+Property: {room.title}
+Location: {room.location}
+Price: ₹{room.price}/month
+
+Client Details:
+Name: {_display_name(client.user)}
+Email: {client.user.email}
+Phone: {client.phone}
+
+Please contact the client to discuss availability and booking details.
+
+Best regards,
+LuxeRooms Team''',
+        booking.owner.user.email,
+    )
+
+
+def _owner_cancelled_email(booking):
+    room, client = booking.room, booking.client
+    return (
+        f'Booking Cancelled - {room.title}',
+        f'''Dear {_display_name(booking.owner.user)},
+
+A booking request has been cancelled for your property:
+
+Property: {room.title}
+Location: {room.location}
+Price: ₹{room.price}/month
+
+Client: {_display_name(client.user)}
+Email: {client.user.email}
+
+The client has cancelled their booking request.
+
+Best regards,
+LuxeRooms Team''',
+        booking.owner.user.email,
+    )
+
+
+def _client_decision_email(booking, confirmed):
+    room = booking.room
+    decision = 'confirmed' if confirmed else 'declined'
+    return (
+        f'Booking {decision.capitalize()} - {room.title}',
+        f'''Dear {_display_name(booking.client.user)},
+
+Your booking request has been {decision} by the owner:
+
+Property: {room.title}
+Location: {room.location}
+Price: ₹{room.price}/month
+
+Owner: {_display_name(booking.owner.user)}
+Email: {booking.owner.user.email}
+
+Best regards,
+LuxeRooms Team''',
+        booking.client.user.email,
+    )
+
+
+def send_booking_emails(changes):
+    """Email about (booking_ids, status, actor) changes, for the outbox dispatcher"""
+    notifications = {}
+    for booking_ids, to_status, actor in changes:
+        for booking_id in booking_ids:
+            notifications[booking_id] = (to_status, actor)
+    bookings = Booking.objects.filter(id__in=notifications).select_related('room', 'client__user', 'owner__user')
+    for booking in bookings:
+        to_status, actor = notifications[booking.id]
+        if to_status == PENDING:
+            subject, body, recipient = _owner_request_email(booking)
+        elif actor == 'owner':
+            subject, body, recipient = _client_decision_email(booking, to_status == CONFIRMED)
+        else:
+            subject, body, recipient = _owner_cancelled_email(booking)
+        if not recipient:
+            continue
+        try:
+            send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [recipient], fail_silently=False)
+        except Exception:
+            # Not re-raised: a retry of the batch would resend the others
+            logger.exception('Booking email failed', extra={'booking_id': booking.id})
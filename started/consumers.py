@@ -1,8 +1,16 @@
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
-from .models import Room, Message, ClientPayment, Conversation
+from django.db import transaction
+from .models import Room, Message, Conversation
+from .entitlements import has_unlocked
+from .outbox import emit_message_sent
+from .principal import resolve_principal
+from .routers import pin_to_primary
+
+logger = logging.getLogger(__name__)
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -69,16 +77,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
     def check_room_access(self):
         try:
             room = Room.objects.get(id=self.room_id)
+            principal = resolve_principal(self.user)
             
             # Check if user is client with access or room owner
-            if hasattr(self.user, 'client'):
-                return ClientPayment.objects.filter(
-                    client=self.user.client,
-                    room=room,
-                    status='success'
-                ).exists()
-            elif hasattr(self.user, 'owner'):
-                return room.owner == self.user.owner
+            if principal.is_client:
+                return has_unlocked(principal.client_id, room)
+            elif principal.is_owner:
+                return room.owner_id == principal.owner_id
             
             return False
         except Room.DoesNotExist:
@@ -88,37 +93,42 @@ class ChatConsumer(AsyncWebsocketConsumer):
     def save_message(self, content, receiver_id):
         try:
             room = Room.objects.get(id=self.room_id)
+            principal = resolve_principal(self.user)
             
             # Determine receiver
-            if hasattr(self.user, 'client'):
+            if principal.is_client:
                 receiver = room.owner.user
-            elif hasattr(self.user, 'owner'):
+            elif principal.is_owner:
                 receiver = User.objects.get(id=receiver_id)
             else:
                 return None
             
             # Get or create conversation
-            if hasattr(self.user, 'client'):
+            if principal.is_client:
                 conversation, created = Conversation.objects.get_or_create(
-                    client=self.user.client,
-                    owner=room.owner,
+                    client_id=principal.client_id,
+                    owner_id=room.owner_id,
                     room=room
                 )
             else:
                 # Owner sending to client
                 conversation, created = Conversation.objects.get_or_create(
                     client=receiver.client,
-                    owner=self.user.owner,
+                    owner_id=principal.owner_id,
                     room=room
                 )
             
-            message = Message.objects.create(
-                conversation=conversation,
-                sender=self.user,
-                receiver=receiver,
-                room=room,
-                content=content
-            )
+            with transaction.atomic():
+                message = Message.objects.create(
+                    conversation=conversation,
+                    sender=self.user,
+                    receiver=receiver,
+                    room=room,
+                    content=content
+                )
+                emit_message_sent(message)
+            # No response to set the pin cookie on
+            pin_to_primary(self.user.id)
             
             return {
                 'id': message.id,
@@ -130,7 +140,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'is_mine': True
             }
         except Exception as e:
-            print(f"Error saving message: {e}")
+            logger.exception('Error saving message', extra={'room_id': self.room_id, 'user_id': self.user.id})
             return None
 
 class PaymentConsumer(AsyncWebsocketConsumer):
@@ -159,6 +169,15 @@ class PaymentConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
     
+    async def new_message(self, event):
+        # Sent by the outbox dispatcher when this user receives a message
+        await self.send(text_data=json.dumps({
+            'type': 'new_message',
+            'room_id': event.get('room_id'),
+            'message_id': event.get('message_id'),
+            'sender_name': event.get('sender_name', ''),
+        }))
+    
     async def payment_success(self, event):
         # Send payment success notification to WebSocket
         await self.send(text_data=json.dumps({
@@ -2,28 +2,23 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from functools import wraps
-from .models import Owner, Client
 
 def owner_required(view_func):
     @wraps(view_func)
     @login_required
     def _wrapped_view(request, *args, **kwargs):
-        try:
-            request.user.owner
+        if request.principal.is_owner:
             return view_func(request, *args, **kwargs)
-        except Owner.DoesNotExist:
-            messages.error(request, 'Access denied. Owner account required.')
-            return redirect('login')
+        messages.error(request, 'Access denied. Owner account required.')
+        return redirect('login')
     return _wrapped_view
 
 def client_required(view_func):
     @wraps(view_func)
     @login_required
     def _wrapped_view(request, *args, **kwargs):
-        try:
-            request.user.client
+        if request.principal.is_client:
             return view_func(request, *args, **kwargs)
-        except Client.DoesNotExist:
-            messages.error(request, 'Access denied. Client account required.')
-            return redirect('login')
-    return _wrapped_view
\ No newline at end of file
+        messages.error(request, 'Access denied. Client account required.')
+        return redirect('login')
+    return _wrapped_view
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.db import transaction
+from .invalidation import LocalLRU
+from .models import ClientPayment
+
+# ============================================================================
+# ROOM UNLOCK ENTITLEMENTS
+# ============================================================================
+# A client has unlocked a room once their ClientPayment for it is 'success'.
+# The set of unlocked room ids is cached per client so views and the chat
+# consumer don't each hit ClientPayment; signals drop the set once any
+# change commits.
+# Each worker also keeps recent sets in memory, evicted over the
+# invalidation bus ('unlocks' scope, keyed by client id).
+
+UNLOCKED_ROOMS_TIMEOUT = 60 * 60  # 1 hour
+
+_local = LocalLRU('unlocks', maxsize=2000)
+
+
+def _pk(obj):
+    # Accept either a model instance or a raw primary key
+    return int(getattr(obj, 'pk', obj))
+
+
+def _unlocked_rooms_key(client_id):
+    return f'started:unlocked_rooms:{client_id}'
+
+
+def unlocked_rooms(client):
+    """Return the frozenset of room ids the client has paid to unlock"""
+    client_id = _pk(client)
+    return _local.get_or_load(client_id, lambda: _load_unlocked_rooms(client_id))
+
+
+def _load_unlocked_rooms(client_id):
+    key = _unlocked_rooms_key(client_id)
+    room_ids = cache.get(key)
+    if room_ids is None:
+        # Served from the (client, status, room) covering index
+        room_ids = frozenset(
+            ClientPayment.objects.filter(
+                client_id=client_id,
+                status='success'
+            ).values_list('room_id', flat=True)
+        )
+        cache.set(key, room_ids, UNLOCKED_ROOMS_TIMEOUT)
+    return room_ids
+
+
+def has_unlocked(client, room):
+    """True if the client has a successful payment for this room"""
+    return _pk(room) in unlocked_rooms(client)
+
+
+def invalidate_unlocked_rooms(client):
+    """Drop the client's cached set once the current transaction commits
+
+    Deleting it earlier would let a concurrent request cache the old set
+    again before the payment is visible, for UNLOCKED_ROOMS_TIMEOUT.
+    """
+    key = _unlocked_rooms_key(_pk(client))
+    transaction.on_commit(lambda: cache.delete(key))
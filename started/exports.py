@@ -0,0 +1,78 @@
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import Message, ClientPayment, Room
+
+# ============================================================================
+# STREAMING EXPORTS
+# ============================================================================
+# CSV/NDJSON exports for the admin actions and `manage.py export`. Rows are
+# read with values_list().iterator(chunk_size=...) and written one at a time,
+# so memory stays flat however many rows are exported.
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Columns per exportable model; related names are joined in the same query
+EXPORT_FIELDS = {
+    Message: [
+        'id', 'conversation_id', 'room_id', 'sender_id', 'sender__username',
+        'receiver_id', 'receiver__username', 'content', 'read_status', 'timestamp',
+    ],
+    ClientPayment: [
+        'id', 'client_id', 'client__user__username', 'owner_id', 'owner__user__username',
+        'room_id', 'amount', 'status', 'transaction_id', 'esewa_ref_id', 'paid_at', 'created_at',
+    ],
+    Room: [
+        'id', 'title', 'room_type', 'location', 'locality__name', 'price', 'beds', 'baths',
+        'area_m2', 'latitude', 'longitude', 'owner_id', 'created_at', 'updated_at',
+    ],
+}
+
+
+class _Echo:
+    """File-like object whose write() just returns the line (for csv.writer)"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    # Ordered by pk so the export is stable and uses the primary key index
+    return queryset.order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def csv_lines(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in export_rows(queryset, fields, chunk_size):
+        yield writer.writerow(row)
+
+
+def ndjson_lines(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in export_rows(queryset, fields, chunk_size):
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+EXPORT_WRITERS = {
+    'csv': csv_lines,
+    'ndjson': ndjson_lines,
+}
+
+
+def export_lines(queryset, fmt, fields=None, chunk_size=EXPORT_CHUNK_SIZE):
+    fields = fields or EXPORT_FIELDS[queryset.model]
+    return EXPORT_WRITERS[fmt](queryset, fields, chunk_size)
+
+
+def streaming_export_response(queryset, fmt, fields=None):
+    name = queryset.model._meta.model_name
+    filename = f'{name}-{timezone.now():%Y%m%d-%H%M%S}.{fmt}'
+    response = StreamingHttpResponse(export_lines(queryset, fmt, fields), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,84 @@
+from django.db import transaction
+from .models import FavoriteRoom, Room
+from . import invalidation, recommendations
+from .versioning import bump_version
+
+# ============================================================================
+# FAVORITES
+# ============================================================================
+# Favorites are written in bulk: one INSERT ... ON CONFLICT DO NOTHING for
+# the rooms being added and one DELETE for the rooms being removed, whether
+# that's a single toggle or a batch from the dashboard.
+#
+# Bulk writes don't send model signals, so _favorites_changed() does what
+# the FavoriteRoom signal handlers would: bump the client's 'favorites'
+# version (the ETag of /api/favorites/), update their recommendations and
+# evict their ids from every worker's in-memory copy ('favorites' scope).
+
+MAX_BULK_FAVORITES = 100
+
+_local = invalidation.LocalLRU('favorites', maxsize=2000)
+
+
+def favorite_room_ids(client_id):
+    return list(_local.get_or_load(int(client_id), lambda: tuple(
+        FavoriteRoom.objects.filter(client_id=client_id).order_by('room_id').values_list('room_id', flat=True)
+    )))
+
+
+def _delete(client_id, room_ids):
+    rooms = FavoriteRoom.objects.filter(client_id=client_id, room_id__in=room_ids)
+    # A single DELETE, without loading the rows for signal handlers
+    return rooms._raw_delete(rooms.db)
+
+
+def _favorites_changed(client_id, user_id, added, removed):
+    if not added and not removed:
+        return
+    bump_version(user_id, 'favorites')
+    invalidation.publish('favorites', [client_id])
+    if removed:
+        recommendations.invalidate_recommendations(client_id)
+    else:
+        for room_id in added:
+            recommendations.record_interaction(client_id, room_id, 'favorite')
+
+
+def update_favorites(client_id, user_id, add=(), remove=()):
+    """Favorite the rooms in add and unfavorite those in remove
+
+    Unknown room ids are ignored, and an id in both lists is removed.
+    Returns (added, removed): the ids that were inserted (or already
+    favorites) and the number of rows deleted.
+    """
+    remove = set(remove)
+    add = set(add) - remove
+    added, removed = [], 0
+    with transaction.atomic():
+        if add:
+            added = list(Room.objects.filter(id__in=add).order_by().values_list('id', flat=True))
+            FavoriteRoom.objects.bulk_create(
+                [FavoriteRoom(client_id=client_id, room_id=room_id) for room_id in added],
+                ignore_conflicts=True,
+            )
+        if remove:
+            removed = _delete(client_id, remove)
+    _favorites_changed(client_id, user_id, added, removed)
+    return added, removed
+
+
+def toggle_favorite(client_id, user_id, room_id):
+    """Flip one room's favorite state; True if it is now a favorite, None if no such room"""
+    with transaction.atomic():
+        if _delete(client_id, [room_id]):
+            favorited = False
+        elif Room.objects.filter(id=room_id).exists():
+            FavoriteRoom.objects.bulk_create([FavoriteRoom(client_id=client_id, room_id=room_id)], ignore_conflicts=True)
+            favorited = True
+        else:
+            return None
+    if favorited:
+        _favorites_changed(client_id, user_id, [room_id], 0)
+    else:
+        _favorites_changed(client_id, user_id, [], 1)
+    return favorited
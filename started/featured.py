@@ -0,0 +1,54 @@
+import hashlib
+from .models import Room
+from .tiered_cache import cached_view_data
+
+# ============================================================================
+# FEATURED ROOMS
+# ============================================================================
+# The home page shows the newest rooms. The list of ids is precomputed and
+# kept in the cache, refreshed by signals whenever a room or its images
+# change, so anonymous home page hits never query Room for the selection.
+# Workers also hold it in memory until the next 'room' bus message.
+
+FEATURED_ROOMS_COUNT = 6
+HOME_PAGE_TIMEOUT = 60 * 60  # 1 hour
+
+
+def _featured(changed_at=None):
+    rows = list(Room.objects.values_list('id', 'updated_at')[:FEATURED_ROOMS_COUNT])
+    modified = [updated_at for _, updated_at in rows]
+    if changed_at is not None:
+        # A deleted room doesn't show up in rows, so record the change time
+        modified.append(changed_at)
+
+    ids = [room_id for room_id, _ in rows]
+    last_modified = max(modified) if modified else None
+    etag = hashlib.md5(
+        f'{ids}:{last_modified.isoformat() if last_modified else ""}'.encode()
+    ).hexdigest()
+
+    return {'ids': ids, 'last_modified': last_modified, 'etag': etag}
+
+
+# No timeout: signals refresh the entry whenever rooms change
+@cached_view_data('featured_rooms', timeout=None, scope='room', local_size=1)
+def get_featured():
+    return _featured()
+
+
+def refresh_featured_rooms(changed_at=None):
+    """Recompute the featured room ids and when they last changed"""
+    featured = _featured(changed_at)
+    get_featured.store(featured)
+    return featured
+
+
+def featured_rooms():
+    """Return the featured Room objects in display order"""
+    ids = get_featured()['ids']
+    rooms = Room.objects.in_bulk(ids)
+    return [rooms[room_id] for room_id in ids if room_id in rooms]
+
+
+def home_page_key(etag):
+    return f'started:home_page:{etag}'
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.utils import timezone
+from .models import Room
+
+# ============================================================================
+# ROOM CARD FRAGMENT CACHE
+# ============================================================================
+# Room cards are cached with {% cache %} in client_dashboard.html and
+# home.html, keyed on (room.id, room.cache_version). Saving a room changes
+# its version, image changes touch the room's updated_at, and deleting a
+# room drops its fragments outright.
+
+ROOM_CARD_FRAGMENTS = ('room_card', 'home_room_card')
+
+
+def invalidate_room_cards(room_id, version):
+    cache.delete_many([
+        make_template_fragment_key(fragment, [room_id, version])
+        for fragment in ROOM_CARD_FRAGMENTS
+    ])
+
+
+def touch_room(room_id):
+    """Bump a room's updated_at without running Room.save()"""
+    Room.objects.filter(pk=room_id).update(updated_at=timezone.now())
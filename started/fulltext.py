@@ -0,0 +1,47 @@
+import re
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+# ============================================================================
+# MESSAGE FULL-TEXT SEARCH
+# ============================================================================
+# On SQLite, migration 0022 maintains started_message_fts, an FTS5 index
+# over Message.content kept in sync by triggers. Searching it is an index
+# lookup instead of a LIKE '%...%' scan of every message. Elsewhere (or if
+# the table is missing) callers fall back to a normal icontains search.
+
+MESSAGE_FTS_TABLE = 'started_message_fts'
+_TOKEN = re.compile(r'\w+')
+
+_available = {}
+
+
+def message_fts_available(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    key = (using, connection.settings_dict['NAME'])
+    if key not in _available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [MESSAGE_FTS_TABLE])
+            _available[key] = cursor.fetchone() is not None
+    return _available[key]
+
+
+def fts_query(text):
+    """An FTS5 MATCH expression requiring every word of text, the last as a prefix"""
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return None
+    # Quoted so user input can't use FTS operators or cause syntax errors
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def message_ids_matching(text):
+    """A subquery of Message ids whose content matches text, for id__in"""
+    return RawSQL(
+        f'SELECT rowid FROM {MESSAGE_FTS_TABLE} WHERE {MESSAGE_FTS_TABLE} MATCH %s',
+        [fts_query(text)],
+    )
@@ -0,0 +1,115 @@
+from django.contrib.auth.models import User
+from django.db.models import Q, Count, Max
+from .models import Message, Room
+from .tiered_cache import cached_view_data
+
+# ============================================================================
+# INBOX
+# ============================================================================
+# The conversation lists behind /api/client-messages/ and
+# /api/owner-messages/. Both are keyed by the user's 'messages' version
+# (see versioning.py), which every new or read message bumps, so an entry
+# never needs invalidating; it is just no longer asked for. The timeout
+# only bounds how long room titles and profile images may lag.
+
+INBOX_TIMEOUT = 5 * 60
+INBOX_STALE_TIMEOUT = 60 * 60
+
+
+def _preview(message):
+    return message.content[:50] + ('...' if len(message.content) > 50 else '')
+
+
+def _profile_image(user):
+    try:
+        return user.userprofile.get_profile_image()
+    except Exception:
+        return None
+
+
+@cached_view_data('client_inbox', timeout=INBOX_TIMEOUT, stale_timeout=INBOX_STALE_TIMEOUT)
+def client_conversations(user_id, version):
+    """A client's conversations, newest first; version only keys the cache"""
+    # Latest message id per room the client has messages in
+    my_messages = Message.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id))
+    latest_ids = dict(
+        my_messages.values('room_id').annotate(last_id=Max('id')).values_list('room_id', 'last_id')
+    )
+
+    # Fetch everything needed for the list in a constant number of queries
+    latest_messages = Message.objects.in_bulk(latest_ids.values())
+    rooms = Room.objects.select_related('owner__user__userprofile').in_bulk(latest_ids.keys())
+    unread_counts = dict(
+        Message.objects.filter(
+            receiver_id=user_id,
+            read_status=False
+        ).values('room_id').annotate(unread=Count('id')).values_list('room_id', 'unread')
+    )
+
+    conversations = []
+    for room_id, last_id in latest_ids.items():
+        room = rooms.get(room_id)
+        latest_message = latest_messages.get(last_id)
+        if room and latest_message:
+            conversations.append({
+                'room_id': room.id,
+                'room_title': room.title,
+                'owner_id': room.owner.user.id,
+                'owner_name': room.owner.user.get_full_name() or room.owner.user.username,
+                'profile_image': _profile_image(room.owner.user),
+                'room_location': room.location,
+                'last_message': _preview(latest_message),
+                'last_message_time': latest_message.timestamp.isoformat(),
+                'unread_count': unread_counts.get(room_id, 0)
+            })
+
+    conversations.sort(key=lambda x: x['last_message_time'], reverse=True)
+    return conversations
+
+
+@cached_view_data('owner_inbox', timeout=INBOX_TIMEOUT, stale_timeout=INBOX_STALE_TIMEOUT)
+def owner_conversations(owner_id, user_id, version):
+    """An owner's conversations, one per client, newest first; version only keys the cache"""
+    # Latest message id per client who has messaged with the owner
+    threads = Message.objects.filter(
+        room__owner_id=owner_id
+    ).filter(
+        Q(sender__client__isnull=False, receiver_id=user_id) | Q(sender_id=user_id, receiver__client__isnull=False)
+    ).values('sender_id', 'receiver_id').annotate(last_id=Max('id'))
+
+    latest_ids = {}
+    for thread in threads:
+        client_id = thread['receiver_id'] if thread['sender_id'] == user_id else thread['sender_id']
+        latest_ids[client_id] = max(latest_ids.get(client_id, 0), thread['last_id'])
+
+    # Fetch everything needed for the list in a constant number of queries
+    latest_messages = Message.objects.select_related('room').in_bulk(latest_ids.values())
+    client_users = User.objects.select_related('userprofile').in_bulk(latest_ids.keys())
+    unread_counts = dict(
+        Message.objects.filter(
+            room__owner_id=owner_id,
+            sender_id__in=latest_ids.keys(),
+            receiver_id=user_id,
+            read_status=False
+        ).values('sender_id').annotate(unread=Count('id')).values_list('sender_id', 'unread')
+    )
+
+    conversations = []
+    for client_id, last_id in latest_ids.items():
+        client_user = client_users.get(client_id)
+        latest_message = latest_messages.get(last_id)
+        if client_user and latest_message:
+            conversations.append({
+                'room_id': latest_message.room.id,
+                'room_title': latest_message.room.title,
+                'client_id': client_user.id,
+                'room_location': latest_message.room.location,
+                'client_name': client_user.get_full_name() or client_user.username,
+                'profile_image': _profile_image(client_user),
+                'last_message': _preview(latest_message),
+                'last_message_time': latest_message.timestamp.isoformat(),
+                'unread_count': unread_counts.get(client_id, 0)
+            })
+
+    conversations.sort(key=lambda x: x['last_message_time'], reverse=True)
+    return conversations
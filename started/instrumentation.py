@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('started.requests')
+
+# ============================================================================
+# REQUEST INSTRUMENTATION
+# ============================================================================
+# RequestMetricsMiddleware records, per request: query count, DB time,
+# template render time and total latency. Totals are aggregated per URL name
+# and exposed in Prometheus text format (see views.metrics), and each request
+# is logged with its numbers as fields on the 'started.requests' logger.
+#
+# Views can declare a query budget with @query_budget(n) or through
+# settings.QUERY_BUDGETS; with QUERY_BUDGETS_ENFORCED on (e.g. in tests) a
+# request that exceeds its budget raises QueryBudgetExceeded.
+#
+# The two-tier data cache (tiered_cache.py) counts its lookups by cache
+# name and result with record_cache(); they are exported alongside.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = ContextVar('started_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+class _ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.budget_exceeded = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+
+_stats = {}
+_cache_results = {}  # (cache name, result) -> count
+_stats_lock = threading.Lock()
+
+
+def query_budget(max_queries):
+    """Declare the most queries a view may issue per request"""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def record_cache(name, result):
+    """Count one lookup of a cached_view_data cache ('local_hit', 'miss', ...)"""
+    with _stats_lock:
+        _cache_results[name, result] = _cache_results.get((name, result), 0) + 1
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.db_seconds += time.perf_counter() - start
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that times top-level template renders"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+def _budget_for(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if match.url_name in budgets:
+        return budgets[match.url_name]
+    return getattr(match.func, 'query_budget', None)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unresolved'
+        budget = _budget_for(request)
+        over_budget = budget is not None and metrics.queries > budget
+
+        self.record(view, elapsed, metrics, over_budget)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('request', extra={
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': metrics.queries,
+                'db_ms': round(metrics.db_seconds * 1000, 2),
+                'template_ms': round(metrics.template_seconds * 1000, 2),
+                'total_ms': round(elapsed * 1000, 2),
+            })
+
+        if over_budget:
+            message = f'{view} issued {metrics.queries} queries (budget {budget})'
+            if getattr(settings, 'QUERY_BUDGETS_ENFORCED', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def record(self, view, elapsed, metrics, over_budget):
+        with _stats_lock:
+            stats = _stats.get(view)
+            if stats is None:
+                stats = _stats[view] = _ViewStats()
+            stats.requests += 1
+            stats.seconds += elapsed
+            stats.queries += metrics.queries
+            stats.db_seconds += metrics.db_seconds
+            stats.template_seconds += metrics.template_seconds
+            stats.budget_exceeded += over_budget
+            bucket = bisect_left(LATENCY_BUCKETS, elapsed)
+            if bucket < len(LATENCY_BUCKETS):
+                stats.buckets[bucket] += 1
+
+
+def render_prometheus():
+    """Per-view totals in the Prometheus text exposition format"""
+    with _stats_lock:
+        snapshot = sorted(_stats.items())
+        cache_results = sorted(_cache_results.items())
+
+    lines = [
+        '# HELP findmyroom_request_seconds Request latency by view.',
+        '# TYPE findmyroom_request_seconds histogram',
+    ]
+    for view, stats in snapshot:
+        cumulative = 0
+        for le, count in zip(LATENCY_BUCKETS, stats.buckets):
+            cumulative += count
+            lines.append(f'findmyroom_request_seconds_bucket{{view="{view}",le="{le}"}} {cumulative}')
+        lines.append(f'findmyroom_request_seconds_bucket{{view="{view}",le="+Inf"}} {stats.requests}')
+        lines.append(f'findmyroom_request_seconds_sum{{view="{view}"}} {stats.seconds:.6f}')
+        lines.append(f'findmyroom_request_seconds_count{{view="{view}"}} {stats.requests}')
+
+    counters = [
+        ('findmyroom_db_queries_total', 'Database queries issued by view.', 'queries', '{}'),
+        ('findmyroom_db_seconds_total', 'Time spent in database queries by view.', 'db_seconds', '{:.6f}'),
+        ('findmyroom_template_seconds_total', 'Time spent rendering templates by view.', 'template_seconds', '{:.6f}'),
+        ('findmyroom_query_budget_exceeded_total', 'Requests over their query budget by view.', 'budget_exceeded', '{}'),
+    ]
+    for name, help_text, attr, fmt in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for view, stats in snapshot:
+            lines.append(f'{name}{{view="{view}"}} {fmt.format(getattr(stats, attr))}')
+
+    lines.append('# HELP findmyroom_cache_lookups_total Cached view data lookups by cache and result.')
+    lines.append('# TYPE findmyroom_cache_lookups_total counter')
+    for (cache_name, result), count in cache_results:
+        lines.append(f'findmyroom_cache_lookups_total{{cache="{cache_name}",result="{result}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    with _stats_lock:
+        _stats.clear()
+        _cache_results.clear()
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from asgiref.sync import async_to_sync
+from channels import DEFAULT_CHANNEL_LAYER
+from channels.layers import channel_layers, get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CACHE INVALIDATION BUS
+# ============================================================================
+# Hot per-key documents (room details, a client's unlocked rooms and
+# favorites) are also kept in small per-process LRUs in front of the shared
+# cache, so a hit costs no cache round trip. Writes publish a compact
+# message, a scope and the affected ids, to one channel layer group that
+# every ASGI worker joins at startup (see asgi.py), and each worker evicts
+# those ids from the LRUs registered for the scope.
+#
+# A worker only serves from its LRUs while it is subscribed. If the layer
+# is unreachable they are bypassed, so reads go to the shared cache as
+# before, and they are emptied when the subscription is re-established
+# since anything published in between was missed. Entries also expire
+# after LOCAL_MAX_AGE as a safety net for a lost broadcast.
+#
+# The subscriber receives on its own channel layer instance: channels_redis
+# only lets one event loop receive() on an instance at a time, and the
+# shared one belongs to the server loop's consumers.
+
+INVALIDATION_GROUP = 'started.invalidation'
+MESSAGE_TYPE = 'cache.invalidate'
+LOCAL_MAX_AGE = 5 * 60
+# channels_redis drops group memberships after a day; re-join well before
+GROUP_REFRESH_SECONDS = 60 * 60
+RECONNECT_SECONDS = 5
+
+_caches = {}  # scope -> [LocalLRU]
+_subscribed = threading.Event()
+
+
+class LocalLRU:
+    """A bounded per-process cache whose keys are evicted by scope's messages"""
+
+    def __init__(self, scope, maxsize, max_age=LOCAL_MAX_AGE, keyed=True):
+        self.scope = scope
+        self.maxsize = maxsize
+        self.max_age = max_age
+        # keyed=False: any message for the scope empties the cache
+        self.keyed = keyed
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every eviction, so a value loaded before one isn't stored
+        self._generation = 0
+        _caches.setdefault(scope, []).append(self)
+
+    def get(self, key):
+        if not _subscribed.is_set():
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def get_or_load(self, key, load):
+        """The cached value for key, or load() (stored unless evicted meanwhile)"""
+        value = self.get(key)
+        if value is None:
+            generation = self.generation
+            value = load()
+            self.set(key, value, generation)
+        return value
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def set(self, key, value, generation=None):
+        """Store value, unless there was an eviction since generation was read"""
+        if value is None or not _subscribed.is_set():
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.max_age, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def evict(self, keys):
+        if not self.keyed:
+            return self.clear()
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def clear_local_caches():
+    for lrus in _caches.values():
+        for lru in lrus:
+            lru.clear()
+
+
+def apply(message):
+    """Evict a message's ids from the LRUs registered for its scope"""
+    for lru in _caches.get(message.get('scope'), ()):
+        lru.evict(message.get('ids') or ())
+
+
+def publish(scope, ids):
+    """Evict ids from scope's LRUs here now, and in every worker on commit"""
+    ids = sorted({int(pk) for pk in ids if pk is not None})
+    if not ids:
+        return
+    message = {'type': MESSAGE_TYPE, 'scope': scope, 'ids': ids}
+    apply(message)
+    transaction.on_commit(lambda: _broadcast(message))
+
+
+def _broadcast(message):
+    # Again locally: a request may have cached the old value before commit
+    apply(message)
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(INVALIDATION_GROUP, message)
+    except Exception:
+        # Other workers fall back on LOCAL_MAX_AGE
+        logger.warning('Cache invalidation broadcast failed', exc_info=True, extra={'scope': message['scope']})
+
+
+class Subscriber:
+    """Keeps this process in INVALIDATION_GROUP and applies what arrives"""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.channel = None
+
+    async def subscribe(self):
+        self.channel = await self.layer.new_channel()
+        await self.layer.group_add(INVALIDATION_GROUP, self.channel)
+        clear_local_caches()
+        _subscribed.set()
+
+    async def unsubscribe(self):
+        _subscribed.clear()
+        clear_local_caches()
+        if self.channel is not None:
+            channel, self.channel = self.channel, None
+            await self.layer.group_discard(INVALIDATION_GROUP, channel)
+
+    async def receive(self):
+        message = await self.layer.receive(self.channel)
+        if message.get('type') == MESSAGE_TYPE:
+            apply(message)
+        return message
+
+    async def _keep_membership(self):
+        while True:
+            await asyncio.sleep(GROUP_REFRESH_SECONDS)
+            await self.layer.group_add(INVALIDATION_GROUP, self.channel)
+
+    async def run(self):
+        """Receive until cancelled, re-subscribing after layer errors"""
+        while True:
+            keepalive = None
+            try:
+                await self.subscribe()
+                keepalive = asyncio.ensure_future(self._keep_membership())
+                while True:
+                    await self.receive()
+                    if keepalive.done():
+                        keepalive.result()  # Re-raise a failed refresh
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning('Cache invalidation bus disconnected', exc_info=True)
+            finally:
+                if keepalive is not None:
+                    keepalive.cancel()
+                _subscribed.clear()
+                clear_local_caches()
+            self.channel = None
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def subscriber_layer():
+    """A fresh instance of the default channel layer, for the listener thread"""
+    if DEFAULT_CHANNEL_LAYER not in getattr(settings, 'CHANNEL_LAYERS', {}):
+        return None
+    return channel_layers.make_backend(DEFAULT_CHANNEL_LAYER)
+
+
+def start_listener():
+    """Subscribe this worker to the bus from a background thread, once"""
+    global _listener
+    if not getattr(settings, 'CACHE_INVALIDATION_BUS', True):
+        return None
+    with _listener_lock:
+        if _listener is None:
+            layer = subscriber_layer()
+            if layer is None:
+                return None
+            _listener = threading.Thread(
+                target=lambda: asyncio.run(Subscriber(layer).run()),
+                name='cache-invalidation-bus',
+                daemon=True,
+            )
+            _listener.start()
+    return _listener
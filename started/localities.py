@@ -0,0 +1,128 @@
+import threading
+import uuid
+from bisect import bisect_left
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+from .models import Locality
+
+# ============================================================================
+# LOCALITIES
+# ============================================================================
+# Room.location is free text; Room.locality points at its normalized
+# Locality, assigned on save. The search filters and the voice search
+# gazetteer resolve a location to a Locality and filter by locality_id.
+#
+# Autocomplete is served from a per-process sorted array: every word suffix
+# of every locality name ("sanishare road", "road") is a key, so a prefix
+# lookup is two bisections. A version in the cache tells other processes to
+# reload after a locality is added or changed.
+
+AUTOCOMPLETE_LIMIT = 10
+LOCALITY_VERSION_KEY = 'started:localities:version'
+
+
+def normalize_location(location):
+    """(display name, lookup key) for a free-text location"""
+    name = ' '.join((location or '').split(',')[0].split())
+    return name, name.lower()
+
+
+def locality_for_location(location, latitude=None, longitude=None):
+    """The Locality for a location string, created on first use"""
+    name, key = normalize_location(location)
+    if not key:
+        return None
+    locality = Locality.objects.filter(key=key).first()
+    if locality is not None:
+        return locality
+
+    slug = base = slugify(name) or 'locality'
+    suffix = 2
+    while Locality.objects.filter(slug=slug).exists():
+        slug, suffix = f'{base}-{suffix}', suffix + 1
+    try:
+        with transaction.atomic():
+            return Locality.objects.create(name=name, key=key, slug=slug, latitude=latitude, longitude=longitude)
+    except IntegrityError:
+        # Created concurrently
+        return Locality.objects.get(key=key)
+
+
+class LocalityTable:
+    """All localities in memory, for exact resolution and prefix search"""
+
+    def __init__(self, version, localities):
+        self.version = version
+        self.localities = {locality['id']: locality for locality in localities}
+        self.by_name = {}
+        entries = []
+        for locality in localities:
+            self.by_name[locality['key']] = locality
+            self.by_name[locality['slug']] = locality
+            words = locality['key'].split(' ')
+            for start in range(len(words)):
+                entries.append((' '.join(words[start:]), start, locality['name'], locality['id']))
+        # (key, word position, name, id): full-name matches sort before
+        # matches on a later word of the same key
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+    @classmethod
+    def build(cls, version):
+        return cls(version, list(Locality.objects.values('id', 'name', 'key', 'slug', 'latitude', 'longitude')))
+
+    def resolve(self, value):
+        """The locality whose name or slug is value (case-insensitive)"""
+        if not value:
+            return None
+        return self.by_name.get(' '.join(value.split()).lower())
+
+    def complete(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        prefix = ' '.join(prefix.split()).lower()
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        # Every key starting with prefix sorts before prefix + U+FFFF
+        end = bisect_left(self.keys, prefix + '\uffff', lo=start)
+        matches = sorted(self.entries[start:end], key=lambda entry: (entry[1], entry[2]))
+        results, seen = [], set()
+        for _, _, _, locality_id in matches:
+            if locality_id not in seen:
+                seen.add(locality_id)
+                results.append(self.localities[locality_id])
+                if len(results) == limit:
+                    break
+        return results
+
+    def names(self):
+        return [locality['name'] for locality in self.localities.values()]
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def _current_version():
+    version = cache.get(LOCALITY_VERSION_KEY)
+    if version is None:
+        cache.add(LOCALITY_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(LOCALITY_VERSION_KEY)
+    return version
+
+
+def get_locality_table():
+    global _table
+    version = _current_version()
+    table = _table
+    if table is not None and table.version == version:
+        return table
+    with _table_lock:
+        if _table is None or _table.version != version:
+            _table = LocalityTable.build(version)
+        return _table
+
+
+def invalidate_localities():
+    cache.set(LOCALITY_VERSION_KEY, uuid.uuid4().hex, None)
@@ -0,0 +1,37 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from started.archive import archive_conversation, inactive_conversations
+
+
+class Command(BaseCommand):
+    help = 'Move messages of inactive conversations into the compressed MessageArchive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'MESSAGE_ARCHIVE_AFTER_DAYS', 180),
+            help='Archive conversations with no message in this many days'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Messages read/deleted per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        conversations = inactive_conversations(cutoff).select_related('room')
+
+        total_conversations = total_messages = 0
+        # Materialise first: archiving writes to the tables being read
+        for conversation in list(conversations):
+            if options['dry_run']:
+                count = conversation.messages.filter(timestamp__lt=cutoff).count()
+            else:
+                count = archive_conversation(conversation, cutoff, chunk_size=options['chunk_size'])
+            total_conversations += 1
+            total_messages += count
+            self.stdout.write(f'{conversation.room.title}: {count} messages')
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total_messages} messages from {total_conversations} conversations'
+        ))
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from started.sqlite import apply_pragmas, get_sqlite_pragmas
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent SQLite writers/readers with default settings vs the tuned profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads (chat INSERTs)')
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads (inbox queries)')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+
+    def handle(self, *args, **options):
+        db_options = settings.DATABASES['default'].get('OPTIONS', {})
+        profiles = [
+            # Stock sqlite3: rollback journal, the driver's 5 s timeout, reconnect per request
+            ('default', {}, False, 5),
+            # The PRAGMAs and timeout the default database gets, with persistent connections
+            ('tuned', get_sqlite_pragmas(db_options), True, db_options.get('timeout', 5)),
+        ]
+
+        for name, pragmas, persistent, timeout in profiles:
+            result = self.run_profile(pragmas, persistent, timeout, options)
+            self.stdout.write(
+                f"{name:8} writes/s={result['writes'] / options['seconds']:9.1f}  "
+                f"reads/s={result['reads'] / options['seconds']:9.1f}  "
+                f"locked errors={result['errors']}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def run_profile(self, pragmas, persistent, timeout, options):
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        try:
+            setup = sqlite3.connect(path)
+            apply_pragmas(setup, pragmas)
+            setup.execute(
+                'CREATE TABLE message (id INTEGER PRIMARY KEY, room_id INTEGER, '
+                'receiver_id INTEGER, content TEXT, read_status INTEGER, timestamp REAL)'
+            )
+            setup.execute('CREATE INDEX message_receiver ON message (receiver_id, read_status)')
+            setup.commit()
+            setup.close()
+
+            counts = {'writes': 0, 'reads': 0, 'errors': 0}
+            lock = threading.Lock()
+            deadline = time.monotonic() + options['seconds']
+
+            def connect():
+                conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+                apply_pragmas(conn, {k: v for k, v in pragmas.items() if k != 'journal_mode'})
+                return conn
+
+            def worker(kind, seed):
+                conn = connect() if persistent else None
+                done = errors = 0
+                while time.monotonic() < deadline:
+                    c = conn or connect()
+                    try:
+                        if kind == 'writes':
+                            c.execute(
+                                'INSERT INTO message (room_id, receiver_id, content, read_status, timestamp) '
+                                'VALUES (?, ?, ?, 0, ?)',
+                                (seed % 50, seed % 200, 'benchmark message', time.time())
+                            )
+                            c.commit()
+                        else:
+                            c.execute(
+                                'SELECT COUNT(*) FROM message WHERE receiver_id = ? AND read_status = 0',
+                                (seed % 200,)
+                            ).fetchone()
+                        done += 1
+                    except sqlite3.OperationalError:
+                        errors += 1
+                    finally:
+                        if conn is None:
+                            c.close()
+                    seed += 1
+                if conn is not None:
+                    conn.close()
+                with lock:
+                    counts[kind] += done
+                    counts['errors'] += errors
+
+            threads = [threading.Thread(target=worker, args=('writes', i)) for i in range(options['writers'])]
+            threads += [threading.Thread(target=worker, args=('reads', i)) for i in range(options['readers'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return counts
+        finally:
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
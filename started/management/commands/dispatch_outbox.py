@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from started.outbox import OUTBOX_BATCH_SIZE, dispatch_pending, purge_dispatched
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending outbox events (emails, WebSocket pushes, counters, cache refreshes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Deliver what is pending and exit')
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE, help='Events claimed per batch')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when nothing is pending')
+        parser.add_argument(
+            '--keep-days', type=int, default=7,
+            help='Delete delivered events older than this many days (checked hourly)'
+        )
+
+    def handle(self, *args, **options):
+        next_purge = time.monotonic()
+        while True:
+            dispatched = dispatch_pending(options['batch_size'])
+            if dispatched:
+                self.stdout.write(f'Dispatched {dispatched} events')
+
+            if time.monotonic() >= next_purge:
+                purged = purge_dispatched(timezone.now() - timedelta(days=options['keep_days']))
+                if purged:
+                    self.stdout.write(f'Purged {purged} delivered events')
+                next_purge = time.monotonic() + 3600
+
+            if options['once']:
+                break
+            if not dispatched:
+                time.sleep(options['interval'])
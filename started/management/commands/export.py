@@ -0,0 +1,54 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from started.exports import EXPORT_FIELDS, EXPORT_FORMATS, EXPORT_CHUNK_SIZE, export_lines
+
+# Exportable models by command-line name, and the column --days filters on
+EXPORT_MODELS = {
+    model._meta.model_name: model for model in EXPORT_FIELDS
+}
+DATE_FIELDS = {
+    'message': 'timestamp',
+    'clientpayment': 'created_at',
+    'room': 'created_at',
+}
+
+
+class Command(BaseCommand):
+    help = 'Stream messages, client payments or rooms to CSV or NDJSON in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(EXPORT_MODELS))
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', '-o', default='-', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Rows fetched per batch')
+        parser.add_argument('--days', type=int, default=None, help='Only rows from the last N days')
+
+    def handle(self, *args, **options):
+        model = EXPORT_MODELS[options['model']]
+        queryset = model.objects.all()
+        if options['days'] is not None:
+            since = timezone.now() - timedelta(days=options['days'])
+            queryset = queryset.filter(**{f'{DATE_FIELDS[options["model"]]}__gte': since})
+
+        if options['output'] == '-':
+            out, close = self.stdout, False
+        else:
+            try:
+                out, close = open(options['output'], 'w', newline='', encoding='utf-8'), True
+            except OSError as e:
+                raise CommandError(f'Cannot write {options["output"]}: {e}')
+
+        count = 0
+        try:
+            for line in export_lines(queryset, options['format'], chunk_size=options['chunk_size']):
+                out.write(line)
+                count += 1
+        finally:
+            if close:
+                out.close()
+
+        if close:
+            if options['format'] == 'csv':
+                count -= 1  # header
+            self.stderr.write(self.style.SUCCESS(f'Exported {count} rows to {options["output"]}'))
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from started.analytics import rollup_days
+
+
+class Command(BaseCommand):
+    help = 'Materialize daily per-room activity into RoomStats for the owner analytics page'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=2,
+            help='Roll up this many days ending today (default 2, so late events of yesterday are counted); '
+                 'earlier days with bookings whose status changed in that range are re-rolled too'
+        )
+        parser.add_argument('--date', help='Roll up a single day (YYYY-MM-DD) instead')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                days = [date.fromisoformat(options['date'])]
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+        else:
+            if options['days'] < 1:
+                raise CommandError('--days must be at least 1')
+            today = timezone.localdate()
+            days = [today - timedelta(days=offset) for offset in reversed(range(options['days']))]
+
+        rolled = rollup_days(days)
+        for day, rooms in rolled.items():
+            self.stdout.write(f'{day}: {rooms} rooms')
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {len(rolled)} days'))
@@ -0,0 +1,283 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from started.featured import refresh_featured_rooms
+from started.localities import locality_for_location
+from started.recommendations import bump_catalogue
+from started.room_index import invalidate_room_index
+from started.models import UserProfile, Owner, Client, Room, ClientPayment, Conversation, Message
+
+# Localities around Birtamode, Jhapa with approximate centre coordinates
+LOCALITIES = [
+    ('Muktichowk', 26.6436, 87.9925),
+    ('Sanishare Road', 26.6512, 87.9863),
+    ('Mata mandir', 26.6390, 87.9978),
+    ('Sainikmod', 26.6478, 88.0031),
+    ('Birtamode Bazar', 26.6420, 87.9890),
+    ('Charali', 26.6620, 87.9620),
+    ('Anarmani', 26.6350, 87.9800),
+    ('Garamani', 26.6250, 87.9950),
+]
+
+# Typical monthly rent (Rs.) range and layout per room type
+ROOM_TYPES = {
+    'private': (3000, 9000, 1, 1, (12, 25)),
+    '2BHK': (9000, 20000, 2, 1, (45, 80)),
+    '3BHK': (15000, 32000, 3, 2, (70, 120)),
+    'apartment': (20000, 55000, 3, 2, (80, 160)),
+    'house': (30000, 90000, 4, 3, (120, 300)),
+}
+
+ADJECTIVES = ['Cozy', 'Spacious', 'Modern', 'Bright', 'Quiet', 'Furnished', 'Sunny', 'Affordable']
+PHRASES = [
+    'Is this room still available?', 'Can I visit this weekend?', 'Is water included in the rent?',
+    'Yes, it is available.', 'Parking is available for a bike.', 'The deposit is two months of rent.',
+    'Is the neighbourhood quiet at night?', 'Sure, come by any time after 4pm.',
+]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the timestamps we generate instead of now()"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, deterministic dataset (owners, clients, rooms, conversations, messages) for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owners', type=int, default=100)
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--rooms', type=int, default=2000)
+        parser.add_argument('--messages', type=int, default=100000)
+        parser.add_argument('--conversations', type=int, default=None,
+                            help='Unlocked client/room pairs (default: messages / 20)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible data')
+        parser.add_argument('--prefix', default='seed', help='Username prefix for generated users')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        prefix = options['prefix']
+
+        if options['owners'] < 1 or options['clients'] < 1:
+            raise CommandError('At least one owner and one client are required')
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users with prefix "{prefix}_" already exist; pass a different --prefix')
+
+        started = time.monotonic()
+        with transaction.atomic():
+            owner_ids = self.create_owners(prefix, options['owners'])
+            client_ids = self.create_clients(prefix, options['clients'])
+            rooms = self.create_rooms(owner_ids, options['rooms'])
+
+            conversation_count = options['conversations']
+            if conversation_count is None:
+                conversation_count = max(1, options['messages'] // 20)
+            conversations = self.create_conversations(client_ids, rooms, conversation_count)
+            self.create_messages(conversations, options['messages'])
+
+        # bulk_create skips signals, so refresh what they would have
+        refresh_featured_rooms()
+        bump_catalogue()
+        invalidate_room_index()
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.monotonic() - started:.1f}s'))
+
+    def report(self, label, count, since):
+        self.stdout.write(f'{label:14} {count:>9} rows  {time.monotonic() - since:6.2f}s')
+
+    def bulk_create(self, model, objects):
+        count = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            count += len(batch)
+        return count
+
+    def random_past(self, days):
+        return self.now - timedelta(seconds=self.rng.randint(0, days * 86400))
+
+    def create_users(self, prefix, role, count):
+        # Hashing is deliberately slow; every seeded user shares one hash
+        password = make_password('testpass123')
+        self.bulk_create(User, (
+            User(username=f'{prefix}_{role}_{i}', email=f'{prefix}_{role}_{i}@example.com',
+                 first_name=role.title(), last_name=str(i), password=password)
+            for i in range(count)
+        ))
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_{role}_'
+        ).order_by('id').values_list('id', flat=True))
+        self.bulk_create(UserProfile, (UserProfile(user_id=user_id) for user_id in user_ids))
+        return user_ids
+
+    def create_owners(self, prefix, count):
+        since = time.monotonic()
+        user_ids = self.create_users(prefix, 'owner', count)
+        self.bulk_create(Owner, (
+            Owner(user_id=user_id, phone=f'+97798{self.rng.randint(10000000, 99999999)}',
+                  address=f'{self.rng.choice(LOCALITIES)[0]}, Birtamode')
+            for user_id in user_ids
+        ))
+        owners = list(Owner.objects.filter(user_id__in=user_ids).values_list('id', 'user_id'))
+        self.report('owners', len(owners), since)
+        return owners
+
+    def create_clients(self, prefix, count):
+        since = time.monotonic()
+        user_ids = self.create_users(prefix, 'client', count)
+        self.bulk_create(Client, (
+            Client(user_id=user_id, phone=f'+97798{self.rng.randint(10000000, 99999999)}',
+                   preferred_location=self.rng.choice(LOCALITIES)[0])
+            for user_id in user_ids
+        ))
+        clients = list(Client.objects.filter(user_id__in=user_ids).values_list('id', 'user_id'))
+        self.report('clients', len(clients), since)
+        return clients
+
+    def make_room(self, owner_id):
+        room_type = self.rng.choice(list(ROOM_TYPES))
+        low, high, beds, baths, (area_low, area_high) = ROOM_TYPES[room_type]
+        location, lat, lng = self.rng.choice(LOCALITIES)
+        locality_id = self.locality_ids[location]
+        created_at = self.random_past(365)
+        return Room(
+            title=f'{self.rng.choice(ADJECTIVES)} {dict(Room.ROOM_TYPE_CHOICES)[room_type]} in {location}',
+            room_type=room_type,
+            location=location,
+            price=Decimal(self.rng.randrange(low, high, 500)),
+            description=f'{dict(Room.ROOM_TYPE_CHOICES)[room_type]} near {location}, Birtamode.',
+            contact_phone=f'+97798{self.rng.randint(10000000, 99999999)}',
+            contact_email=f'rooms{owner_id}@example.com',
+            area_m2=self.rng.randint(area_low, area_high),
+            beds=max(1, beds + self.rng.randint(-1, 1)),
+            baths=max(1, baths + self.rng.randint(-1, 0)),
+            # Scatter within roughly 1.5 km of the locality centre
+            latitude=Decimal(f'{lat + self.rng.uniform(-0.0135, 0.0135):.8f}'),
+            longitude=Decimal(f'{lng + self.rng.uniform(-0.0135, 0.0135):.8f}'),
+            owner_id=owner_id,
+            # bulk_create skips the signal that normally assigns this
+            locality_id=locality_id,
+            created_at=created_at,
+            updated_at=created_at,
+        )
+
+    def create_rooms(self, owners, count):
+        since = time.monotonic()
+        owner_ids = [owner_id for owner_id, _ in owners]
+        self.locality_ids = {
+            name: locality_for_location(name, Decimal(str(lat)), Decimal(str(lng))).id
+            for name, lat, lng in LOCALITIES
+        }
+        with explicit_timestamps(Room._meta.get_field('created_at'), Room._meta.get_field('updated_at')):
+            self.bulk_create(Room, (self.make_room(self.rng.choice(owner_ids)) for _ in range(count)))
+        owner_users = dict(owners)
+        rooms = [
+            (room_id, owner_id, owner_users[owner_id])
+            for room_id, owner_id in Room.objects.filter(owner_id__in=owner_ids).values_list('id', 'owner_id')
+        ]
+        self.report('rooms', len(rooms), since)
+        return rooms
+
+    def create_conversations(self, clients, rooms, count):
+        """Unlock `count` distinct client/room pairs and open a conversation for each"""
+        since = time.monotonic()
+        count = min(count, len(clients) * len(rooms))
+        pairs = set()
+        while len(pairs) < count:
+            pairs.add((self.rng.randrange(len(clients)), self.rng.randrange(len(rooms))))
+        pairs = sorted(pairs)
+
+        payment_fields = [ClientPayment._meta.get_field('created_at')]
+        conversation_fields = [Conversation._meta.get_field(name) for name in ('created_at', 'updated_at')]
+        opened_at = {pair: self.random_past(365) for pair in pairs}
+
+        with explicit_timestamps(*payment_fields):
+            self.bulk_create(ClientPayment, (
+                ClientPayment(
+                    client_id=clients[c][0], owner_id=rooms[r][1], room_id=rooms[r][0],
+                    amount=Decimal('30.00'), status='success',
+                    transaction_id=f'seed_{clients[c][0]}_{rooms[r][0]}',
+                    paid_at=opened_at[(c, r)], created_at=opened_at[(c, r)],
+                )
+                for c, r in pairs
+            ))
+        with explicit_timestamps(*conversation_fields):
+            self.bulk_create(Conversation, (
+                Conversation(
+                    client_id=clients[c][0], owner_id=rooms[r][1], room_id=rooms[r][0],
+                    created_at=opened_at[(c, r)], updated_at=opened_at[(c, r)],
+                )
+                for c, r in pairs
+            ))
+
+        client_users = dict(clients)
+        room_owner_users = {room_id: owner_user_id for room_id, _, owner_user_id in rooms}
+        conversations = [
+            (conversation_id, room_id, client_users[client_id], room_owner_users[room_id])
+            for conversation_id, room_id, client_id in Conversation.objects.filter(
+                client_id__in=client_users
+            ).values_list('id', 'room_id', 'client_id')
+        ]
+        self.report('conversations', len(conversations), since)
+        return conversations
+
+    def create_messages(self, conversations, count):
+        """Messages dominate the volume, so insert them with executemany()"""
+        since = time.monotonic()
+        columns = ['conversation_id', 'room_id', 'sender_id', 'receiver_id',
+                   'content', 'image', 'read_status', 'timestamp']
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(Message._meta.db_table),
+            ', '.join(connection.ops.quote_name(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        adapt_timestamp = connection.ops.adapt_datetimefield_value
+
+        def rows():
+            for _ in range(count):
+                conversation_id, room_id, client_user_id, owner_user_id = self.rng.choice(conversations)
+                from_client = self.rng.random() < 0.55
+                yield (
+                    conversation_id,
+                    room_id,
+                    client_user_id if from_client else owner_user_id,
+                    owner_user_id if from_client else client_user_id,
+                    self.rng.choice(PHRASES),
+                    '',
+                    self.rng.random() < 0.8,
+                    adapt_timestamp(self.random_past(365)),
+                )
+
+        created = 0
+        with connection.cursor() as cursor:
+            for batch in batched(rows(), self.batch_size):
+                cursor.executemany(sql, batch)
+                created += len(batch)
+        self.report('messages', created, since)
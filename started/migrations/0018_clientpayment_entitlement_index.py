@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('started', '0017_alter_room_latitude_alter_room_longitude_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clientpayment',
+            index=models.Index(fields=['client', 'status', 'room'], name='clientpay_client_status_room'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:43
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def normalize(location):
+    # Same rule as started.localities.normalize_location, frozen here
+    name = ' '.join(location.split(',')[0].split())
+    return name, name.lower()
+
+
+def create_localities(apps, schema_editor):
+    Room = apps.get_model('started', 'Room')
+    Locality = apps.get_model('started', 'Locality')
+
+    groups = {}
+    for room_id, location, latitude, longitude in Room.objects.values_list('id', 'location', 'latitude', 'longitude'):
+        name, key = normalize(location or '')
+        if not key:
+            continue
+        group = groups.setdefault(key, {'name': name, 'rooms': [], 'coordinates': []})
+        group['rooms'].append(room_id)
+        if latitude is not None and longitude is not None:
+            group['coordinates'].append((latitude, longitude))
+
+    slugs = set()
+    for key, group in sorted(groups.items()):
+        slug = base = slugify(group['name']) or 'locality'
+        suffix = 2
+        while slug in slugs:
+            slug, suffix = f'{base}-{suffix}', suffix + 1
+        slugs.add(slug)
+
+        coordinates = group['coordinates']
+        centre = (None, None)
+        if coordinates:
+            centre = tuple(
+                (sum(values) / len(values)).quantize(Decimal('0.00000001'))
+                for values in zip(*coordinates)
+            )
+        locality = Locality.objects.create(
+            name=group['name'], key=key, slug=slug, latitude=centre[0], longitude=centre[1],
+        )
+        room_ids = group['rooms']
+        for start in range(0, len(room_ids), 500):
+            Room.objects.filter(id__in=room_ids[start:start + 500]).update(locality=locality)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('started', '0020_messagearchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Locality',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('key', models.CharField(max_length=200, unique=True)),
+                ('slug', models.SlugField(max_length=200, unique=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=17, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=17, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'localities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='locality',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rooms', to='started.locality'),
+        ),
+        migrations.RunPython(create_localities, migrations.RunPython.noop),
+    ]
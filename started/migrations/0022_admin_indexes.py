@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Full-text index over Message.content for the admin search. SQLite only:
+# an FTS5 table that reads content from started_message (external content)
+# and is kept in sync by triggers. Other databases use the default search.
+MESSAGE_FTS_SQL = [
+    "CREATE VIRTUAL TABLE started_message_fts USING fts5(content, content='started_message', content_rowid='id')",
+    """CREATE TRIGGER started_message_fts_insert AFTER INSERT ON started_message BEGIN
+        INSERT INTO started_message_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER started_message_fts_delete AFTER DELETE ON started_message BEGIN
+        INSERT INTO started_message_fts(started_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER started_message_fts_update AFTER UPDATE OF content ON started_message BEGIN
+        INSERT INTO started_message_fts(started_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO started_message_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    "INSERT INTO started_message_fts(started_message_fts) VALUES ('rebuild')",
+]
+
+DROP_MESSAGE_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS started_message_fts_insert",
+    "DROP TRIGGER IF EXISTS started_message_fts_delete",
+    "DROP TRIGGER IF EXISTS started_message_fts_update",
+    "DROP TABLE IF EXISTS started_message_fts",
+]
+
+
+def create_message_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in MESSAGE_FTS_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_message_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_MESSAGE_FTS_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('started', '0021_locality'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clientpayment',
+            index=models.Index(fields=['created_at'], name='clientpay_created_at'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['timestamp'], name='message_timestamp'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['created_at'], name='room_created_at'),
+        ),
+        migrations.RunPython(create_message_fts, drop_message_fts),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('started', '0022_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings_pending', models.PositiveIntegerField(default=0)),
+                ('bookings_confirmed', models.PositiveIntegerField(default=0)),
+                ('bookings_cancelled', models.PositiveIntegerField(default=0)),
+                ('unlocks', models.PositiveIntegerField(default=0)),
+                ('favorites', models.PositiveIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'room stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at'], name='booking_created_at'),
+        ),
+        migrations.AddIndex(
+            model_name='clientpayment',
+            index=models.Index(fields=['paid_at'], name='clientpay_paid_at'),
+        ),
+        migrations.AddIndex(
+            model_name='favoriteroom',
+            index=models.Index(fields=['created_at'], name='favorite_created_at'),
+        ),
+        migrations.AddField(
+            model_name='roomstats',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='started.owner'),
+        ),
+        migrations.AddField(
+            model_name='roomstats',
+            name='room',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='started.room'),
+        ),
+        migrations.AddIndex(
+            model_name='roomstats',
+            index=models.Index(fields=['owner', 'date'], name='roomstats_owner_date'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='roomstats',
+            unique_together={('room', 'date')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('started', '0024_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outbox',
+            name='handled',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
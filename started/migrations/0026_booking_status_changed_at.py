@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('started', '0025_outbox_handled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='status_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status_changed_at'], name='booking_status_changed_at'),
+        ),
+    ]
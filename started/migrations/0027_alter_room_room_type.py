@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:22
+
+from django.db import migrations, models
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('started', '0026_booking_status_changed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='room',
+            name='room_type',
+            field=models.CharField(choices=[('private', 'Private Room'), ('2BHK', '2BHK'), ('3BHK', '3BHK'), ('apartment', 'Full Apartment'), ('house', 'House')], max_length=20),
+        ),
+    ]
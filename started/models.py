@@ -100,6 +100,24 @@ class Client(models.Model):
 # This is the main model for property listings
 # Contains all information about rooms/properties available for rent
 
+class Locality(models.Model):
+    """Normalized neighbourhood names that rooms are filtered by"""
+    name = models.CharField(max_length=200)
+    # Lowercased, whitespace-collapsed name; what Room.location is matched on
+    key = models.CharField(max_length=200, unique=True)
+    slug = models.SlugField(max_length=200, unique=True)
+    # Centre of the rooms it was derived from, if they had coordinates
+    latitude = models.DecimalField(max_digits=17, decimal_places=8, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=17, decimal_places=8, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'localities'
+    
+    def __str__(self):
+        return self.name
+
 class Room(models.Model):
     """Property listings created by owners"""
     
@@ -144,15 +162,32 @@ class Room(models.Model):
     # Links to the property owner
     owner = models.ForeignKey('Owner', on_delete=models.CASCADE)
     
+    # Normalized from location on save (see localities.py); filtering by
+    # locality is an indexed equality lookup instead of a substring scan
+    locality = models.ForeignKey(Locality, on_delete=models.SET_NULL, null=True, blank=True, related_name='rooms')
+    
     # Automatically set when room is created
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Bumped on every save and whenever the room's images change;
+    # used to version cached renderings of the room
+    updated_at = models.DateTimeField(auto_now=True)
+    
     def __str__(self):
         return self.title
     
+    @property
+    def cache_version(self):
+        # Microsecond timestamp of the last change, for cache keys
+        return int(self.updated_at.timestamp() * 1000000)
+    
     class Meta:
         # Show newest rooms first in admin and queries
         ordering = ['-created_at']
+        indexes = [
+            # Serves the default ordering and the admin date hierarchy
+            models.Index(fields=['created_at'], name='room_created_at'),
+        ]
 
 class Payment(models.Model):
     PAYMENT_STATUS_CHOICES = [
@@ -218,6 +253,14 @@ class ClientPayment(models.Model):
     
     class Meta:
         unique_together = ['client', 'room']
+        indexes = [
+            # Covers the "rooms this client has unlocked" lookup
+            models.Index(fields=['client', 'status', 'room'], name='clientpay_client_status_room'),
+            # Admin date hierarchy and date filtering
+            models.Index(fields=['created_at'], name='clientpay_created_at'),
+            # Daily unlock counts (see analytics.py)
+            models.Index(fields=['paid_at'], name='clientpay_paid_at'),
+        ]
     
     def __str__(self):
         return f'{self.client.user.username} - {self.room.title} - Rs.{self.amount}'
@@ -251,6 +294,40 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Serves the default ordering and the admin date hierarchy
+            models.Index(fields=['timestamp'], name='message_timestamp'),
+        ]
+
+class MessageArchive(models.Model):
+    """
+    One month of a cold conversation's messages, compressed into a single row.
+    Written by `manage.py archive_messages`; the rows it replaces are deleted
+    from Message so the hot table and its indexes stay small.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='archives')
+    room = models.ForeignKey(Room, on_delete=models.CASCADE)
+    month = models.CharField(max_length=7)  # 'YYYY-MM'
+    
+    # Range covered by the segment, so readers can page without decompressing
+    first_message_id = models.BigIntegerField()
+    last_message_id = models.BigIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    message_count = models.IntegerField()
+    
+    # zlib-compressed JSON list of message dicts (see started/archive.py)
+    payload = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['conversation', 'month']
+        indexes = [
+            models.Index(fields=['room', 'last_message_id'], name='msgarchive_room_last_msg'),
+        ]
+    
+    def __str__(self):
+        return f'{self.conversation} - {self.month} ({self.message_count} messages)'
 
 class FavoriteRoom(models.Model):
     """Rooms saved as favorites by clients"""
@@ -260,6 +337,10 @@ class FavoriteRoom(models.Model):
     
     class Meta:
         unique_together = ['client', 'room']
+        indexes = [
+            # Daily favorite counts (see analytics.py)
+            models.Index(fields=['created_at'], name='favorite_created_at'),
+        ]
     
     def __str__(self):
         return f'{self.client.user.username} - {self.room.title}'
@@ -290,9 +371,80 @@ class Booking(models.Model):
     owner = models.ForeignKey('Owner', on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=BOOKING_STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set by bookings.transition(); the analytics rollup re-counts the day
+    # a booking was created on when its status changes later
+    status_changed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         unique_together = ['client', 'room']
+        indexes = [
+            # Daily booking counts (see analytics.py)
+            models.Index(fields=['created_at'], name='booking_created_at'),
+            models.Index(fields=['status_changed_at'], name='booking_status_changed_at'),
+        ]
     
     def __str__(self):
         return f'{self.client.user.username} - {self.room.title} - {self.status}'
+
+class RoomStats(models.Model):
+    """
+    One room's activity on one day, precomputed by `manage.py rollup_room_stats`
+    (see started/analytics.py) so the owner analytics page sums a few rows
+    instead of counting bookings, unlocks, favorites and messages live.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='daily_stats')
+    # Denormalized from room.owner so an owner's rows are one index range
+    owner = models.ForeignKey('Owner', on_delete=models.CASCADE)
+    date = models.DateField()
+    
+    # Bookings requested that day, by their current status
+    bookings_pending = models.PositiveIntegerField(default=0)
+    bookings_confirmed = models.PositiveIntegerField(default=0)
+    bookings_cancelled = models.PositiveIntegerField(default=0)
+    unlocks = models.PositiveIntegerField(default=0)
+    favorites = models.PositiveIntegerField(default=0)
+    messages = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['room', 'date']
+        indexes = [
+            models.Index(fields=['owner', 'date'], name='roomstats_owner_date'),
+        ]
+        verbose_name_plural = 'room stats'
+    
+    def __str__(self):
+        return f'{self.room.title} - {self.date}'
+
+class Outbox(models.Model):
+    """
+    Domain events written in the same transaction as the change they
+    describe, and delivered once it commits, with `manage.py dispatch_outbox`
+    retrying (see started/outbox.py). An event exists only if its change
+    committed.
+    """
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Set by a dispatcher while it delivers the event; a claim that
+    # outlives claimed_until (a crashed dispatcher) is taken over
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Handlers that have already succeeded, so a retry skips them
+    handled = models.JSONField(default=list, blank=True)
+    
+    class Meta:
+        verbose_name_plural = 'outbox'
+        indexes = [
+            # The dispatcher's scan: undelivered events in id order
+            models.Index(fields=['id'], condition=models.Q(dispatched_at__isnull=True), name='outbox_pending'),
+            models.Index(fields=['dispatched_at'], name='outbox_dispatched_at'),
+        ]
+    
+    def __str__(self):
+        return f'{self.topic} #{self.pk}'
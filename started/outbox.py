@@ -0,0 +1,190 @@
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q, F
+from django.utils import timezone
+from .models import Outbox
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# TRANSACTIONAL OUTBOX
+# ============================================================================
+# Writes that have side effects (emails, WebSocket pushes, counters, cache
+# refreshes) call emit() inside their transaction. The event row commits or
+# rolls back with the change and is delivered afterwards, so requests
+# don't wait on side effects and none are lost or sent for a change that
+# was rolled back.
+#
+# With OUTBOX_DISPATCH_ON_COMMIT (the default) the emitting process hands
+# pending events to a background thread as soon as its transaction
+# commits. `manage.py dispatch_outbox` is the retry path: it delivers what
+# that missed (a process exited, a handler failed and is backing off) and
+# purges old events, so run it alongside the server.
+#
+# Dispatchers claim a batch with one UPDATE (a lease, so several can run and
+# a crashed one's batch is picked up again), run the topic handlers on the
+# whole batch, then mark it delivered. Each event records which handlers
+# have succeeded for it, so when one handler fails only that one is retried
+# (with backoff, up to MAX_ATTEMPTS times, then left for inspection in the
+# admin). Delivery is still at-least-once per handler: a dispatcher that
+# crashes mid-batch means the batch is handled again.
+#
+# Handlers are registered with @handles(topic) in outbox_handlers.py.
+
+OUTBOX_BATCH_SIZE = 100
+CLAIM_SECONDS = 60
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30  # Multiplied by the attempt number
+
+_handlers = defaultdict(list)
+
+_drainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox-dispatch')
+_drain_scheduled = False
+_drain_lock = threading.Lock()
+
+
+def _handler_name(handler):
+    return f'{handler.__module__}.{handler.__qualname__}'
+
+
+def handles(topic):
+    """Register a function(events) to receive batches of topic's events"""
+    def decorator(func):
+        _handlers[topic].append(func)
+        return func
+    return decorator
+
+
+def emit(topic, **payload):
+    """Record an event; call inside the transaction making the change"""
+    event = Outbox.objects.create(topic=topic, payload=payload)
+    if getattr(settings, 'OUTBOX_DISPATCH_ON_COMMIT', True):
+        transaction.on_commit(_schedule_drain)
+    return event
+
+
+def _schedule_drain():
+    global _drain_scheduled
+    with _drain_lock:
+        # One queued drain covers every event committed before it runs
+        if _drain_scheduled:
+            return
+        _drain_scheduled = True
+    _drainer.submit(_drain_in_thread)
+
+
+def _drain():
+    global _drain_scheduled
+    with _drain_lock:
+        _drain_scheduled = False
+    try:
+        dispatch_pending()
+    except Exception:
+        # Left for dispatch_outbox
+        logger.exception('Outbox dispatch on commit failed')
+
+
+def _drain_in_thread():
+    try:
+        _drain()
+    finally:
+        connections.close_all()
+
+
+def emit_message_sent(message):
+    return emit(
+        'message.sent', message_id=message.id, room_id=message.room_id,
+        sender_id=message.sender_id, receiver_id=message.receiver_id,
+    )
+
+
+def emit_payment_succeeded(payment, verification_code=None):
+    payload = {'payment_id': payment.id, 'room_id': payment.room_id}
+    if verification_code:
+        payload['verification_code'] = verification_code
+    return emit('payment.succeeded', **payload)
+
+
+def emit_room_changed(room_id, deleted=False):
+    return emit('room.changed', room_id=room_id, deleted=deleted)
+
+
+def _claim(batch_size, now):
+    token = uuid.uuid4().hex
+    available = Outbox.objects.filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+        dispatched_at__isnull=True,
+        attempts__lt=MAX_ATTEMPTS,
+    ).order_by('id')
+    # The LIMIT runs in a subquery, so claiming is a single statement and
+    # two dispatchers can't both claim an event
+    claimed = Outbox.objects.filter(
+        id__in=available.values('id')[:batch_size], dispatched_at__isnull=True,
+    ).filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now)).update(
+        claimed_by=token, claimed_until=now + timedelta(seconds=CLAIM_SECONDS),
+    )
+    if not claimed:
+        return []
+    return list(Outbox.objects.filter(claimed_by=token, dispatched_at__isnull=True).order_by('id'))
+
+
+def dispatch_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """Deliver one batch of pending events; returns how many were claimed"""
+    now = timezone.now()
+    events = _claim(batch_size, now)
+    by_topic = defaultdict(list)
+    for event in events:
+        by_topic[event.topic].append(event)
+
+    errors = {}  # event id -> error of a handler that failed on it
+    for topic, topic_events in by_topic.items():
+        for handler in _handlers.get(topic, []):
+            name = _handler_name(handler)
+            pending = [event for event in topic_events if name not in event.handled]
+            if not pending:
+                continue
+            try:
+                handler(pending)
+            except Exception as e:
+                logger.exception('Outbox handler failed', extra={'topic': topic, 'handler': name, 'events': len(pending)})
+                for event in pending:
+                    errors[event.id] = f'{name}: {type(e).__name__}: {e}'
+            else:
+                for event in pending:
+                    event.handled.append(name)
+
+    delivered = [event.id for event in events if event.id not in errors]
+    if delivered:
+        Outbox.objects.filter(id__in=delivered).update(
+            dispatched_at=timezone.now(), claimed_until=None, attempts=F('attempts') + 1,
+        )
+    for event in events:
+        if event.id in errors:
+            attempts = event.attempts + 1
+            Outbox.objects.filter(id=event.id).update(
+                attempts=attempts, last_error=errors[event.id], handled=event.handled,
+                claimed_until=timezone.now() + timedelta(seconds=RETRY_BACKOFF_SECONDS * attempts),
+            )
+    return len(events)
+
+
+def dispatch_pending(batch_size=OUTBOX_BATCH_SIZE):
+    """Deliver batches until nothing is ready; returns how many were claimed"""
+    total = 0
+    while True:
+        claimed = dispatch_batch(batch_size)
+        total += claimed
+        if claimed < batch_size:
+            return total
+
+
+def purge_dispatched(older_than):
+    """Delete events delivered before older_than (a datetime)"""
+    deleted, _ = Outbox.objects.filter(dispatched_at__lt=older_than).delete()
+    return deleted
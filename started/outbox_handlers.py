@@ -0,0 +1,111 @@
+from collections import Counter
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.utils import timezone
+from .analytics import increment_room_stats
+from .bookings import send_booking_emails
+from .featured import refresh_featured_rooms
+from .models import ClientPayment
+from .outbox import handles
+from .room_details import refresh_room_detail, invalidate_room_detail
+
+# ============================================================================
+# OUTBOX HANDLERS
+# ============================================================================
+# Side effects of the events emitted with outbox.emit(). Each handler gets
+# every event of its topic in the batch being dispatched that it hasn't
+# already handled; keep each one to a single kind of side effect so a
+# retry doesn't repeat the others.
+
+
+def _group_send(group, message):
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(group, message)
+
+
+def _daily_counts(events):
+    return Counter((event.payload['room_id'], timezone.localdate(event.created_at)) for event in events)
+
+
+@handles('message.sent')
+def push_new_messages(events):
+    # Notify the receiver's personal group (see PaymentConsumer)
+    sender_ids = {event.payload['sender_id'] for event in events}
+    names = dict(User.objects.filter(id__in=sender_ids).values_list('id', 'username'))
+    for event in events:
+        payload = event.payload
+        _group_send(f"client_{payload['receiver_id']}", {
+            'type': 'new_message',
+            'room_id': payload['room_id'],
+            'message_id': payload['message_id'],
+            'sender_name': names.get(payload['sender_id'], ''),
+        })
+
+
+@handles('message.sent')
+def count_messages(events):
+    increment_room_stats('messages', _daily_counts(events))
+
+
+def _succeeded_payments(events):
+    return ClientPayment.objects.filter(
+        id__in=[event.payload['payment_id'] for event in events]
+    ).select_related('client__user').in_bulk()
+
+
+@handles('payment.succeeded')
+def email_unlock_codes(events):
+    # Separate from the push, so a failed push doesn't resend the codes
+    payments = _succeeded_payments(events)
+    for event in events:
+        payment = payments.get(event.payload['payment_id'])
+        code = event.payload.get('verification_code')
+        if payment is None or not code or not payment.client.user.email:
+            continue
+        send_mail(
+            'Room Unlock Code',
+            f'Your verification code: {code}\nUse this code to unlock room chat.',
+            settings.DEFAULT_FROM_EMAIL,
+            [payment.client.user.email],
+            fail_silently=True,
+        )
+
+
+@handles('payment.succeeded')
+def push_payments(events):
+    for payment in _succeeded_payments(events).values():
+        _group_send(f'client_{payment.client.user_id}', {
+            'type': 'payment_success',
+            'room_id': payment.room_id,
+            'message': 'Payment successful! Chat unlocked.',
+        })
+
+
+@handles('payment.succeeded')
+def count_unlocks(events):
+    increment_room_stats('unlocks', _daily_counts(events))
+
+
+@handles('booking.changed')
+def email_booking_changes(events):
+    send_booking_emails([
+        (event.payload['booking_ids'], event.payload['status'], event.payload['actor']) for event in events
+    ])
+
+
+@handles('room.changed')
+def refresh_room_caches(events):
+    # Signals already refreshed these when the room was saved, but possibly
+    # before the save committed; doing it again afterwards means no reader
+    # can have cached the old row in between
+    latest = {event.payload['room_id']: event.payload.get('deleted', False) for event in events}
+    for room_id, deleted in latest.items():
+        if deleted:
+            invalidate_room_detail(room_id)
+        else:
+            refresh_room_detail(room_id)
+    refresh_featured_rooms()
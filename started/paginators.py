@@ -0,0 +1,59 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# ============================================================================
+# ESTIMATED-COUNT PAGINATION
+# ============================================================================
+# The admin changelist paginator runs an exact COUNT(*) on every page view,
+# which scans the whole table once messages and payments grow. For an
+# unfiltered changelist the planner's row estimate is close enough to size
+# the page links; filtered changelists count at most COUNT_CAP rows.
+
+# Below this many (estimated) rows an exact count is cheap, so do it
+EXACT_COUNT_THRESHOLD = 10000
+# Filtered counts stop here; the changelist pages through at most this many
+COUNT_CAP = 100000
+
+
+def estimate_row_count(model, using='default'):
+    """Approximate number of rows in model's table, or None if unknown"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [table])
+            row = cursor.fetchone()
+            # reltuples is -1 for a table that has never been analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+        if connection.vendor == 'sqlite':
+            # Largest rowid: an index seek, exact for append-only tables and an
+            # overestimate by the number of deleted rows otherwise
+            pk = connection.ops.quote_name(model._meta.pk.column)
+            cursor.execute(f'SELECT MAX({pk}) FROM {connection.ops.quote_name(table)}')
+            row = cursor.fetchone()
+            return row[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count never scans a large table"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > EXACT_COUNT_THRESHOLD:
+                return estimate
+        # COUNT over a LIMITed subquery stops reading after COUNT_CAP rows
+        return queryset.order_by()[:COUNT_CAP].count()
@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.contrib.auth.models import User
+from django.utils.functional import SimpleLazyObject
+from .models import UserProfile
+
+# ============================================================================
+# REQUEST PRINCIPAL
+# ============================================================================
+# Resolves "who is this user" (role, profile, owner/client ids) once and
+# caches it by user id, so views, decorators, templates and consumers don't
+# each probe request.user.owner / request.user.client / request.user.userprofile.
+
+PRINCIPAL_TIMEOUT = 5 * 60  # 5 minutes
+
+
+class Principal:
+    """Role and profile facts about a user, safe to cache"""
+
+    def __init__(self, user_id=None, profile_id=None, owner_id=None, client_id=None, profile_image=None):
+        self.user_id = user_id
+        self.profile_id = profile_id
+        self.owner_id = owner_id
+        self.client_id = client_id
+        self.profile_image = profile_image
+
+    @property
+    def is_authenticated(self):
+        return self.user_id is not None
+
+    @property
+    def is_owner(self):
+        return self.owner_id is not None
+
+    @property
+    def is_client(self):
+        return self.client_id is not None
+
+    @property
+    def role(self):
+        if self.is_owner:
+            return 'owner'
+        if self.is_client:
+            return 'client'
+        return None
+
+    def __repr__(self):
+        return f'<Principal user={self.user_id} role={self.role}>'
+
+
+ANONYMOUS = Principal()
+
+
+def _principal_key(user_id):
+    return f'started:principal:{user_id}'
+
+
+def _load_principal(user_id):
+    # One LEFT JOIN query for profile, owner and client
+    row = User.objects.filter(pk=user_id).values(
+        'userprofile__id', 'userprofile__profile_image', 'owner__id', 'client__id'
+    ).first()
+    if row is None:
+        return ANONYMOUS
+
+    profile_id = row['userprofile__id']
+    profile_image = row['userprofile__profile_image']
+    if profile_id is None:
+        # Every authenticated user gets a profile
+        profile = UserProfile.objects.create(user_id=user_id)
+        profile_id = profile.id
+
+    return Principal(
+        user_id=user_id,
+        profile_id=profile_id,
+        owner_id=row['owner__id'],
+        client_id=row['client__id'],
+        profile_image=default_storage.url(profile_image) if profile_image else None,
+    )
+
+
+def resolve_principal(user):
+    """Return the (cached) Principal for a user"""
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+
+    key = _principal_key(user.pk)
+    principal = cache.get(key)
+    if principal is None:
+        principal = _load_principal(user.pk)
+        cache.set(key, principal, PRINCIPAL_TIMEOUT)
+    return principal
+
+
+def invalidate_principal(user_id):
+    cache.delete(_principal_key(user_id))
+
+
+class PrincipalMiddleware:
+    """Expose request.principal, resolved lazily on first access"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: resolve_principal(request.user))
+        return self.get_response(request)
+
+
+def principal(request):
+    """Template context processor"""
+    return {'principal': getattr(request, 'principal', ANONYMOUS)}
@@ -0,0 +1,98 @@
+import re
+from .localities import get_locality_table
+
+# ============================================================================
+# NATURAL-LANGUAGE ROOM QUERIES
+# ============================================================================
+# Turns a spoken or typed request ("2bhk in sainikmod under 15k") into the
+# same parameters the dashboard filters use, so voice search runs through
+# search.search_page like everything else.
+#
+# Room types and price/bed phrases use regexes compiled once at import. The
+# location gazetteer is the set of Locality names, recompiled only when the
+# localities change.
+
+_NUMBER = r'(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|lakh|lac)?\b'
+_MULTIPLIERS = {'k': 1000, 'thousand': 1000, 'lakh': 100000, 'lac': 100000}
+_WORD_NUMBERS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'single': 1, 'double': 2}
+_CURRENCY = r'(?:rs\.?|npr|rupees?|₹)?\s*'
+
+PRICE_BETWEEN = re.compile(rf'\b(?:between|from)\s+{_CURRENCY}{_NUMBER}\s*(?:and|to|-)\s*{_CURRENCY}{_NUMBER}')
+PRICE_MAX = re.compile(rf'\b(?:under|below|less than|cheaper than|up ?to|within|max(?:imum)?|budget(?: of)?)\s+{_CURRENCY}{_NUMBER}')
+PRICE_MIN = re.compile(rf'\b(?:over|above|more than|at least|min(?:imum)?|from)\s+{_CURRENCY}{_NUMBER}')
+BEDS = re.compile(r'\b(\d|one|two|three|four|five|single|double)[\s-]*(?:bed(?:room)?s?|beds?)\b')
+
+# Longest phrases first so "2 bhk" wins over a bare number
+ROOM_TYPE_PATTERNS = [
+    (re.compile(r'\b(?:2|two)\s*-?\s*bhk\b'), '2BHK'),
+    (re.compile(r'\b(?:3|three)\s*-?\s*bhk\b'), '3BHK'),
+    (re.compile(r'\b(?:private|single)\s+rooms?\b|\bprivate\b'), 'private'),
+    (re.compile(r'\b(?:full\s+)?(?:apartments?|flats?|studios?)\b'), 'apartment'),
+    (re.compile(r'\b(?:houses?|villas?|bungalows?|whole home)\b'), 'house'),
+]
+
+_PUNCTUATION = re.compile(r"[^\w\s₹.,-]")
+_SPACES = re.compile(r'\s+')
+
+
+def _amount(number, multiplier):
+    value = float(number.replace(',', ''))
+    return int(value * _MULTIPLIERS.get(multiplier or '', 1))
+
+
+def _count(word):
+    return int(word) if word.isdigit() else _WORD_NUMBERS[word]
+
+
+def location_names():
+    # Longest first, so "sanishare road" wins over a shorter name inside it
+    return sorted(get_locality_table().names(), key=lambda name: (-len(name), name.lower()))
+
+
+_gazetteer = (None, None)
+
+
+def _gazetteer_pattern(names):
+    global _gazetteer
+    cached_names, pattern = _gazetteer
+    if cached_names != names:
+        alternatives = '|'.join(re.escape(name.lower()) for name in names if name.strip())
+        pattern = re.compile(rf'\b(?:{alternatives})\b') if alternatives else None
+        _gazetteer = (names, pattern)
+    return pattern
+
+
+def parse_query(text):
+    """Dashboard search params ({'room_type': ..., 'price_max': ...}) for text"""
+    text = _SPACES.sub(' ', _PUNCTUATION.sub(' ', text.lower())).strip()
+    params = {}
+
+    for pattern, room_type in ROOM_TYPE_PATTERNS:
+        if pattern.search(text):
+            params['room_type'] = room_type
+            break
+
+    names = location_names()
+    gazetteer = _gazetteer_pattern(names)
+    match = gazetteer.search(text) if gazetteer else None
+    if match:
+        by_lower = {name.lower(): name for name in names}
+        params['location'] = by_lower[match.group(0)]
+
+    match = PRICE_BETWEEN.search(text)
+    if match:
+        low, high = _amount(*match.group(1, 2)), _amount(*match.group(3, 4))
+        params['price_min'], params['price_max'] = str(min(low, high)), str(max(low, high))
+    else:
+        match = PRICE_MAX.search(text)
+        if match:
+            params['price_max'] = str(_amount(*match.group(1, 2)))
+        match = PRICE_MIN.search(text)
+        if match:
+            params['price_min'] = str(_amount(*match.group(1, 2)))
+
+    match = BEDS.search(text)
+    if match:
+        params['beds_min'] = str(_count(match.group(1)))
+
+    return params
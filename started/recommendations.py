@@ -0,0 +1,274 @@
+import math
+import threading
+import uuid
+import numpy as np
+from django.core.cache import cache
+from django.db.models import CharField, Value
+from .models import Room, FavoriteRoom, ClientPayment, Booking, Conversation
+
+# ============================================================================
+# ROOM RECOMMENDATIONS
+# ============================================================================
+# Every room is a feature vector (log price, area, beds, baths, lat/lng and a
+# one-hot room type), standardized over the catalogue and scaled to unit
+# length. A client's profile is the weighted sum of the vectors of rooms
+# they interacted with; candidates are scored against it in one matrix
+# product (cosine similarity) and the top K are cached per client.
+#
+# New interactions are folded into the cached profile (see signals.py), so
+# a favorite or a chat open costs one matrix-vector product, not a rebuild.
+# Rooms the client has already interacted with are never recommended.
+#
+# Committed room changes are appended to a numbered change log in the
+# cache, and each process re-computes just those rows of its catalogue
+# (standardized with the statistics it was built with) on its next read.
+# Cached lists are kept; they pick a change up when next rebuilt or folded
+# into. bump_catalogue() forces a full rebuild everywhere, e.g. after a
+# bulk load that skipped signals.
+
+INTERACTION_WEIGHTS = {
+    'favorite': 3.0,
+    'unlock': 5.0,
+    'booking': 4.0,
+    'chat': 5.0,
+}
+RECOMMENDATIONS_TOP_K = 50
+RECOMMENDATIONS_TIMEOUT = 60 * 60 * 24
+CATALOGUE_VERSION_KEY = 'started:recommendations:catalogue'
+CATALOGUE_CHANGES_KEY = 'started:recommendations:changes'
+CATALOGUE_CHANGES_TIMEOUT = 60 * 60 * 24
+# More pending changes than this and a process rebuilds instead
+MAX_CATALOGUE_CHANGES = 200
+
+# Relative importance of each feature group in the similarity
+FEATURE_WEIGHTS = {'price': 2.0, 'size': 1.0, 'location': 1.5, 'type': 1.5}
+ROOM_TYPES = [code for code, _ in Room.ROOM_TYPE_CHOICES]
+_ROOM_FIELDS = ('id', 'price', 'area_m2', 'beds', 'baths', 'latitude', 'longitude', 'room_type')
+
+
+def _recommendations_key(client_id):
+    return f'started:recommendations:{client_id}'
+
+
+def _numeric(rows):
+    """The numeric features of _ROOM_FIELDS rows; missing coordinates are NaN"""
+    return np.array([
+        [math.log1p(float(price)), area, beds, baths,
+         float(lat) if lat is not None else np.nan,
+         float(lng) if lng is not None else np.nan]
+        for _, price, area, beds, baths, lat, lng, _ in rows
+    ], dtype=np.float64).reshape(len(rows), 6)
+
+
+def _vectors(rows, means, stds, numeric=None):
+    """Unit-length feature vectors of rows, standardized with means and stds"""
+    numeric = _numeric(rows) if numeric is None else numeric
+    # Rooms without coordinates sit at the catalogue mean
+    numeric = np.where(np.isnan(numeric), means, numeric)
+    numeric = (numeric - means) / np.where(stds > 0, stds, 1.0)
+
+    numeric[:, 0] *= FEATURE_WEIGHTS['price']
+    numeric[:, 1:4] *= FEATURE_WEIGHTS['size']
+    numeric[:, 4:6] *= FEATURE_WEIGHTS['location']
+
+    types = np.zeros((len(rows), len(ROOM_TYPES)))
+    for row, (*_, room_type) in enumerate(rows):
+        if room_type in ROOM_TYPES:
+            types[row, ROOM_TYPES.index(room_type)] = FEATURE_WEIGHTS['type']
+
+    vectors = np.hstack([numeric, types])
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms > 0, norms, 1.0)
+    return vectors.astype(np.float32)
+
+
+class RoomCatalogue:
+    """Unit-length feature vectors for every room, one row per room
+
+    seq is the last change log entry the catalogue includes.
+    """
+
+    def __init__(self, version, ids, vectors, means, stds, seq=0):
+        self.version = version
+        self.ids = ids
+        self.vectors = vectors
+        self.means = means
+        self.stds = stds
+        self.seq = seq
+        self.rows = {room_id: row for row, room_id in enumerate(ids.tolist())}
+
+    @classmethod
+    def build(cls, version, seq=0):
+        rows = list(Room.objects.order_by('id').values_list(*_ROOM_FIELDS))
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        numeric = _numeric(rows)
+        present = ~np.isnan(numeric)
+        counts = present.sum(axis=0)
+        means = np.where(counts > 0, np.nansum(numeric, axis=0) / np.maximum(counts, 1), 0.0)
+        stds = np.where(present, numeric, means).std(axis=0) if rows else np.ones(6)
+        return cls(version, ids, _vectors(rows, means, stds, numeric), means, stds, seq)
+
+    def updated(self, seq, room_ids):
+        """A copy with room_ids' rows re-read (dropped if the room is gone)"""
+        rows = list(Room.objects.filter(id__in=room_ids).values_list(*_ROOM_FIELDS))
+        keep = ~np.isin(self.ids, np.fromiter(room_ids, dtype=np.int64))
+        ids = np.concatenate([self.ids[keep], np.array([row[0] for row in rows], dtype=np.int64)])
+        vectors = np.vstack([self.vectors[keep], _vectors(rows, self.means, self.stds)])
+        return RoomCatalogue(self.version, ids, vectors, self.means, self.stds, seq)
+
+    def vector(self, room_id):
+        row = self.rows.get(room_id)
+        return None if row is None else self.vectors[row]
+
+    def top_k(self, profile, k, exclude=()):
+        """Room ids and cosine scores of the k rooms closest to profile, except exclude's"""
+        norm = np.linalg.norm(profile)
+        if not len(self.ids) or norm == 0:
+            return [], []
+        scores = self.vectors @ (profile / norm).astype(np.float32)
+        if exclude:
+            excluded = np.isin(self.ids, np.fromiter(exclude, dtype=np.int64))
+            scores[excluded] = -np.inf
+            k = min(k, len(scores) - int(excluded.sum()))
+        k = min(k, len(scores))
+        if k <= 0:
+            return [], []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return self.ids[top].tolist(), [round(float(score), 4) for score in scores[top]]
+
+
+# Built once per process and rebuilt when the shared version changes
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def catalogue_version():
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue():
+    """Rebuild every catalogue and cached list, e.g. after a bulk load"""
+    cache.set(CATALOGUE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _change_key(seq):
+    return f'{CATALOGUE_CHANGES_KEY}:{seq}'
+
+
+def room_changed(room_id):
+    """Log a committed room change for every process's catalogue"""
+    cache.add(CATALOGUE_CHANGES_KEY, 0, None)
+    seq = cache.incr(CATALOGUE_CHANGES_KEY)
+    cache.set(_change_key(seq), room_id, CATALOGUE_CHANGES_TIMEOUT)
+
+
+def _changed_rooms(since, until):
+    """Room ids logged after since up to until, or None if any have expired"""
+    if until - since > MAX_CATALOGUE_CHANGES:
+        return None
+    keys = [_change_key(seq) for seq in range(since + 1, until + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return set(changes.values())
+
+
+def get_catalogue(version=None):
+    global _catalogue
+    version = version or catalogue_version()
+    seq = cache.get(CATALOGUE_CHANGES_KEY, 0)
+    current = _catalogue
+    if current is not None and current.version == version and current.seq == seq:
+        return current
+    with _catalogue_lock:
+        current = _catalogue
+        if current is None or current.version != version or current.seq > seq:
+            _catalogue = RoomCatalogue.build(version, seq)
+        elif current.seq < seq:
+            room_ids = _changed_rooms(current.seq, seq)
+            if room_ids is None:
+                _catalogue = RoomCatalogue.build(version, seq)
+            else:
+                _catalogue = current.updated(seq, room_ids)
+        return _catalogue
+
+
+def client_interactions(client_id):
+    """Distinct (kind, room_id) pairs the client has interacted with"""
+    sources = [
+        ('favorite', FavoriteRoom.objects.filter(client_id=client_id)),
+        ('unlock', ClientPayment.objects.filter(client_id=client_id, status='success')),
+        ('booking', Booking.objects.filter(client_id=client_id).exclude(status='cancelled')),
+        ('chat', Conversation.objects.filter(client_id=client_id)),
+    ]
+    querysets = [
+        queryset.annotate(kind=Value(kind, output_field=CharField())).values_list('kind', 'room_id')
+        for kind, queryset in sources
+    ]
+    # One UNION query instead of one per source
+    return set(querysets[0].union(*querysets[1:]))
+
+
+def _store(client_id, catalogue, profile, seen):
+    ids, scores = catalogue.top_k(profile, RECOMMENDATIONS_TOP_K, exclude={room_id for _, room_id in seen})
+    entry = {
+        'catalogue': catalogue.version,
+        'profile': profile.tolist(),
+        'seen': sorted(seen),
+        'ids': ids,
+        'scores': scores,
+    }
+    cache.set(_recommendations_key(client_id), entry, RECOMMENDATIONS_TIMEOUT)
+    return entry
+
+
+def _rebuild(client_id, catalogue):
+    seen = client_interactions(client_id)
+    profile = np.zeros(catalogue.vectors.shape[1], dtype=np.float64)
+    for kind, room_id in seen:
+        vector = catalogue.vector(room_id)
+        if vector is not None:
+            profile += INTERACTION_WEIGHTS[kind] * vector
+    return _store(client_id, catalogue, profile, seen)
+
+
+def recommendations(client_id):
+    """Cached {'ids': [...], 'scores': [...]} for the client, best first"""
+    key = _recommendations_key(client_id)
+    cached = cache.get_many([key, CATALOGUE_VERSION_KEY])
+    entry = cached.get(key)
+    version = cached.get(CATALOGUE_VERSION_KEY)
+    if entry is not None and version is not None and entry['catalogue'] == version:
+        return entry
+    return _rebuild(client_id, get_catalogue(version))
+
+
+def record_interaction(client_id, room_id, kind):
+    """Fold one new interaction into the client's cached profile"""
+    key = _recommendations_key(client_id)
+    entry = cache.get(key)
+    version = catalogue_version()
+    if entry is None or entry['catalogue'] != version:
+        # Nothing current to update; build it on the next read
+        cache.delete(key)
+        return
+    catalogue = get_catalogue(version)
+    seen = {tuple(pair) for pair in entry['seen']}
+    if (kind, room_id) in seen:
+        return
+    seen.add((kind, room_id))
+    profile = np.array(entry['profile'])
+    vector = catalogue.vector(room_id)
+    if vector is not None:
+        profile += INTERACTION_WEIGHTS[kind] * vector
+    _store(client_id, catalogue, profile, seen)
+
+
+def invalidate_recommendations(client_id):
+    # Removed interactions can't be subtracted reliably; rebuild on next read
+    cache.delete(_recommendations_key(client_id))
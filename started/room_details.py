@@ -0,0 +1,62 @@
+import hashlib
+from .models import Room
+from .tiered_cache import cached_view_data
+
+# ============================================================================
+# ROOM DETAIL DOCUMENTS
+# ============================================================================
+# The payload behind /api/room/<id>/ (opened by the chat UI and the image
+# gallery) is serialized once per room version and kept in the cache, so a
+# request costs at most one cache read (see tiered_cache.py; workers keep
+# recent documents in memory, evicted over the 'room' bus scope). Signals
+# rebuild it when the room or its images change, and the ETag is derived
+# from room.cache_version.
+#
+# Image URLs are relative so the document doesn't depend on the request host.
+
+ROOM_DETAIL_TIMEOUT = 24 * 60 * 60  # safety net; signals keep it current
+ROOM_DETAIL_MAX_AGE = 5 * 60
+# Served when the request names the current version (?v=), which can't change
+ROOM_DETAIL_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def build_room_detail(room):
+    images = [image.image.url for image in room.images.all()]
+    if not images and room.image:
+        images = [room.image.url]
+
+    owner_user = room.owner.user
+    version = room.cache_version
+    return {
+        'version': version,
+        'etag': hashlib.md5(f'{room.pk}:{version}'.encode()).hexdigest(),
+        'data': {
+            'owner_name': owner_user.get_full_name() or owner_user.username,
+            'room_title': room.title,
+            'images': images,
+            'location': room.location,
+            # Decimal to string for JSON serialization
+            'latitude': str(room.latitude) if room.latitude is not None else None,
+            'longitude': str(room.longitude) if room.longitude is not None else None,
+        },
+    }
+
+
+@cached_view_data('room_detail', timeout=ROOM_DETAIL_TIMEOUT, stale_timeout=60 * 60, scope='room', local_size=1000)
+def room_detail(room_id):
+    """The document for a room, or None if there is no such room"""
+    room = Room.objects.select_related('owner__user').prefetch_related('images').filter(pk=room_id).first()
+    return build_room_detail(room) if room is not None else None
+
+
+def refresh_room_detail(room_id):
+    """Rebuild and store the document; returns None if the room is gone"""
+    return room_detail.refresh(int(room_id))
+
+
+def get_room_detail(room_id):
+    return room_detail(int(room_id))
+
+
+def invalidate_room_detail(room_id):
+    room_detail.invalidate(int(room_id))
@@ -0,0 +1,180 @@
+import threading
+import uuid
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import Room
+
+# ============================================================================
+# IN-MEMORY ROOM INDEX
+# ============================================================================
+# Optional (settings.ROOM_INDEX_ENABLED). Each process keeps the filterable
+# room columns in NumPy arrays, so dashboard filtering and sorting are a few
+# vectorized masks and the database is only asked for the page of rooms
+# being shown (see search.search_page).
+#
+# Once a room change commits, it is applied to the local index and a shared
+# version in the cache is bumped; other processes notice the new version on
+# their next search and rebuild.
+
+INDEX_VERSION_KEY = 'started:room_index:version'
+ROOM_TYPES = [code for code, _ in Room.ROOM_TYPE_CHOICES]
+_FIELDS = ('id', 'price', 'area_m2', 'beds', 'baths', 'room_type', 'location',
+           'latitude', 'longitude', 'created_at', 'locality_id')
+# RoomIndex attributes holding each position of a _row(), and their dtypes
+_COLUMNS = (('ids', np.int64), ('price', np.float64), ('area', np.int32), ('beds', np.int32),
+            ('baths', np.int32), ('room_type', np.int8), ('location', str), ('latitude', np.float64),
+            ('longitude', np.float64), ('created', np.float64), ('locality', np.int64))
+
+
+def room_index_enabled():
+    return getattr(settings, 'ROOM_INDEX_ENABLED', False)
+
+
+def _row(values):
+    room_id, price, area, beds, baths, room_type, location, lat, lng, created_at, locality_id = values
+    return (
+        room_id, float(price), area, beds, baths,
+        ROOM_TYPES.index(room_type) if room_type in ROOM_TYPES else -1,
+        location.lower(),
+        float(lat) if lat is not None else np.nan,
+        float(lng) if lng is not None else np.nan,
+        created_at.timestamp(),
+        locality_id if locality_id is not None else -1,
+    )
+
+
+class RoomIndex:
+    """Column arrays of every room, kept newest first like Room.Meta.ordering"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self._set_columns(rows)
+
+    @classmethod
+    def build(cls, version):
+        return cls(version, [_row(values) for values in Room.objects.values_list(*_FIELDS)])
+
+    def _set_columns(self, rows):
+        rows = sorted(rows, key=lambda row: (-row[9], -row[0]))
+        columns = list(zip(*rows)) or [()] * len(_COLUMNS)
+        for (name, dtype), values in zip(_COLUMNS, columns):
+            setattr(self, name, np.array(values, dtype=dtype))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _fit_location(self, location):
+        # Fixed-width strings; widen rather than truncate a longer one
+        if len(location) > self.location.dtype.itemsize // 4:
+            self.location = self.location.astype(f'<U{len(location)}')
+
+    def replace(self, version, room_id, values=None):
+        """The index with one room replaced (or removed when values is None)
+
+        A room that keeps its place in the order is updated in place, so a
+        search running meanwhile may see that one row half written. Adding or
+        removing a room changes the columns' length, so that returns a new
+        index built from these columns, and searches always see columns of
+        one length.
+        """
+        row = _row(values) if values is not None else None
+        found = np.flatnonzero(self.ids == room_id)
+        position = found[0] if len(found) else None
+
+        if row is not None and position is not None and self.created[position] == row[9]:
+            self._fit_location(row[6])
+            for (name, _), value in zip(_COLUMNS, row):
+                getattr(self, name)[position] = value
+            self.version = version
+            return self
+
+        index = RoomIndex(version, [])
+        for name, _ in _COLUMNS:
+            column = getattr(self, name)
+            setattr(index, name, np.delete(column, position) if position is not None else column)
+        if row is not None:
+            index._fit_location(row[6])
+            # Newest first, then highest id first
+            at = np.count_nonzero((index.created > row[9]) | ((index.created == row[9]) & (index.ids > row[0])))
+            for (name, _), value in zip(_COLUMNS, row):
+                setattr(index, name, np.insert(getattr(index, name), at, value))
+        return index
+
+    def mask(self, location=None, locality_id=None, room_type=None, price_min=None, price_max=None,
+             beds_min=None, room_ids=None):
+        """Boolean array of rooms matching every given filter"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        if location:
+            mask &= np.char.find(self.location, location.lower()) >= 0
+        if locality_id is not None:
+            mask &= self.locality == locality_id
+        if room_type is not None:
+            code = ROOM_TYPES.index(room_type) if room_type in ROOM_TYPES else -2
+            mask &= self.room_type == code
+        if price_min is not None:
+            mask &= self.price >= price_min
+        if price_max is not None:
+            mask &= self.price <= price_max
+        if beds_min is not None:
+            mask &= self.beds >= beds_min
+        if room_ids is not None:
+            mask &= np.isin(self.ids, np.fromiter(room_ids, dtype=np.int64))
+        return mask
+
+    def search(self, ranking=None, **filters):
+        """Ids of matching rooms, newest first or in `ranking` order first"""
+        ids = self.ids[self.mask(**filters)]
+        if ranking:
+            rank = {room_id: position for position, room_id in enumerate(ranking)}
+            ranks = np.array([rank.get(room_id, len(ranking)) for room_id in ids.tolist()], dtype=np.int64)
+            ids = ids[np.argsort(ranks, kind='stable')]
+        return ids
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _current_version():
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+
+def get_room_index():
+    """This process's index, rebuilt if another process changed rooms"""
+    global _index
+    version = _current_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = RoomIndex.build(version)
+        return _index
+
+
+def invalidate_room_index():
+    """Make every process rebuild, e.g. after a bulk load that skipped signals"""
+    cache.set(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def room_changed(room_id, deleted=False):
+    """Once the change commits, apply it locally and tell other processes to rebuild"""
+    transaction.on_commit(lambda: _apply_room_change(room_id, deleted))
+
+
+def _apply_room_change(room_id, deleted):
+    global _index
+    version = uuid.uuid4().hex
+    with _index_lock:
+        if _index is not None:
+            values = None
+            if not deleted:
+                values = Room.objects.filter(pk=room_id).values_list(*_FIELDS).first()
+            _index = _index.replace(version, room_id, values)
+    cache.set(INDEX_VERSION_KEY, version, None)
@@ -0,0 +1,107 @@
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# ============================================================================
+# READ REPLICA ROUTING
+# ============================================================================
+# Views decorated with @replica_reads send their ORM reads to the database
+# named by settings.READ_REPLICA_ALIAS (when it is configured). Any unsafe
+# request (POST etc.) pins that browser to the primary for
+# READ_REPLICA_STICKY_SECONDS, so users always read their own writes even
+# while the replica is catching up. Writes the cookie can't cover (chat
+# messages sent over a WebSocket, payments confirmed by a GET redirect or
+# a gateway webhook) pin the user instead, through the cache.
+# Writes always go to 'default'.
+#
+# Views keyed by a version stamp (@versioned_etag) must read the primary:
+# the stamp is bumped on commit, so a lagging replica would serve the old
+# body under the new ETag, and clients would keep it until the next write.
+
+REPLICA_PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_replica_reads = ContextVar('started_replica_reads', default=False)
+
+
+def replica_alias():
+    """The configured replica alias, or None if there isn't one"""
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    if alias and alias in connections.settings:
+        return alias
+    return None
+
+
+def _pin_key(user_id):
+    return f'started:primary_pin:{user_id}'
+
+
+def _sticky_seconds():
+    return getattr(settings, 'READ_REPLICA_STICKY_SECONDS', 5)
+
+
+def pin_to_primary(user_id):
+    """Pin a user's reads to the primary after a write the cookie can't cover"""
+    if replica_alias() is not None:
+        cache.set(_pin_key(user_id), 1, _sticky_seconds())
+
+
+def is_pinned_to_primary(request):
+    if REPLICA_PIN_COOKIE in request.COOKIES:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+class ReplicaRouter:
+    """Database router used via settings.DATABASE_ROUTERS"""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def replica_reads(view_func):
+    """Route the view's reads to the replica unless the user just wrote"""
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if replica_alias() is None or is_pinned_to_primary(request):
+            return view_func(request, *args, **kwargs)
+
+        token = _replica_reads.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return _wrapped_view
+
+
+class ReplicaPinMiddleware:
+    """After any unsafe request, pin the browser's reads to the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and replica_alias() is not None:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1',
+                max_age=_sticky_seconds(),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,204 @@
+from django.core.paginator import Paginator
+from django.db.models import Q, Count, Case, When, IntegerField
+from .models import Room, FavoriteRoom
+from .localities import get_locality_table
+from .room_index import get_room_index, room_index_enabled
+
+# ============================================================================
+# ROOM SEARCH
+# ============================================================================
+# One place that turns dashboard query parameters into a Room queryset, so
+# the dashboard, the facets API and voice search all filter the same way.
+#
+# Facet counts come from one aggregate query with a filtered COUNT per room
+# type and price band, plus one GROUP BY locality for the location facet
+# (which grows with the localities). Each facet ignores its own filter (but
+# applies the others), so the sidebar can show how many rooms every
+# alternative would return.
+#
+# A location that names a known Locality filters on Room.locality (an
+# indexed equality lookup); anything else falls back to a substring match.
+#
+# search_page() returns one page of results. With the in-memory room index
+# enabled, structured filters and sorting run there and only the page's
+# rooms are loaded; free-text queries always go to the database.
+
+ROOMS_PER_PAGE = 24
+
+# (key, min, max) in Rs. per month; max is exclusive, None is open-ended
+PRICE_BANDS = [
+    ('under_5000', None, 5000),
+    ('5000_10000', 5000, 10000),
+    ('10000_20000', 10000, 20000),
+    ('20000_50000', 20000, 50000),
+    ('50000_plus', 50000, None),
+]
+
+ANY_LOCATION = 'Any Location'
+ANY_TYPE = 'Any Type'
+
+
+def _text_q(q):
+    return Q(title__icontains=q) | Q(location__icontains=q) | Q(description__icontains=q)
+
+
+def _number(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _location_q(location):
+    locality = get_locality_table().resolve(location)
+    if locality is not None:
+        return Q(locality_id=locality['id'])
+    return Q(location__icontains=location)
+
+
+def location_buckets():
+    """Localities offered as location filters, by name"""
+    localities = [
+        locality for locality in get_locality_table().localities.values()
+        if locality['key'] != ANY_LOCATION.lower()
+    ]
+    return sorted(localities, key=lambda locality: locality['name'].lower())
+
+
+def _facet_filters(params):
+    """The filters that have facets, as Q objects keyed by facet name"""
+    location = params.get('location')
+    room_type = params.get('room_type')
+    price_min = params.get('price_min')
+    price_max = params.get('price_max')
+
+    price = Q()
+    if price_min:
+        price &= Q(price__gte=price_min)
+    if price_max:
+        price &= Q(price__lte=price_max)
+
+    return {
+        'location': _location_q(location) if location and location != ANY_LOCATION else Q(),
+        'price': price,
+        'room_type': Q(room_type=room_type) if room_type and room_type != ANY_TYPE else Q(),
+    }
+
+
+def base_rooms(params, client_id=None):
+    """Rooms matching the filters that don't have facets (text, beds, favorites)"""
+    rooms = Room.objects.all()
+    q = params.get('q')
+    if q:
+        rooms = rooms.filter(_text_q(q))
+    beds_min = _number(params.get('beds_min'))
+    if beds_min is not None:
+        rooms = rooms.filter(beds__gte=beds_min)
+    if params.get('favorites_only') and client_id is not None:
+        favorite_room_ids = FavoriteRoom.objects.filter(client_id=client_id).values_list('room_id', flat=True)
+        rooms = rooms.filter(id__in=favorite_room_ids)
+    return rooms
+
+
+def filter_rooms(params, client_id=None):
+    """Rooms matching every dashboard filter in params (a QueryDict or dict)"""
+    rooms = base_rooms(params, client_id)
+    for condition in _facet_filters(params).values():
+        rooms = rooms.filter(condition)
+    return rooms
+
+
+def _price_band_q(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def _count(condition):
+    # An empty Q() can't be used as an aggregate filter
+    return Count('id', filter=condition) if condition else Count('id')
+
+
+def room_facets(params, client_id=None):
+    """Counts per room type, location bucket and price band, in two queries"""
+    filters = _facet_filters(params)
+    rooms = base_rooms(params, client_id)
+
+    def others(facet):
+        condition = Q()
+        for name, other in filters.items():
+            if name != facet:
+                condition &= other
+        return condition
+
+    aggregates = {'total': _count(others(None))}
+    for i, (code, _) in enumerate(Room.ROOM_TYPE_CHOICES):
+        aggregates[f'room_type_{i}'] = _count(others('room_type') & Q(room_type=code))
+    for i, (_, low, high) in enumerate(PRICE_BANDS):
+        aggregates[f'price_{i}'] = _count(others('price') & _price_band_q(low, high))
+    counts = rooms.aggregate(**aggregates)
+
+    by_locality = dict(
+        rooms.filter(others('location')).order_by()
+        .values('locality_id').annotate(count=Count('id')).values_list('locality_id', 'count')
+    )
+    return {
+        'total': counts['total'],
+        'room_type': {code: counts[f'room_type_{i}'] for i, (code, _) in enumerate(Room.ROOM_TYPE_CHOICES)},
+        'location': {locality['name']: by_locality.get(locality['id'], 0) for locality in location_buckets()},
+        'price': [
+            {'key': key, 'min': low, 'max': high, 'count': counts[f'price_{i}']}
+            for i, (key, low, high) in enumerate(PRICE_BANDS)
+        ],
+    }
+
+
+def _ranked(rooms, ranking):
+    """Order rooms by position in ranking (a list of ids), the rest after"""
+    rank = Case(
+        *[When(id=room_id, then=position) for position, room_id in enumerate(ranking)],
+        default=len(ranking),
+        output_field=IntegerField(),
+    )
+    return rooms.order_by(rank, '-created_at')
+
+
+def _index_filters(params, client_id):
+    location = params.get('location')
+    room_type = params.get('room_type')
+    locality = get_locality_table().resolve(location) if location != ANY_LOCATION else None
+    filters = {
+        'location': location if location and location != ANY_LOCATION and locality is None else None,
+        'locality_id': locality['id'] if locality is not None else None,
+        'room_type': room_type if room_type and room_type != ANY_TYPE else None,
+        'price_min': _number(params.get('price_min')),
+        'price_max': _number(params.get('price_max')),
+        'beds_min': _number(params.get('beds_min')),
+    }
+    if params.get('favorites_only') and client_id is not None:
+        filters['room_ids'] = FavoriteRoom.objects.filter(client_id=client_id).values_list('room_id', flat=True)
+    return filters
+
+
+def search_page(params, client_id=None, page_number=1, per_page=ROOMS_PER_PAGE, ranking=None):
+    """A Paginator page of the Room objects matching params
+
+    ranking, a list of room ids, puts those rooms first in that order.
+    """
+    if room_index_enabled() and not params.get('q'):
+        ids = get_room_index().search(ranking=ranking, **_index_filters(params, client_id))
+        page = Paginator(ids.tolist(), per_page).get_page(page_number)
+        # Only the rooms on this page are loaded
+        rooms = Room.objects.prefetch_related('images').in_bulk(page.object_list)
+        page.object_list = [rooms[room_id] for room_id in page.object_list if room_id in rooms]
+        return page
+
+    # Card images are only read when a card isn't in the fragment cache, but
+    # one prefetch bounds the cold case
+    rooms = filter_rooms(params, client_id).prefetch_related('images')
+    if ranking:
+        rooms = _ranked(rooms, ranking)
+    return Paginator(rooms, per_page).get_page(page_number)
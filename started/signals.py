@@ -0,0 +1,201 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import ClientPayment, UserProfile, Owner, Client, Room, RoomImage, Message, FavoriteRoom, Booking, Conversation, Locality
+from . import entitlements, invalidation, recommendations, room_index
+from .featured import refresh_featured_rooms
+from .fragments import invalidate_room_cards, touch_room
+from .localities import get_locality_table, locality_for_location, normalize_location, invalidate_localities
+from .outbox import emit_room_changed
+from .principal import invalidate_principal
+from .room_details import refresh_room_detail, invalidate_room_detail
+from .versioning import bump_version
+
+
+# ============================================================================
+# CACHE INVALIDATION
+# ============================================================================
+
+@receiver(post_save, sender=ClientPayment)
+@receiver(post_delete, sender=ClientPayment)
+def client_payment_changed(sender, instance, **kwargs):
+    # A payment flipping to success (or being removed) changes what the
+    # client has unlocked
+    entitlements.invalidate_unlocked_rooms(instance.client_id)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=Owner)
+@receiver(post_delete, sender=Owner)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def principal_changed(sender, instance, **kwargs):
+    # Role or profile image changed; re-resolve on the next request
+    invalidate_principal(instance.user_id)
+
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, **kwargs):
+    refresh_featured_rooms()
+    refresh_room_detail(instance.pk)
+    # Refreshed again by the outbox dispatcher once the save has committed
+    emit_room_changed(instance.pk)
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    invalidate_room_cards(instance.pk, instance.cache_version)
+    invalidate_room_detail(instance.pk)
+    refresh_featured_rooms(changed_at=timezone.now())
+    emit_room_changed(instance.pk, deleted=True)
+
+
+@receiver(post_save, sender=RoomImage)
+@receiver(post_delete, sender=RoomImage)
+def room_image_changed(sender, instance, **kwargs):
+    # Move the room to a new cache version so its card is re-rendered
+    room = Room.objects.filter(pk=instance.room_id).only('updated_at').first()
+    if room is not None:
+        invalidate_room_cards(room.pk, room.cache_version)
+        touch_room(room.pk)
+        refresh_featured_rooms()
+        refresh_room_detail(room.pk)
+
+
+# ============================================================================
+# CROSS-WORKER INVALIDATION BUS
+# ============================================================================
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=RoomImage)
+@receiver(post_delete, sender=RoomImage)
+def room_published(sender, instance, **kwargs):
+    invalidation.publish('room', [instance.pk if sender is Room else instance.room_id])
+
+
+@receiver(post_save, sender=ClientPayment)
+@receiver(post_delete, sender=ClientPayment)
+def client_payment_published(sender, instance, **kwargs):
+    invalidation.publish('unlocks', [instance.client_id])
+
+
+@receiver(post_save, sender=FavoriteRoom)
+@receiver(post_delete, sender=FavoriteRoom)
+def favorite_published(sender, instance, **kwargs):
+    invalidation.publish('favorites', [instance.client_id])
+
+
+# ============================================================================
+# PER-USER VERSION STAMPS
+# ============================================================================
+
+def _user_id_for(model, pk):
+    return model.objects.filter(pk=pk).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def message_changed(sender, instance, **kwargs):
+    bump_version([instance.sender_id, instance.receiver_id], 'messages')
+
+
+@receiver(post_save, sender=FavoriteRoom)
+@receiver(post_delete, sender=FavoriteRoom)
+def favorite_changed(sender, instance, **kwargs):
+    bump_version(_user_id_for(Client, instance.client_id), 'favorites')
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    bump_version(
+        [_user_id_for(Client, instance.client_id), _user_id_for(Owner, instance.owner_id)],
+        'bookings'
+    )
+
+
+# ============================================================================
+# RECOMMENDATIONS
+# ============================================================================
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def room_catalogue_changed(sender, instance, **kwargs):
+    # Read now: a deleted instance's pk is cleared before commit
+    room_id = instance.pk
+    transaction.on_commit(lambda: recommendations.room_changed(room_id))
+
+
+# ============================================================================
+# IN-MEMORY ROOM INDEX
+# ============================================================================
+
+@receiver(post_save, sender=Room)
+def room_index_saved(sender, instance, **kwargs):
+    if room_index.room_index_enabled():
+        room_index.room_changed(instance.pk)
+
+
+@receiver(post_delete, sender=Room)
+def room_index_deleted(sender, instance, **kwargs):
+    if room_index.room_index_enabled():
+        room_index.room_changed(instance.pk, deleted=True)
+
+
+def _interaction_changed(client_id, room_id, kind, active):
+    if active:
+        recommendations.record_interaction(client_id, room_id, kind)
+    else:
+        recommendations.invalidate_recommendations(client_id)
+
+
+@receiver(post_save, sender=FavoriteRoom)
+@receiver(post_delete, sender=FavoriteRoom)
+def favorite_interaction(sender, instance, signal, **kwargs):
+    _interaction_changed(instance.client_id, instance.room_id, 'favorite', signal is post_save)
+
+
+@receiver(post_save, sender=ClientPayment)
+@receiver(post_delete, sender=ClientPayment)
+def unlock_interaction(sender, instance, signal, **kwargs):
+    if signal is post_save and instance.status != 'success':
+        return
+    _interaction_changed(instance.client_id, instance.room_id, 'unlock', signal is post_save)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_interaction(sender, instance, signal, **kwargs):
+    active = signal is post_save and instance.status != 'cancelled'
+    _interaction_changed(instance.client_id, instance.room_id, 'booking', active)
+
+
+@receiver(post_save, sender=Conversation)
+@receiver(post_delete, sender=Conversation)
+def chat_interaction(sender, instance, signal, **kwargs):
+    _interaction_changed(instance.client_id, instance.room_id, 'chat', signal is post_save)
+
+
+# ============================================================================
+# LOCALITIES
+# ============================================================================
+
+@receiver(pre_save, sender=Room)
+def assign_locality(sender, instance, **kwargs):
+    # Known localities resolve from memory; new ones are created
+    _, key = normalize_location(instance.location)
+    locality = get_locality_table().resolve(key)
+    if locality is not None:
+        instance.locality_id = locality['id']
+    else:
+        instance.locality = locality_for_location(instance.location, instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Locality)
+@receiver(post_delete, sender=Locality)
+def locality_changed(sender, instance, **kwargs):
+    # After commit, so no process caches a locality that is rolled back
+    transaction.on_commit(invalidate_localities)
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# ============================================================================
+# SQLITE CONNECTION TUNING
+# ============================================================================
+# Applied to every new SQLite connection. WAL lets the chat consumer's
+# INSERTs run alongside HTTP reads instead of failing with
+# "database is locked", and busy_timeout makes writers wait for each other.
+# busy_timeout follows the database's OPTIONS['timeout'] (seconds) when it
+# has one, since the PRAGMA replaces the wait the driver set up. Override
+# individual values with the SQLITE_PRAGMAS setting.
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',       # Safe with WAL; fsync only at checkpoints
+    'busy_timeout': 5000,          # Milliseconds to wait for a lock
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,          # Negative means KiB, i.e. ~20 MB
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+
+def get_sqlite_pragmas(options=None):
+    """The PRAGMAs for a database with the given OPTIONS"""
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+    timeout = (options or {}).get('timeout')
+    if timeout is not None:
+        pragmas['busy_timeout'] = int(timeout * 1000)
+    pragmas.update(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    return pragmas
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        if value is None:
+            continue  # Disabled via SQLITE_PRAGMAS
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, get_sqlite_pragmas(connection.settings_dict.get('OPTIONS')))
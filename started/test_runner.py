@@ -0,0 +1,26 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# ============================================================================
+# TEST RUNNER
+# ============================================================================
+# Test runs don't talk to Redis: the channel layer (cache invalidation
+# broadcasts, outbox pushes) and the cache are in-memory for the whole run,
+# whatever the environment configures. Outbox events are only delivered
+# when a test calls dispatch_pending(), not from background threads.
+
+
+class HermeticTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._local_services = override_settings(
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            OUTBOX_DISPATCH_ON_COMMIT=False,
+        )
+        self._local_services.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._local_services.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1046 @@
-from django.test import TestCase
+import asyncio
+import json
+import logging
+from unittest import skipUnless
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.utils import timezone
+from django.db import connection, transaction
+from django.core import mail
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, SimpleTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .instrumentation import QueryBudgetExceeded, render_prometheus, reset_metrics
+from .analytics import increment_room_stats, rollup_room_stats
+from .bookings import transition, PENDING, CONFIRMED, CANCELLED
+from .models import Owner, Client, Room, Message, FavoriteRoom, Conversation, Locality, Booking, ClientPayment, RoomStats, Outbox, MessageArchive
+from . import outbox
+from .outbox import dispatch_pending, emit
+from .archive import archive_conversation
+from .entitlements import _unlocked_rooms_key, has_unlocked
+from .favorites import favorite_room_ids, update_favorites
+from .invalidation import Subscriber, INVALIDATION_GROUP, MESSAGE_TYPE, subscriber_layer
+from .room_details import get_room_detail
+from .tiered_cache import cached_view_data
+from .paginators import EstimatedCountPaginator
+from .recommendations import get_catalogue, recommendations, invalidate_recommendations
+from .search import room_facets, search_page
+from .versioning import get_version
+from .room_index import get_room_index
+from .query_parser import parse_query
+from .routers import (
+    ReplicaRouter, ReplicaPinMiddleware, is_pinned_to_primary, pin_to_primary, replica_reads, REPLICA_PIN_COOKIE,
+)
+
+
+# ============================================================================
+# READ REPLICA ROUTING
+# ============================================================================
+
+@override_settings(READ_REPLICA_ALIAS='default')
+class ReplicaRouterTests(SimpleTestCase):
+    """Routing decisions; 'default' stands in for the replica alias"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def routed_alias(self, request):
+        @replica_reads
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Room) or 'primary')
+        return view(request).content.decode()
+
+    def test_reads_outside_decorated_views_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(Room))
+
+    def test_decorated_view_reads_from_replica(self):
+        self.assertEqual(self.routed_alias(self.factory.get('/')), 'default')
+
+    def test_pinned_request_reads_from_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[REPLICA_PIN_COOKIE] = '1'
+        self.assertEqual(self.routed_alias(request), 'primary')
+
+    def test_pinned_user_reads_from_primary(self):
+        # As after a chat message sent over the WebSocket
+        request = self.factory.get('/')
+        request.user = User(pk=987654)
+        self.assertEqual(self.routed_alias(request), 'default')
+        pin_to_primary(request.user.pk)
+        self.addCleanup(cache.clear)
+        self.assertEqual(self.routed_alias(request), 'primary')
+
+    def test_writes_always_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Room), 'default')
+
+    def test_unsafe_request_pins_to_primary(self):
+        middleware = ReplicaPinMiddleware(lambda request: HttpResponse())
+        self.assertIn(REPLICA_PIN_COOKIE, middleware(self.factory.post('/')).cookies)
+        self.assertNotIn(REPLICA_PIN_COOKIE, middleware(self.factory.get('/')).cookies)
+
+    @override_settings(READ_REPLICA_ALIAS='missing')
+    def test_unconfigured_replica_is_ignored(self):
+        self.assertEqual(self.routed_alias(self.factory.get('/')), 'primary')
+
+
+@override_settings(READ_REPLICA_ALIAS='default')
+class ReplicaPinTests(TestCase):
+    """Writes that don't come from an unsafe browser request still pin"""
+
+    @classmethod
+    def setUpTestData(cls):
+        make_booking_fixtures(cls)
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.client_user)
+
+    def test_esewa_redirect_pins_the_payer(self):
+        request = RequestFactory().get('/')
+        request.user = self.client_user
+        self.assertFalse(is_pinned_to_primary(request))
+        response = self.client.get('/esewa-success/', {'room': self.room.id, 'oid': 'o1', 'amt': '30', 'refId': 'r1'})
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+        self.assertTrue(is_pinned_to_primary(request))
+
+
+HAS_REPLICA = 'replica' in settings.DATABASES
+
+
+@skipUnless(HAS_REPLICA, 'set FINDMYROOM_REPLICA_DB to run against a second SQLite file')
+class ReplicaDatabaseTests(TestCase):
+    """End-to-end routing against two separate SQLite databases"""
+    databases = {'default', 'replica'} if HAS_REPLICA else {'default'}
+
+    def setUp(self):
+        # The replica is a copy of the primary: same users, same ids
+        for alias in ('default', 'replica'):
+            user = User(id=1, username='client')
+            user.set_password('testpass123')
+            user.save(using=alias)
+            Client(id=1, user=user, phone='1').save(using=alias)
+            owner_user = User(id=2, username='owner')
+            owner_user.save(using=alias)
+            Owner(id=1, user=owner_user, phone='2', address='x').save(using=alias)
+            Locality(id=1, name='Birtamode', key='birtamode', slug='birtamode').save(using=alias)
+
+        self.primary_room = self.make_room('default', 'Primary room')
+        self.make_room('replica', 'Replica room')
+        self.client.force_login(User.objects.get(id=1))
+
+    def make_room(self, alias, title):
+        room = Room(
+            title=title, room_type='private', location='Birtamode', price=5000,
+            description='d', contact_phone='1', contact_email='a@b.com', owner_id=1,
+        )
+        room.save(using=alias)
+        return room
+
+    def test_dashboard_reads_from_replica(self):
+        response = self.client.get('/client/dashboard/')
+        self.assertContains(response, 'Replica room')
+        self.assertNotContains(response, 'Primary room')
+
+    def test_versioned_polls_read_from_primary(self):
+        # Their ETag comes from the primary's version stamp
+        Message(room=self.primary_room, sender_id=2, receiver_id=1, content='Hi').save(using='default')
+        self.assertEqual(self.client.get('/api/unread-count/').json()['unread_count'], 1)
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        self.client.post(
+            '/api/favorites/toggle/', {'room_id': self.primary_room.id}, content_type='application/json'
+        )
+        response = self.client.get('/client/dashboard/')
+        self.assertContains(response, 'Primary room')
+
+
+# ============================================================================
+# QUERY BUDGETS
+# ============================================================================
+
+# Fixtures live on the primary only, so keep reads off a configured replica
+@override_settings(QUERY_BUDGETS_ENFORCED=True, READ_REPLICA_ALIAS=None)
+class QueryBudgetTests(TestCase):
+    """Views stay within their @query_budget as the data grows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner_user = User.objects.create_user('owner', password='testpass123')
+        owner = Owner.objects.create(user=cls.owner_user, phone='1', address='Birtamode')
+        cls.client_user = User.objects.create_user('client', password='testpass123')
+        Client.objects.create(user=cls.client_user, phone='2')
+
+        for i in range(5):
+            room = Room.objects.create(
+                title=f'Room {i}', room_type='private', location='Birtamode', price=5000,
+                description='d', contact_phone='1', contact_email='a@b.com', owner=owner,
+            )
+            client_user = User.objects.create_user(f'client{i}', password='testpass123')
+            Client.objects.create(user=client_user, phone=str(i))
+            for sender, receiver in ((client_user, cls.owner_user), (cls.owner_user, client_user)):
+                Message.objects.create(room=room, sender=sender, receiver=receiver, content='Hello')
+            Message.objects.create(room=room, sender=cls.client_user, receiver=cls.owner_user, content='Hi')
+
+    def setUp(self):
+        reset_metrics()
+        # Keep the per-request log lines out of the test output
+        request_logger = logging.getLogger('started.requests')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.WARNING)
+
+    def test_owner_messages_within_budget(self):
+        self.client.force_login(self.owner_user)
+        response = self.client.get('/api/owner-messages/')
+        self.assertEqual(len(response.json()['conversations']), 6)
+
+    def test_client_messages_within_budget(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get('/api/client-messages/')
+        self.assertEqual(len(response.json()['conversations']), 5)
+
+    def test_dashboard_and_home_within_budget(self):
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.client.get('/client/dashboard/').status_code, 200)
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+    @override_settings(QUERY_BUDGETS={'get_owner_messages': 1})
+    def test_exceeding_budget_raises(self):
+        self.client.force_login(self.owner_user)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/owner-messages/')
+
+    def test_metrics_are_exported(self):
+        self.client.force_login(self.owner_user)
+        self.client.get('/api/owner-messages/')
+        self.assertIn('findmyroom_db_queries_total{view="get_owner_messages"}', render_prometheus())
+
+
+# ============================================================================
+# RECOMMENDATIONS
+# ============================================================================
+
+class RecommendationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = Owner.objects.create(user=User.objects.create_user('owner'), phone='1', address='Birtamode')
+        cls.client_profile = Client.objects.create(user=User.objects.create_user('client'), phone='2')
+        cls.owner = owner
+        cls.rooms = {
+            name: Room.objects.create(
+                title=name, room_type=room_type, location='Birtamode', price=price, area_m2=area,
+                beds=beds, baths=1, description='d', contact_phone='1', contact_email='a@b.com', owner=owner,
+            )
+            for name, room_type, price, area, beds in (
+                ('cheap private', 'private', 4000, 15, 1),
+                ('cheap private 2', 'private', 4500, 18, 1),
+                ('big house', 'house', 80000, 250, 4),
+                ('apartment', 'apartment', 40000, 120, 3),
+            )
+        }
+
+    def setUp(self):
+        # Cached lists outlive the rolled-back rows of earlier tests
+        cache.clear()
+
+    def test_similar_rooms_rank_first(self):
+        FavoriteRoom.objects.create(client=self.client_profile, room=self.rooms['cheap private'])
+        ids = recommendations(self.client_profile.id)['ids']
+        # The favorited room itself isn't recommended back
+        self.assertEqual(ids, [self.rooms[name].id for name in ('cheap private 2', 'apartment', 'big house')])
+
+    def test_room_changes_update_only_their_catalogue_row(self):
+        FavoriteRoom.objects.create(client=self.client_profile, room=self.rooms['cheap private'])
+        cached = recommendations(self.client_profile.id)
+        catalogue = get_catalogue()
+        house, apartment = self.rooms['big house'], self.rooms['apartment']
+        house.price, house.area_m2, house.beds, house.room_type = 4200, 16, 1, 'private'
+        with self.captureOnCommitCallbacks(execute=True):
+            house.save()
+            apartment.delete()
+        updated = get_catalogue()
+        self.assertIsNot(updated, catalogue)
+        self.assertEqual(updated.version, catalogue.version)
+        self.assertNotIn(apartment.id, updated.rows)
+        room = self.rooms['cheap private 2'].id
+        self.assertTrue((updated.vector(room) == catalogue.vector(room)).all())
+        self.assertGreater(updated.vector(house.id) @ catalogue.vector(room), 0.9)
+        # Clients' lists are kept rather than rebuilt
+        self.assertEqual(recommendations(self.client_profile.id), cached)
+
+    def test_incremental_update_matches_rebuild(self):
+        FavoriteRoom.objects.create(client=self.client_profile, room=self.rooms['cheap private'])
+        recommendations(self.client_profile.id)
+        # Folded into the cached profile by the signal
+        Conversation.objects.create(client=self.client_profile, owner=self.owner, room=self.rooms['big house'])
+        incremental = recommendations(self.client_profile.id)
+
+        invalidate_recommendations(self.client_profile.id)
+        rebuilt = recommendations(self.client_profile.id)
+        self.assertEqual(incremental['ids'], rebuilt['ids'])
+        for a, b in zip(incremental['scores'], rebuilt['scores']):
+            self.assertAlmostEqual(a, b, places=3)
+
+
+# ============================================================================
+# FAVORITES
+# ============================================================================
+
+@override_settings(QUERY_BUDGETS_ENFORCED=True)
+@override_settings(READ_REPLICA_ALIAS=None)
+class FavoritesApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        owner = Owner.objects.create(user=User.objects.create_user('owner'), phone='1', address='x')
+        cls.client_user = User.objects.create_user('client')
+        cls.client_profile = Client.objects.create(user=cls.client_user, phone='2')
+        cls.room_ids = [
+            Room.objects.create(
+                title=f'r{i}', room_type='private', location='x', price=5000,
+                description='d', contact_phone='1', contact_email='a@b.com', owner=owner,
+            ).id
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.client_user)
+        request_logger = logging.getLogger('started.requests')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.WARNING)
+
+    def post(self, url, data):
+        return self.client.post(url, data, content_type='application/json')
+
+    def test_bulk_add_and_remove(self):
+        a, b, c = self.room_ids
+        response = self.post('/api/favorites/bulk/', {'add': [a, b, 999999]})
+        self.assertEqual(response.json()['favorites'], [a, b])
+        # Re-adding is a no-op; an id in both lists is removed
+        response = self.post('/api/favorites/bulk/', {'add': [a, c], 'remove': [b, c]})
+        self.assertEqual(response.json()['favorites'], [a])
+        self.assertEqual(self.post('/api/favorites/bulk/', {'add': 'x'}).status_code, 400)
+
+    def test_bulk_writes_require_the_csrf_token(self):
+        browser = self.client_class(enforce_csrf_checks=True)
+        browser.force_login(self.client_user)
+        browser.get('/client/dashboard/')  # Sets the cookie the dashboard's JS sends back
+        body = {'add': self.room_ids[:1]}
+        self.assertEqual(browser.post('/api/favorites/bulk/', body, content_type='application/json').status_code, 403)
+        response = browser.post(
+            '/api/favorites/bulk/', body, content_type='application/json',
+            HTTP_X_CSRFTOKEN=browser.cookies['csrftoken'].value,
+        )
+        self.assertEqual(response.json()['favorites'], self.room_ids[:1])
+
+    def test_writes_change_the_favorites_etag(self):
+        etag = self.client.get('/api/favorites/')['ETag']
+        self.assertEqual(self.client.get('/api/favorites/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.post('/api/favorites/toggle/', {'room_id': self.room_ids[0]}).json()['favorited'])
+            # Not bumped until the write commits
+            self.assertEqual(self.client.get('/api/favorites/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get('/api/favorites/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['favorites'], [self.room_ids[0]])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(self.post('/api/favorites/toggle/', {'room_id': self.room_ids[0]}).json()['favorited'])
+        self.assertEqual(self.client.get('/api/favorites/').json()['favorites'], [])
+
+    def test_bulk_writes_update_recommendations(self):
+        recommendations(self.client_profile.id)
+        self.post('/api/favorites/bulk/', {'add': self.room_ids[:1]})
+        self.assertIn(['favorite', self.room_ids[0]], [list(pair) for pair in recommendations(self.client_profile.id)['seen']])
+        self.post('/api/favorites/bulk/', {'remove': self.room_ids[:1]})
+        self.assertEqual(recommendations(self.client_profile.id)['seen'], [])
+
+
+# ============================================================================
+# IN-MEMORY ROOM INDEX
+# ============================================================================
+
+class RoomIndexTests(TestCase):
+    """The index path returns the same pages as the database path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = Owner.objects.create(user=User.objects.create_user('owner'), phone='1', address='Birtamode')
+        for i in range(30):
+            Room.objects.create(
+                title=f'Room {i}', room_type=['private', '2BHK', 'house'][i % 3],
+                location=['Muktichowk', 'Sainikmod'][i % 2], price=3000 + i * 1000,
+                description='d', contact_phone='1', contact_email='a@b.com', owner=owner,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertSamePage(self, params, page=1):
+        expected = search_page(params, page_number=page)
+        with override_settings(ROOM_INDEX_ENABLED=True):
+            actual = search_page(params, page_number=page, per_page=expected.paginator.per_page)
+        self.assertEqual(actual.paginator.count, expected.paginator.count)
+        self.assertEqual([room.id for room in actual], [room.id for room in expected])
+
+    def test_filters_match_database(self):
+        self.assertSamePage({})
+        self.assertSamePage({}, page=2)
+        self.assertSamePage({'room_type': 'private', 'location': 'sainik'})
+        self.assertSamePage({'price_min': '10000', 'price_max': '20000', 'room_type': 'Any Type'})
+
+    def test_room_changes_update_index(self):
+        with override_settings(ROOM_INDEX_ENABLED=True):
+            search_page({})
+            index = get_room_index()
+            room = Room.objects.get(title='Room 0')
+            room.price = 1
+            room.location = 'A much longer location than any before'
+            with self.captureOnCommitCallbacks(execute=True):
+                room.save()
+                # Not applied before the save commits
+                self.assertEqual(search_page({'price_max': '2'}).paginator.count, 0)
+            self.assertIs(get_room_index(), index)  # Updated in place
+            self.assertEqual([r.id for r in search_page({'price_max': '2', 'location': 'much longer'})], [room.id])
+            with self.captureOnCommitCallbacks(execute=True):
+                room.delete()
+                Room.objects.create(
+                    title='New', room_type='house', location='Sainikmod', price=4500,
+                    description='d', contact_phone='1', contact_email='a@b.com', owner=room.owner,
+                )
+            self.assertEqual(search_page({'price_max': '2'}).paginator.count, 0)
+        self.assertSamePage({})
+        self.assertSamePage({'room_type': 'house', 'price_max': '5000'})
+
+
+# ============================================================================
+# ROOM FACETS
+# ============================================================================
+
+class RoomFacetsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = Owner.objects.create(user=User.objects.create_user('owner'), phone='1', address='Birtamode')
+        for i in range(6):
+            Room.objects.create(
+                title=f'Room {i}', room_type=['private', 'house'][i % 2],
+                location=['Muktichowk', 'Sainikmod', 'Charali'][i % 3], price=3000 + i * 2000,
+                description='d', contact_phone='1', contact_email='a@b.com', owner=owner,
+            )
+
+    def setUp(self):
+        cache.clear()
+        # The next class's fixtures would resolve these localities
+        self.addCleanup(cache.clear)
+
+    def test_each_facet_ignores_only_its_own_filter(self):
+        room_facets({})  # Load the locality table
+        with self.assertNumQueries(2):
+            facets = room_facets({'location': 'Sainikmod', 'room_type': 'house'})
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['location'], {'Charali': 1, 'Muktichowk': 1, 'Sainikmod': 1})
+        self.assertEqual(facets['room_type'], {'private': 1, '2BHK': 0, '3BHK': 0, 'apartment': 0, 'house': 1})
+
+
+# ============================================================================
+# VOICE SEARCH QUERY PARSER
+# ============================================================================
+
+class QueryParserTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Muktichowk', 'Sainikmod'):
+            Locality.objects.create(name=name, key=name.lower(), slug=name.lower())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parses_type_location_and_price(self):
+        self.assertEqual(parse_query('2BHK in Sainikmod under 15k'), {
+            'room_type': '2BHK', 'location': 'Sainikmod', 'price_max': '15000',
+        })
+        self.assertEqual(parse_query('private room near muktichowk between Rs 5,000 and 8000'), {
+            'room_type': 'private', 'location': 'Muktichowk', 'price_min': '5000', 'price_max': '8000',
+        })
+
+    def test_parses_beds_and_large_amounts(self):
+        self.assertEqual(parse_query('a house with three bedrooms above 1 lakh'), {
+            'room_type': 'house', 'beds_min': '3', 'price_min': '100000',
+        })
+
+    def test_gazetteer_includes_new_room_localities(self):
+        owner = Owner.objects.create(user=User.objects.create_user('owner'), phone='1', address='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(
+                title='r', room_type='private', location='Charali', price=5000,
+                description='d', contact_phone='1', contact_email='a@b.com', owner=owner,
+            )
+        self.assertEqual(parse_query('rooms in charali'), {'location': 'Charali'})
+
+
+# ============================================================================
+# ADMIN CHANGELISTS
+# ============================================================================
+
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'testpass123')
+        owner_user = User.objects.create_user('owner')
+        owner = Owner.objects.create(user=owner_user, phone='1', address='x')
+        cls.client_user = User.objects.create_user('client')
+        cls.room = Room.objects.create(
+            title='r', room_type='private', location='Birtamode', price=5000,
+            description='d', contact_phone='1', contact_email='a@b.com', owner=owner,
+        )
+        Message.objects.create(room=cls.room, sender=cls.client_user, receiver=owner_user, content='Is parking available?')
+        Message.objects.create(room=cls.room, sender=owner_user, receiver=cls.client_user, content='Yes, for bikes')
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+        request_logger = logging.getLogger('started.requests')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.WARNING)
+
+    def changelist(self, **params):
+        response = self.client.get('/admin/started/message/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            self.changelist()
+        for i in range(20):
+            Message.objects.create(room=self.room, sender=self.client_user, receiver=self.admin_user, content=f'm{i}')
+        with CaptureQueriesContext(connection) as many:
+            self.changelist()
+        self.assertEqual(len(many), len(few))
+
+    def test_search_matches_content_words_and_usernames(self):
+        self.assertEqual([m.content for m in self.changelist(q='PARK').result_list], ['Is parking available?'])
+        self.assertEqual(self.changelist(q='owner').result_count, 2)
+        self.assertEqual(self.changelist(q='OWN').result_count, 2)
+        self.assertEqual(self.changelist(q='"').result_count, 0)
+
+    def test_export_command_writes_to_its_stdout(self):
+        out = StringIO()
+        call_command('export', 'message', '--format', 'ndjson', stdout=out)
+        self.assertEqual([json.loads(line)['content'] for line in out.getvalue().splitlines()],
+                         ['Is parking available?', 'Yes, for bikes'])
+
+    def test_estimated_paginator_caps_filtered_counts(self):
+        with patch('started.paginators.COUNT_CAP', 1):
+            paginator = EstimatedCountPaginator(Message.objects.filter(room=self.room), 10)
+            self.assertEqual(paginator.count, 1)
+        self.assertEqual(EstimatedCountPaginator(Message.objects.all(), 10).count, 2)
+
+
+# ============================================================================
+# BOOKINGS
+# ============================================================================
+
+def make_booking_fixtures(test):
+    # In-memory tables may still hold rows rolled back by earlier tests
+    cache.clear()
+    test.owner_user = User.objects.create_user('owner', email='owner@example.com')
+    test.owner = Owner.objects.create(user=test.owner_user, phone='1', address='x')
+    test.client_user = User.objects.create_user('client', email='client@example.com')
+    test.client_profile = Client.objects.create(user=test.client_user, phone='2')
+    test.room = Room.objects.create(
+        title='r', room_type='private', location='x', price=5000,
+        description='d', contact_phone='1', contact_email='a@b.com', owner=test.owner,
+    )
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class BookingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        make_booking_fixtures(cls)
+
+    def setUp(self):
+        cache.clear()
+        request_logger = logging.getLogger('started.requests')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.WARNING)
+
+    def book(self):
+        self.client.force_login(self.client_user)
+        response = self.client.post('/api/book-room/', {'room_id': self.room.id}, content_type='application/json')
+        dispatch_pending()
+        return response.json()
+
+    def test_booking_toggles_and_emails_through_the_outbox(self):
+        self.assertEqual(self.book()['status'], 'pending')
+        self.assertEqual(self.book()['action'], 'cancelled')
+        self.assertEqual(self.book()['status'], 'pending')
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            ['New Booking Request - r', 'Booking Cancelled - r', 'New Booking Request - r'],
+        )
+        self.assertEqual(Booking.objects.get().status, 'pending')
+
+    def test_owner_bulk_confirm_skips_other_owners_and_decided_bookings(self):
+        self.book()
+        other_owner = Owner.objects.create(user=User.objects.create_user('other'), phone='3', address='y')
+        other = Booking.objects.create(client=self.client_profile, room=Room.objects.create(
+            title='o', room_type='private', location='x', price=5000,
+            description='d', contact_phone='1', contact_email='a@b.com', owner=other_owner,
+        ), owner=other_owner)
+        booking = Booking.objects.get(room=self.room)
+        mail.outbox.clear()
+
+        self.client.force_login(self.owner_user)
+        response = self.client.post('/api/owner-bookings/update/', {
+            'booking_ids': [booking.id, other.id], 'action': 'confirm',
+        }, content_type='application/json')
+        dispatch_pending()
+        self.assertEqual(response.json(), {'success': True, 'updated': [booking.id], 'skipped': [other.id]})
+        self.assertEqual([message.to for message in mail.outbox], [['client@example.com']])
+
+        # Already confirmed: nothing changes and nobody is emailed again
+        response = self.client.post('/api/owner-bookings/update/', {
+            'booking_ids': [booking.id], 'action': 'reject',
+        }, content_type='application/json')
+        self.assertEqual(response.json()['skipped'], [booking.id])
+        self.assertEqual(self.book(), {'error': 'Booking already confirmed'})
+        self.assertEqual(self.client.get('/api/owner-bookings/').status_code, 403)
+
+    def test_owner_bulk_updates_require_the_csrf_token(self):
+        self.book()
+        browser = self.client_class(enforce_csrf_checks=True)
+        browser.force_login(self.owner_user)
+        browser.get('/owner/analytics/')  # Sets the cookie the page's JS sends back
+        body = {'booking_ids': [Booking.objects.get().id], 'action': 'confirm'}
+        url = '/api/owner-bookings/update/'
+        self.assertEqual(browser.post(url, body, content_type='application/json').status_code, 403)
+        response = browser.post(url, body, content_type='application/json',
+                                HTTP_X_CSRFTOKEN=browser.cookies['csrftoken'].value)
+        self.assertEqual(response.json()['updated'], body['booking_ids'])
+
+    def test_stale_transition_changes_nothing(self):
+        booking = Booking.objects.create(client=self.client_profile, room=self.room, owner=self.owner)
+        self.assertEqual(transition([booking.id], PENDING, CONFIRMED, actor='owner'), [booking.id])
+        # A second request that also read "pending" loses
+        self.assertEqual(transition([booking.id], PENDING, CANCELLED, actor='owner'), [])
+        dispatch_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Booking.objects.get().status, CONFIRMED)
+
+
+@skipUnless(settings.DATABASES['default'].get('TEST', {}).get('NAME'), 'set FINDMYROOM_TEST_DB to a file to run')
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class BookingConcurrencyTests(TransactionTestCase):
+    """Racing transitions on one booking: exactly one wins and notifies"""
+
+    def setUp(self):
+        cache.clear()
+        make_booking_fixtures(self)
+        self.booking = Booking.objects.create(client=self.client_profile, room=self.room, owner=self.owner)
+
+    def test_concurrent_transitions_apply_once(self):
+        barrier = threading.Barrier(4)
+        results = []
+
+        def decide(to_status):
+            try:
+                barrier.wait()
+                results.append(transition([self.booking.id], PENDING, to_status, actor='owner'))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=decide, args=(status,)) for status in (CONFIRMED, CANCELLED) * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(len(changed) for changed in results), [0, 0, 0, 1])
+        self.assertEqual(Outbox.objects.filter(topic='booking.changed').count(), 1)
+        self.assertIn(Booking.objects.get().status, (CONFIRMED, CANCELLED))
+
+
+# ============================================================================
+# OWNER ANALYTICS
+# ============================================================================
+
+class OwnerAnalyticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        make_booking_fixtures(cls)
+        Booking.objects.create(client=cls.client_profile, room=cls.room, owner=cls.owner)
+        FavoriteRoom.objects.create(client=cls.client_profile, room=cls.room)
+        ClientPayment.objects.create(
+            client=cls.client_profile, owner=cls.owner, room=cls.room, status='success',
+            transaction_id='t1', paid_at=timezone.now(),
+        )
+        for _ in range(3):
+            Message.objects.create(room=cls.room, sender=cls.client_user, receiver=cls.owner_user, content='Hi')
+
+    def setUp(self):
+        request_logger = logging.getLogger('started.requests')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.WARNING)
+
+    def test_rollup_counts_each_source_and_is_rerunnable(self):
+        today = timezone.localdate()
+        with self.assertNumQueries(9):
+            self.assertEqual(rollup_room_stats(today), 1)
+        Message.objects.create(room=self.room, sender=self.owner_user, receiver=self.client_user, content='Hello')
+        call_command('rollup_room_stats', days=1, stdout=StringIO())
+        stats = RoomStats.objects.get(room=self.room, date=today)
+        self.assertEqual(
+            (stats.bookings_pending, stats.unlocks, stats.favorites, stats.messages, stats.owner_id),
+            (1, 1, 1, 4, self.owner.id),
+        )
+
+    def test_late_status_changes_re_roll_the_booking_day(self):
+        booked_on = timezone.localdate() - timedelta(days=10)
+        Booking.objects.update(created_at=timezone.now() - timedelta(days=10))
+        rollup_room_stats(booked_on)
+        transition(Booking.objects.values_list('id', flat=True), PENDING, CONFIRMED, actor='owner')
+        call_command('rollup_room_stats', days=2, stdout=StringIO())
+        stats = RoomStats.objects.get(room=self.room, date=booked_on)
+        self.assertEqual((stats.bookings_pending, stats.bookings_confirmed), (0, 1))
+
+    def test_increments_add_to_existing_rows(self):
+        today = timezone.localdate()
+        with self.assertNumQueries(2):
+            increment_room_stats('messages', {(self.room.id, today): 2, (0, today): 1})
+        increment_room_stats('messages', {(self.room.id, today): 3})
+        increment_room_stats('unlocks', {(self.room.id, today): 1})
+        stats = RoomStats.objects.get(room=self.room, date=today)
+        self.assertEqual((stats.messages, stats.unlocks, stats.owner_id), (5, 1, self.owner.id))
+
+    def test_owner_analytics_reads_rollups(self):
+        rollup_room_stats(timezone.localdate())
+        self.client.force_login(self.owner_user)
+        # Session, user, principal (2), rooms with totals, daily series
+        with self.assertNumQueries(6):
+            data = self.client.get('/api/owner-analytics/', {'days': 7}).json()
+        self.assertEqual(data['totals']['messages'], 3)
+        self.assertEqual([room['title'] for room in data['rooms']], ['r'])
+        self.assertEqual(len(data['daily']), 7)
+        self.assertEqual(data['daily'][-1]['unlocks'], 1)
+        self.assertContains(self.client.get('/owner/analytics/'), 'Booking Requests')
+
+
+# ============================================================================
+# CHAT HISTORY
+# ============================================================================
+
+class ChatHistoryTests(TestCase):
+    """The chat pages back through hot messages and on into the archive"""
+
+    @classmethod
+    def setUpTestData(cls):
+        make_booking_fixtures(cls)
+        conversation = Conversation.objects.create(client=cls.client_profile, owner=cls.owner, room=cls.room)
+        for n in range(5):
+            Message.objects.create(
+                conversation=conversation, room=cls.room, sender=cls.client_user,
+                receiver=cls.owner_user, content=f'old {n}',
+            )
+        archive_conversation(conversation, timezone.now() + timedelta(seconds=1))
+        for n in range(2):
+            Message.objects.create(
+                conversation=conversation, room=cls.room, sender=cls.owner_user,
+                receiver=cls.client_user, content=f'new {n}',
+            )
+
+    def setUp(self):
+        request_logger = logging.getLogger('started.requests')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.WARNING)
+        self.client.force_login(self.client_user)
+
+    def page(self, **params):
+        return self.client.get('/api/messages/', {'room_id': self.room.id, 'limit': 3, **params}).json()
+
+    def test_scrolling_back_continues_into_the_archive(self):
+        self.assertTrue(MessageArchive.objects.exists())
+        first = self.page()
+        self.assertEqual([m['content'] for m in first['messages']], ['old 4', 'new 0', 'new 1'])
+        self.assertTrue(first['has_more'])
+        second = self.page(before=first['messages'][0]['id'])
+        self.assertEqual([m['content'] for m in second['messages']], ['old 1', 'old 2', 'old 3'])
+        third = self.page(before=second['messages'][0]['id'])
+        self.assertEqual([m['content'] for m in third['messages']], ['old 0'])
+        self.assertFalse(third['has_more'])
+
+    def test_invalid_limits_are_rejected(self):
+        for limit in ('0', '-1', 'x'):
+            response = self.client.get('/api/messages/', {'room_id': self.room.id, 'limit': limit})
+            self.assertEqual(response.status_code, 400)
+
+    def test_archiving_bumps_the_participants_message_versions(self):
+        conversation = Conversation.objects.get()
+        versions = [get_version(user.id, 'messages') for user in (self.client_user, self.owner_user)]
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_conversation(conversation, timezone.now() + timedelta(seconds=1))
+        for user, version in zip((self.client_user, self.owner_user), versions):
+            self.assertNotEqual(get_version(user.id, 'messages'), version)
+
+
+# ============================================================================
+# OUTBOX
+# ============================================================================
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        make_booking_fixtures(cls)
+        Outbox.objects.all().delete()
+
+    def setUp(self):
+        request_logger = logging.getLogger('started.requests')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.WARNING)
+        self.delivered = []
+        handlers = patch.dict('started.outbox._handlers', {'test.event': [self.record]})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def record(self, events):
+        if any(event.payload.get('fail') for event in events) and not self.delivered:
+            self.delivered.append('failed')
+            raise RuntimeError('boom')
+        self.delivered.extend(event.payload['n'] for event in events)
+
+    def test_rolled_back_events_are_never_delivered(self):
+        try:
+            with transaction.atomic():
+                emit('test.event', n=1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        emit('test.event', n=2)
+        self.assertEqual(dispatch_pending(), 1)
+        self.assertEqual(self.delivered, [2])
+        self.assertIsNotNone(Outbox.objects.get().dispatched_at)
+
+    def test_failed_batches_are_retried_after_backoff(self):
+        emit('test.event', n=1, fail=True)
+        dispatch_pending()
+        event = Outbox.objects.get()
+        self.assertEqual((event.attempts, event.dispatched_at), (1, None))
+        self.assertIn('boom', event.last_error)
+        # Still backing off
+        self.assertEqual(dispatch_pending(), 0)
+        Outbox.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+        dispatch_pending()
+        self.assertEqual(self.delivered, ['failed', 1])
+
+    @override_settings(OUTBOX_DISPATCH_ON_COMMIT=True)
+    def test_events_are_delivered_once_committed(self):
+        # The background thread's work, run inline
+        with patch('started.outbox._drainer.submit', lambda _: outbox._drain()):
+            with self.captureOnCommitCallbacks(execute=True):
+                emit('test.event', n=1)
+                emit('test.event', n=2)
+                self.assertEqual(self.delivered, [])
+        self.assertEqual(self.delivered, [1, 2])
+
+    def test_only_the_failed_handler_is_retried(self):
+        pushed = []
+
+        def flaky_push(events):
+            if not pushed:
+                pushed.append('failed')
+                raise ConnectionError('layer down')
+            pushed.extend(event.payload['n'] for event in events)
+
+        with patch.dict('started.outbox._handlers', {'test.event': [self.record, flaky_push]}):
+            emit('test.event', n=1)
+            dispatch_pending()
+            self.assertEqual(Outbox.objects.get().dispatched_at, None)
+            Outbox.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+            dispatch_pending()
+        self.assertEqual(self.delivered, [1])
+        self.assertEqual(pushed, ['failed', 1])
+        self.assertIsNotNone(Outbox.objects.get().dispatched_at)
+
+    def test_sent_message_is_pushed_and_counted(self):
+        self.client.force_login(self.client_user)
+        self.client.post('/api/messages/send/', {'room_id': self.room.id, 'content': 'Hi'}, content_type='application/json')
+        self.assertEqual(list(Outbox.objects.values_list('topic', flat=True)), ['message.sent'])
+        dispatch_pending()
+        self.assertEqual(RoomStats.objects.get(room=self.room).messages, 1)
+
+
+# ============================================================================
+# CACHE INVALIDATION BUS
+# ============================================================================
+
+class InvalidationBusTests(TestCase):
+    """This process is subscribed; messages from other workers are sent to the group directly
+
+    The test runner makes the channel layer in-memory.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        make_booking_fixtures(cls)
+
+    def setUp(self):
+        self.layer = get_channel_layer()
+        self.subscriber = Subscriber(self.layer)
+        async_to_sync(self.subscriber.subscribe)()
+        self.addCleanup(async_to_sync(self.subscriber.unsubscribe))
+
+    def test_other_workers_messages_evict_local_entries(self):
+        detail = get_room_detail(self.room.id)
+        # Served from memory: the same object, not a fresh unpickled copy
+        self.assertIs(get_room_detail(self.room.id), detail)
+        async_to_sync(self.layer.group_send)(
+            INVALIDATION_GROUP, {'type': MESSAGE_TYPE, 'scope': 'room', 'ids': [self.room.id]}
+        )
+        async_to_sync(self.subscriber.receive)()
+        self.assertIsNot(get_room_detail(self.room.id), detail)
+        self.assertEqual(get_room_detail(self.room.id), detail)
+
+    def test_writes_are_broadcast_on_commit(self):
+        self.assertFalse(has_unlocked(self.client_profile, self.room))
+        with self.captureOnCommitCallbacks(execute=True):
+            ClientPayment.objects.create(
+                client=self.client_profile, owner=self.owner, room=self.room,
+                status='success', transaction_id='bus-1',
+            )
+            # The shared set is only dropped once the payment commits
+            self.assertEqual(cache.get(_unlocked_rooms_key(self.client_profile.id)), frozenset())
+        self.assertTrue(has_unlocked(self.client_profile, self.room))
+        message = async_to_sync(self.subscriber.receive)()
+        self.assertEqual(message, {'type': MESSAGE_TYPE, 'scope': 'unlocks', 'ids': [self.client_profile.id]})
+
+    def test_bulk_favorites_evict_without_signals(self):
+        self.assertEqual(favorite_room_ids(self.client_profile.id), [])
+        update_favorites(self.client_profile.id, self.client_user.id, add=[self.room.id])
+        self.assertEqual(favorite_room_ids(self.client_profile.id), [self.room.id])
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels_redis.core.RedisChannelLayer'}})
+    def test_listener_receives_on_its_own_layer_instance(self):
+        # channels_redis refuses receive() from two event loops on one
+        # instance; the listener thread's loop must not block consumers'
+        consumers_layer, listener_layer = get_channel_layer(), subscriber_layer()
+        listening, stop = threading.Event(), threading.Event()
+
+        async def listen():
+            channel = await listener_layer.new_channel()
+
+            async def held(real_channel):
+                listening.set()
+                while not stop.is_set():
+                    await asyncio.sleep(0.01)
+                return channel, {'type': MESSAGE_TYPE, 'scope': 'room', 'ids': []}
+
+            with patch.object(listener_layer, 'receive_single', held):
+                await listener_layer.receive(channel)
+
+        async def consume():
+            channel = await consumers_layer.new_channel()
+
+            async def delivered(real_channel):
+                return channel, {'type': 'chat.message'}
+
+            with patch.object(consumers_layer, 'receive_single', delivered):
+                return await consumers_layer.receive(channel)
+
+        listener = threading.Thread(target=lambda: asyncio.run(listen()))
+        listener.start()
+        self.addCleanup(listener.join)
+        self.addCleanup(stop.set)
+        self.assertTrue(listening.wait(5))
+        self.assertEqual(async_to_sync(consume)(), {'type': 'chat.message'})
+
+    def test_local_entries_are_bypassed_while_unsubscribed(self):
+        detail = get_room_detail(self.room.id)
+        async_to_sync(self.subscriber.unsubscribe)()
+        self.assertIsNot(get_room_detail(self.room.id), detail)
+
+
+# ============================================================================
+# TWO-TIER CACHED VIEW DATA
+# ============================================================================
+
+_computed = []
+
+
+@cached_view_data('test_data', timeout=60, stale_timeout=60)
+def slow_square(n):
+    _computed.append(n)
+    time.sleep(0.05)
+    return n * n
+
+
+class TieredCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        reset_metrics()
+        _computed.clear()
+
+    def lookups(self, result):
+        line = f'findmyroom_cache_lookups_total{{cache="test_data",result="{result}"}} '
+        for metric in render_prometheus().splitlines():
+            if metric.startswith(line):
+                return int(metric[len(line):])
+        return 0
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow_square(3))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [9] * 5)
+        self.assertEqual(_computed, [3])
+        self.assertEqual((self.lookups('miss'), self.lookups('coalesced')), (1, 4))
+
+    def test_waits_for_another_process_computing_it(self):
+        # Another worker holds the lock and stores the value shortly
+        cache.add(f'{slow_square.key((4,))}:lock', 1)
+        storer = threading.Timer(0.1, slow_square.store, args=(16, 4))
+        storer.start()
+        self.assertEqual(slow_square(4), 16)
+        storer.join()
+        self.assertEqual(_computed, [])
+        self.assertEqual(self.lookups('coalesced'), 1)
+
+    def test_stale_entries_are_served_while_revalidating(self):
+        slow_square(5)
+        entry = cache.get(slow_square.key((5,)))
+        cache.set(slow_square.key((5,)), {'value': 'old', 'fresh_until': time.time() - 1})
+        # Revalidated inline here, since the test runs in a transaction
+        self.assertEqual(slow_square(5), 'old')
+        self.assertEqual(slow_square(5), entry['value'])
+        self.assertEqual(_computed, [5, 5])
+        self.assertEqual((self.lookups('stale'), self.lookups('hit')), (1, 1))
+
+    def test_fresh_period_is_jittered(self):
+        for n in range(10):
+            slow_square.store(n, n)
+        deadlines = {round(cache.get(slow_square.key((n,)))['fresh_until'], 3) for n in range(10)}
+        self.assertGreater(len(deadlines), 1)
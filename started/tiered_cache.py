@@ -0,0 +1,186 @@
+import inspect
+import logging
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from django.core.cache import cache
+from django.db import connection, connections
+from .instrumentation import record_cache
+from .invalidation import LocalLRU, LOCAL_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# TWO-TIER CACHED VIEW DATA
+# ============================================================================
+# @cached_view_data(name, timeout) caches what a function of hashable
+# arguments returns (a room detail document, the featured room ids, an
+# inbox) in two tiers: a bounded per-process LRU, evicted over the
+# invalidation bus (see invalidation.py), in front of the shared cache
+# (Redis when FINDMYROOM_REDIS_URL is set).
+#
+# Shared entries carry a freshness deadline, jittered so entries written
+# together don't expire together. Past it an entry is still served for up
+# to stale_timeout while one worker recomputes it in the background. On a
+# miss, threads of a process wait for one computation and processes
+# coordinate through a short lock key, so a cold key is computed once
+# rather than by every request that arrives before it's ready.
+#
+# Lookups are counted per cache and result (local_hit, hit, stale,
+# coalesced, miss) and exported by the metrics view.
+
+TTL_JITTER = 0.1  # Fresh for timeout +/- 10%
+LOCK_TIMEOUT = 30
+LOCK_WAIT_SECONDS = 2
+LOCK_POLL_SECONDS = 0.05
+
+# Striped so coalescing doesn't need a lock object per key
+_flight_locks = [threading.Lock() for _ in range(64)]
+_revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-revalidate')
+
+
+def _flight_lock(key):
+    return _flight_locks[zlib.crc32(key.encode()) % len(_flight_locks)]
+
+
+class CachedViewData:
+    """The cached form of func; call it like func"""
+
+    def __init__(self, func, name, timeout, stale_timeout, scope, local_size):
+        self.func = func
+        self.name = name
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.local = LocalLRU(
+            scope, local_size,
+            max_age=min(timeout, LOCAL_MAX_AGE) if timeout else LOCAL_MAX_AGE,
+            keyed=len(inspect.signature(func).parameters) == 1,
+        )
+        wraps(func)(self)
+
+    def key(self, args):
+        return ':'.join(['started:data', self.name, *map(str, args)])
+
+    def _local_key(self, args):
+        # A single id argument is what bus messages for the scope carry
+        return args[0] if len(args) == 1 else args
+
+    def __call__(self, *args):
+        local_key = self._local_key(args)
+        value = self.local.get(local_key)
+        if value is not None:
+            record_cache(self.name, 'local_hit')
+            return value
+
+        generation = self.local.generation
+        value, fresh = self._get(args)
+        if fresh:
+            self.local.set(local_key, value, generation)
+        return value
+
+    def _get(self, args):
+        """(value, fresh) from the shared cache, computing it on a miss"""
+        key = self.key(args)
+        entry = cache.get(key)
+        if entry is not None:
+            if entry['fresh_until'] is None or entry['fresh_until'] > time.time():
+                record_cache(self.name, 'hit')
+                return entry['value'], True
+            record_cache(self.name, 'stale')
+            self._revalidate(args)
+            return entry['value'], False
+
+        with _flight_lock(key):
+            # Computed by another thread while this one waited
+            entry = cache.get(key)
+            if entry is not None:
+                record_cache(self.name, 'coalesced')
+                return entry['value'], True
+            if cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+                record_cache(self.name, 'miss')
+                try:
+                    return self._compute(args), True
+                finally:
+                    cache.delete(f'{key}:lock')
+
+            # Another process is computing it
+            deadline = time.monotonic() + LOCK_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_SECONDS)
+                entry = cache.get(key)
+                if entry is not None:
+                    record_cache(self.name, 'coalesced')
+                    return entry['value'], True
+            record_cache(self.name, 'miss')
+            return self._compute(args), True
+
+    def _revalidate(self, args):
+        lock_key = f'{self.key(args)}:lock'
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            return  # Already being recomputed
+
+        def run():
+            try:
+                self.refresh(*args)
+            except Exception:
+                logger.warning('Cache revalidation failed', exc_info=True, extra={'cache': self.name})
+            finally:
+                cache.delete(lock_key)
+
+        if connection.in_atomic_block:
+            # Another thread wouldn't see this transaction's writes
+            run()
+        else:
+            _revalidator.submit(_in_worker_thread, run)
+
+    def refresh(self, *args):
+        """Recompute and store the value for args; returns it"""
+        value = self._compute(args)
+        self.local.evict([self._local_key(args)])
+        return value
+
+    def store(self, value, *args):
+        """Store a value computed elsewhere for args"""
+        self._store(args, value)
+        self.local.evict([self._local_key(args)])
+
+    def invalidate(self, *args):
+        cache.delete(self.key(args))
+        self.local.evict([self._local_key(args)])
+
+    def _compute(self, args):
+        value = self.func(*args)
+        self._store(args, value)
+        return value
+
+    def _store(self, args, value):
+        if self.timeout is None:
+            fresh_until, timeout = None, None
+        else:
+            fresh = self.timeout * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)
+            fresh_until, timeout = time.time() + fresh, int(fresh + self.stale_timeout) + 1
+        cache.set(self.key(args), {'value': value, 'fresh_until': fresh_until}, timeout)
+
+
+def _in_worker_thread(run):
+    try:
+        run()
+    finally:
+        connections.close_all()
+
+
+def cached_view_data(name, timeout, stale_timeout=0, scope=None, local_size=256):
+    """
+    Cache a function's result in the local LRU and the shared cache.
+
+    timeout=None keeps entries until they're refreshed or invalidated
+    (signal-maintained data). scope names the invalidation bus scope whose
+    messages evict local entries: by the single id argument, or all of them
+    for a function with no or several arguments.
+    """
+    def decorator(func):
+        return CachedViewData(func, name, timeout, stale_timeout, scope, local_size)
+    return decorator
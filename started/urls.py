@@ -5,6 +5,7 @@ urlpatterns = [
     path('', views.home_view, name='home'),
     path('client/dashboard/', views.client_dashboard, name='client_dashboard'),
     path('owner/dashboard/', views.owner_dashboard, name='owner_dashboard'),
+    path('owner/analytics/', views.owner_analytics_page, name='owner_analytics'),
     path('unlock/', views.unlock_room, name='unlock_room'),
     path('voice-search/', views.voice_search, name='voice_search'),
     path('sms-inquiry/', views.send_sms_inquiry, name='sms_inquiry'),
@@ -34,7 +35,15 @@ urlpatterns = [
     path('api/client-messages/', views.get_client_messages, name='get_client_messages'),
     path('api/test-send/', views.test_send_message, name='test_send_message'),
     path('api/favorites/toggle/', views.toggle_favorite, name='toggle_favorite'),
+    path('api/favorites/bulk/', views.bulk_favorites, name='bulk_favorites'),
     path('api/favorites/', views.get_favorites, name='get_favorites'),
+    path('api/recommendations/', views.get_recommendations_api, name='get_recommendations'),
+    path('api/rooms/facets/', views.room_facets_api, name='room_facets'),
+    path('api/localities/', views.locality_autocomplete, name='locality_autocomplete'),
     path('api/book-room/', views.book_room, name='book_room'),
     path('api/booking-status/<int:room_id>/', views.get_booking_status, name='get_booking_status'),
+    path('api/owner-bookings/', views.get_owner_bookings, name='get_owner_bookings'),
+    path('api/owner-bookings/update/', views.update_owner_bookings, name='update_owner_bookings'),
+    path('api/owner-analytics/', views.owner_analytics_api, name='owner_analytics_api'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
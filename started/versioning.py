@@ -0,0 +1,78 @@
+import hashlib
+import uuid
+from functools import wraps
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+# ============================================================================
+# PER-USER VERSION STAMPS
+# ============================================================================
+# Each user has an opaque version token per data scope ('messages',
+# 'favorites', 'bookings'). Writes bump the token once they commit (see
+# signals.py), and the polling APIs derive their ETag from it, so an
+# unchanged poll is answered with 304 Not Modified before the view runs any
+# of its queries.
+
+VERSION_TIMEOUT = 60 * 60 * 24  # 1 day; a lost token just means one full response
+
+
+def _version_key(user_id, scope):
+    return f'started:version:{scope}:{user_id}'
+
+
+def get_version(user_id, scope):
+    key = _version_key(user_id, scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_ids, *scopes):
+    """
+    Invalidate the given scopes for one user id or an iterable of them.
+
+    The new tokens are stored once the current transaction commits: a poll
+    that ran in between would otherwise cache (and tag) the pre-commit data
+    under the new version.
+    """
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    versions = {
+        _version_key(user_id, scope): uuid.uuid4().hex
+        for user_id in user_ids if user_id is not None
+        for scope in scopes
+    }
+    if versions:
+        transaction.on_commit(lambda: cache.set_many(versions, VERSION_TIMEOUT))
+
+
+def versioned_etag(*scopes):
+    """
+    Answer conditional GETs from the user's version stamps.
+
+    Apply below @login_required. The ETag covers the full path (including the
+    query string) so different filters of the same endpoint don't collide.
+    """
+    def etag_func(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return None
+        versions = ':'.join(get_version(request.user.pk, scope) for scope in scopes)
+        return hashlib.md5(
+            f'{request.user.pk}:{request.get_full_path()}:{versions}'.encode()
+        ).hexdigest()
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func)(view_func)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Make browsers revalidate instead of reusing a stale poll result
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return _wrapped_view
+    return decorator
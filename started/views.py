@@ -2,107 +2,136 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from django.http import JsonResponse
-from django.db.models import Q
+from django.http import JsonResponse, HttpResponse, Http404
+from django.db import transaction
+from django.db.models import Q, Count, Case, When, IntegerField
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, condition
+from django.utils.cache import patch_cache_control, get_conditional_response
+from django.core.cache import cache
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.core.mail import send_mail
 from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode, quote_etag
 from django.utils.encoding import force_bytes, force_str
 import json
+import logging
 import stripe
-from .models import Room, Payment, ChatAccess, Message, UserProfile, Owner, Client, RoomAccess, ClientPayment, Conversation, FavoriteRoom, RoomImage, Booking
+from itertools import islice
+from .models import Room, Payment, ChatAccess, Message, UserProfile, Owner, Client, RoomAccess, ClientPayment, Conversation, RoomImage, Booking, MessageArchive
 from django.utils import timezone
 import requests
 import hashlib
 from .forms import RoomForm
 from .decorators import owner_required, client_required
+from .entitlements import has_unlocked, unlocked_rooms as get_unlocked_rooms
+from .versioning import versioned_etag, bump_version, get_version
+from .inbox import client_conversations, owner_conversations
+from .analytics import owner_analytics, DEFAULT_ANALYTICS_DAYS, MAX_ANALYTICS_DAYS
+from .bookings import request_booking, owner_update_bookings, InvalidTransition, OWNER_ACTIONS as OWNER_BOOKING_ACTIONS, MAX_BULK_BOOKINGS
+from .outbox import emit_message_sent, emit_payment_succeeded
+from .favorites import favorite_room_ids, update_favorites, toggle_favorite as toggle_favorite_room, MAX_BULK_FAVORITES
+from .routers import pin_to_primary, replica_reads
+from .archive import archived_messages
+from .instrumentation import query_budget, render_prometheus
+from .recommendations import recommendations as get_recommendations
+from .search import search_page, room_facets, location_buckets
+from .localities import get_locality_table
+from .query_parser import parse_query
+from .room_details import get_room_detail, ROOM_DETAIL_MAX_AGE, ROOM_DETAIL_IMMUTABLE_MAX_AGE
+from .featured import get_featured, featured_rooms as get_featured_rooms, home_page_key, HOME_PAGE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Top recommendations that get a "RECOMMENDED" badge on the dashboard
+RECOMMENDED_BADGE_COUNT = 6
+VOICE_SEARCH_PAGE_SIZE = 10
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+def _home_etag(request):
+    # Only anonymous visitors get conditional GETs; logged-in users see
+    # a personalised header
+    if request.user.is_authenticated:
+        return None
+    return get_featured()['etag']
+
+def _home_last_modified(request):
+    if request.user.is_authenticated:
+        return None
+    return get_featured()['last_modified']
+
+@query_budget(6)
+@replica_reads
+@condition(etag_func=_home_etag, last_modified_func=_home_last_modified)
 def home_view(request):
     """Landing page for the website"""
-    # Ensure user has profile if authenticated
-    if request.user.is_authenticated:
-        UserProfile.objects.get_or_create(user=request.user)
+    featured = get_featured()
     
-    # Get featured rooms for display
-    featured_rooms = Room.objects.all()[:6]  # Show 6 featured rooms
+    # Every anonymous visitor sees the same page (unless a flash message
+    # is pending), so serve it from the cache
+    anonymous = not request.user.is_authenticated
+    cacheable = anonymous and not len(messages.get_messages(request))
+    page_key = home_page_key(featured['etag'])
     
-    context = {
-        'featured_rooms': featured_rooms,
-    }
-    return render(request, 'started/home.html', context)
+    html = cache.get(page_key) if cacheable else None
+    if html is not None:
+        response = HttpResponse(html)
+    else:
+        context = {
+            'featured_rooms': get_featured_rooms(),  # Precomputed newest 6 rooms
+        }
+        response = render(request, 'started/home.html', context)
+        if cacheable:
+            cache.set(page_key, response.content, HOME_PAGE_TIMEOUT)
+    
+    if anonymous:
+        # Let browsers keep the page but revalidate it with ETag/Last-Modified
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required
+@query_budget(14)
+@replica_reads
 def client_dashboard(request):
-    # Ensure user has profile
-    UserProfile.objects.get_or_create(user=request.user)
-    
-    # Check if user has client profile, create if missing
-    try:
-        client = request.user.client
-    except Client.DoesNotExist:
+    # Role and profile are resolved once per request by PrincipalMiddleware
+    client_id = request.principal.client_id
+    if client_id is None:
         messages.error(request, 'No Client profile found. Please register as Client first.')
         return redirect('register')
     
-    rooms = Room.objects.all()
-    
-    # Search and filter
-    q = request.GET.get('q')
-    location = request.GET.get('location')
-    price_min = request.GET.get('price_min')
-    price_max = request.GET.get('price_max')
-    room_type = request.GET.get('room_type')
-    favorites_only = request.GET.get('favorites_only')
-    
-    if q:
-        rooms = rooms.filter(
-            Q(title__icontains=q) | 
-            Q(location__icontains=q) | 
-            Q(description__icontains=q)
-        )
-    
-    if location and location != 'Any Location':
-        rooms = rooms.filter(location__icontains=location)
-    
-    if price_min:
-        rooms = rooms.filter(price__gte=price_min)
+    # Server-side recommendations; sort=relevance puts them first, best first
+    recommended = get_recommendations(client_id)
+    ranking = recommended['ids'] if request.GET.get('sort') == 'relevance' else None
     
-    if price_max:
-        rooms = rooms.filter(price__lte=price_max)
-    
-    if room_type and room_type != 'Any Type':
-        rooms = rooms.filter(room_type=room_type)
-    
-    if favorites_only:
-        favorite_room_ids = FavoriteRoom.objects.filter(client=client).values_list('room_id', flat=True)
-        rooms = rooms.filter(id__in=favorite_room_ids)
+    # Search and filter (shared with the facets API and voice search)
+    page = search_page(request.GET, client_id, request.GET.get('page'), ranking=ranking)
+    page_query = request.GET.copy()
+    page_query.pop('page', None)
     
     # Check which rooms user has paid for
     unlocked_rooms = []
     favorite_rooms = []
     if request.user.is_authenticated:
         try:
-            unlocked_rooms = ClientPayment.objects.filter(
-                client=client,
-                status='success'
-            ).values_list('room_id', flat=True)
+            unlocked_rooms = get_unlocked_rooms(client_id)
             
-            favorite_rooms = FavoriteRoom.objects.filter(
-                client=client
-            ).values_list('room_id', flat=True)
+            favorite_rooms = favorite_room_ids(client_id)
         except:
             unlocked_rooms = []
             favorite_rooms = []
     
     context = {
-        'rooms': rooms,
-        'unlocked_rooms': list(unlocked_rooms),
-        'favorite_rooms': list(favorite_rooms),
+        'rooms': page.object_list,
+        'page_obj': page,
+        'page_query': page_query.urlencode(),
+        'localities': location_buckets(),
+        # Sets, so the per-card membership checks outside the cached
+        # room card fragments stay cheap
+        'unlocked_rooms': set(unlocked_rooms),
+        'favorite_rooms': set(favorite_rooms),
+        'recommended_room_ids': recommended['ids'][:RECOMMENDED_BADGE_COUNT],
         'room_unlock_price': 30,  # Rs 30 per room
     }
     return render(request, 'started/client_dashboard.html', context)
@@ -126,13 +155,9 @@ def unread_messages_api(request):
     return JsonResponse(data, safe=False)
 @login_required
 def owner_dashboard(request):
-    # Ensure user has profile
-    UserProfile.objects.get_or_create(user=request.user)
-    
-    # Check if user has owner profile, create if missing
-    try:
-        owner = request.user.owner
-    except Owner.DoesNotExist:
+    # Role and profile are resolved once per request by PrincipalMiddleware
+    owner_id = request.principal.owner_id
+    if owner_id is None:
         messages.error(request, 'No Owner profile found. Please register as Owner first.')
         return redirect('register')
     
@@ -141,7 +166,7 @@ def owner_dashboard(request):
         
         if form.is_valid():
             room = form.save(commit=False)
-            room.owner = owner
+            room.owner_id = owner_id
             room.save()
             
             # Handle multiple image uploads
@@ -160,13 +185,36 @@ def owner_dashboard(request):
     else:
         form = RoomForm()
     
-    owner_rooms = Room.objects.filter(owner=owner).order_by('-created_at')
+    owner_rooms = Room.objects.filter(owner_id=owner_id).order_by('-created_at')
     
     return render(request, 'started/owner_dashboard.html', {
         'form': form,
         'owner_rooms': owner_rooms
     })
 
+def _analytics_days(request):
+    try:
+        days = int(request.GET.get('days', DEFAULT_ANALYTICS_DAYS))
+    except ValueError:
+        days = DEFAULT_ANALYTICS_DAYS
+    return min(max(days, 1), MAX_ANALYTICS_DAYS)
+
+@owner_required
+@query_budget(6)
+def owner_analytics_page(request):
+    """Pending booking requests and the precomputed per-room statistics"""
+    return render(request, 'started/owner_analytics.html', {
+        'analytics': owner_analytics(request.principal.owner_id, _analytics_days(request)),
+    })
+
+@login_required
+@query_budget(6)
+def owner_analytics_api(request):
+    owner_id = request.principal.owner_id
+    if owner_id is None:
+        return JsonResponse({'error': 'Owner account required'}, status=403)
+    return JsonResponse(owner_analytics(owner_id, _analytics_days(request)))
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def unlock_room(request):
@@ -178,14 +226,11 @@ def unlock_room(request):
         room_id = data.get('room_id')
         room = get_object_or_404(Room, id=room_id)
         
-        # Check if already unlocked via ClientPayment
-        client_payment = ClientPayment.objects.filter(
-            client=request.user.client,
-            room=room,
-            status='success'
-        ).first()
+        if not request.principal.is_client:
+            return JsonResponse({'success': False, 'error': 'Client account required'})
         
-        if client_payment:
+        # Check if already unlocked via ClientPayment
+        if has_unlocked(request.principal.client_id, room):
             contact_details = {
                 'phone': room.contact_phone,
                 'email': room.contact_email,
@@ -212,46 +257,35 @@ def unlock_room(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@query_budget(6)
 def voice_search(request):
     try:
         data = json.loads(request.body)
-        transcript = data.get('transcript', '').lower()
-        
-        # Process voice commands
-        filters = {}
-        
-        # Location detection
-        if 'downtown' in transcript:
-            filters['location__icontains'] = 'downtown'
-        elif 'university' in transcript:
-            filters['location__icontains'] = 'university'
-        elif 'business' in transcript:
-            filters['location__icontains'] = 'business'
+        transcript = data.get('transcript', '')
         
-        # Room type detection
-        if 'studio' in transcript:
-            filters['room_type'] = 'studio'
-        elif 'apartment' in transcript:
-            filters['room_type'] = 'apartment'
-        elif 'private' in transcript:
-            filters['room_type'] = 'private'
-        elif 'shared' in transcript:
-            filters['room_type'] = 'shared'
-        
-        # Price detection
-        if 'under' in transcript or 'below' in transcript:
-            import re
-            price_match = re.search(r'(\d+)', transcript)
-            if price_match:
-                filters['price__lte'] = int(price_match.group(1))
-        
-        rooms = Room.objects.filter(**filters) if filters else Room.objects.all()
+        # Same filters and search path as the dashboard
+        filters = parse_query(transcript)
+        page = search_page(filters, request.principal.client_id, data.get('page'), per_page=VOICE_SEARCH_PAGE_SIZE)
+        count = page.paginator.count
         
         return JsonResponse({
             'success': True,
             'filters': filters,
-            'count': rooms.count(),
-            'message': f'Found {rooms.count()} rooms matching your voice search'
+            'count': count,
+            'page': page.number,
+            'num_pages': page.paginator.num_pages,
+            'results': [
+                {
+                    'id': room.id,
+                    'title': room.title,
+                    'room_type': room.room_type,
+                    'location': room.location,
+                    'price': str(room.price),
+                    'beds': room.beds,
+                }
+                for room in page
+            ],
+            'message': f'Found {count} rooms matching your voice search'
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -276,27 +310,25 @@ def send_sms_inquiry(request):
 
 @login_required
 def delete_room(request, room_id):
-    try:
-        owner = request.user.owner
-    except Owner.DoesNotExist:
+    owner_id = request.principal.owner_id
+    if owner_id is None:
         messages.error(request, 'Access denied. Owner account required.')
         return redirect('login')
     
     if request.method == 'POST':
-        room = get_object_or_404(Room, id=room_id, owner=owner)
+        room = get_object_or_404(Room, id=room_id, owner_id=owner_id)
         room.delete()
         messages.success(request, 'Room deleted successfully!')
     return redirect('owner_dashboard')
 
 @login_required
 def edit_room(request, room_id):
-    try:
-        owner = request.user.owner
-    except Owner.DoesNotExist:
+    owner_id = request.principal.owner_id
+    if owner_id is None:
         messages.error(request, 'Access denied. Owner account required.')
         return redirect('login')
     
-    room = get_object_or_404(Room, id=room_id, owner=owner)
+    room = get_object_or_404(Room, id=room_id, owner_id=owner_id)
     if request.method == 'POST':
         form = RoomForm(request.POST, request.FILES, instance=room)
         
@@ -336,15 +368,19 @@ def create_payment_intent(request):
             if not room.owner:
                 return JsonResponse({'error': 'Room has no owner assigned'}, status=400)
             
+            client_id = request.principal.client_id
+            if client_id is None:
+                return JsonResponse({'error': 'Client account required'}, status=403)
+            
             # Check if already unlocked
-            if ClientPayment.objects.filter(client=request.user.client, room=room, status='success').exists():
+            if has_unlocked(client_id, room):
                 return JsonResponse({'error': 'Room already unlocked'}, status=400)
             
             # Create pending payment record
             transaction_id = f'room_unlock_{room_id}_{int(timezone.now().timestamp())}'
             
             client_payment, created = ClientPayment.objects.get_or_create(
-                client=request.user.client,
+                client_id=client_id,
                 room=room,
                 defaults={
                     'owner': room.owner,
@@ -404,6 +440,7 @@ def stripe_webhook(request):
     return JsonResponse({'status': 'success'})
 
 @login_required
+@query_budget(10)
 def get_messages(request):
     room_id = request.GET.get('room_id')
     client_id = request.GET.get('client_id')
@@ -411,17 +448,29 @@ def get_messages(request):
     if not room_id:
         return JsonResponse({'error': 'Room ID required'}, status=400)
     
-    room = get_object_or_404(Room, id=room_id)
+    # Optional paging: `limit` newest messages older than message id `before`
+    try:
+        before = int(request.GET['before']) if request.GET.get('before') else None
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid paging parameters'}, status=400)
+    if limit is not None and limit < 1:
+        return JsonResponse({'error': 'Invalid paging parameters'}, status=400)
+    
+    room = get_object_or_404(Room.objects.select_related('owner__user'), id=room_id)
+    archives = MessageArchive.objects.filter(room=room)
     
     # Determine access based on user role
-    if hasattr(request.user, 'client'):
+    principal = request.principal
+    if principal.is_client:
         # Client can see all messages in the room between them and the owner
         messages = Message.objects.filter(
             room=room
         ).filter(
             Q(sender=request.user, receiver=room.owner.user) | Q(sender=room.owner.user, receiver=request.user)
         ).order_by('timestamp')
-    elif hasattr(request.user, 'owner') and room.owner == request.user.owner:
+        archives = archives.filter(conversation__client_id=principal.client_id)
+    elif principal.is_owner and room.owner_id == principal.owner_id:
         if client_id:
             client_user = get_object_or_404(User, id=client_id)
             messages = Message.objects.filter(
@@ -429,6 +478,7 @@ def get_messages(request):
             ).filter(
                 Q(sender=client_user, receiver=request.user) | Q(sender=request.user, receiver=client_user)
             ).order_by('timestamp')
+            archives = archives.filter(conversation__client__user=client_user)
         else:
             messages = Message.objects.filter(
                 room=room
@@ -438,8 +488,17 @@ def get_messages(request):
     else:
         return JsonResponse({'error': 'Access denied'}, status=403)
     
+    messages = messages.select_related('sender__userprofile')
+    if before is not None:
+        messages = messages.filter(id__lt=before)
+    
+    if limit is None:
+        hot_messages = list(messages)
+    else:
+        hot_messages = list(messages.order_by('-id')[:limit])[::-1]
+    
     messages_data = []
-    for msg in messages:
+    for msg in hot_messages:
         profile_image = None
         try:
             profile_image = msg.sender.userprofile.get_profile_image()
@@ -457,7 +516,49 @@ def get_messages(request):
             'is_mine': msg.sender == request.user
         })
     
-    return JsonResponse({'messages': messages_data})
+    # Scrolled back past the hot table: continue from the archive
+    if limit is not None and len(hot_messages) < limit:
+        oldest_id = hot_messages[0].id if hot_messages else before
+        archived = list(islice(archived_messages(archives, before_id=oldest_id), limit - len(hot_messages)))
+        messages_data = _archived_messages_data(archived, request.user) + messages_data
+    
+    # Whether the client can scroll back further
+    if limit is None:
+        has_more = archives.exists()
+    elif messages_data:
+        oldest_id = messages_data[0]['id']
+        has_more = (messages.filter(id__lt=oldest_id).exists()
+                    or archives.filter(first_message_id__lt=oldest_id).exists())
+    else:
+        has_more = False
+    
+    return JsonResponse({'messages': messages_data, 'has_more': has_more})
+
+def _archived_messages_data(archived, user):
+    """Shape archived rows (newest first) like get_messages' live rows, oldest first"""
+    senders = User.objects.select_related('userprofile').in_bulk({row['sender_id'] for row in archived})
+    
+    messages_data = []
+    for row in reversed(archived):
+        sender = senders.get(row['sender_id'])
+        profile_image = None
+        try:
+            profile_image = sender.userprofile.get_profile_image()
+        except:
+            pass
+        
+        messages_data.append({
+            'id': row['id'],
+            'sender_id': row['sender_id'],
+            'sender_name': (sender.get_full_name() or sender.username) if sender else '',
+            'profile_image': profile_image,
+            'content': row['content'],
+            'timestamp': row['timestamp'],
+            'read_status': row['read_status'],
+            'is_mine': row['sender_id'] == user.id,
+            'archived': True
+        })
+    return messages_data
 
 @csrf_exempt
 @login_required
@@ -477,9 +578,10 @@ def send_message(request):
         room = get_object_or_404(Room, id=room_id)
         
         # Determine receiver based on sender role
-        if hasattr(request.user, 'client'):
+        principal = request.principal
+        if principal.is_client:
             receiver = room.owner.user
-        elif hasattr(request.user, 'owner') and room.owner == request.user.owner:
+        elif principal.is_owner and room.owner_id == principal.owner_id:
             if client_id:
                 receiver = get_object_or_404(User, id=client_id)
             else:
@@ -497,27 +599,29 @@ def send_message(request):
             return JsonResponse({'error': 'Access denied'}, status=403)
         
         # Get or create conversation
-        if hasattr(request.user, 'client'):
+        if principal.is_client:
             conversation, created = Conversation.objects.get_or_create(
-                client=request.user.client,
-                owner=room.owner,
+                client_id=principal.client_id,
+                owner_id=room.owner_id,
                 room=room
             )
         else:
             # Owner sending to client
             conversation, created = Conversation.objects.get_or_create(
                 client=receiver.client,
-                owner=request.user.owner,
+                owner_id=principal.owner_id,
                 room=room
             )
         
-        message = Message.objects.create(
-            conversation=conversation,
-            sender=request.user,
-            receiver=receiver,
-            room=room,
-            content=content
-        )
+        with transaction.atomic():
+            message = Message.objects.create(
+                conversation=conversation,
+                sender=request.user,
+                receiver=receiver,
+                room=room,
+                content=content
+            )
+            emit_message_sent(message)
         
         return JsonResponse({
             'success': True,
@@ -543,11 +647,16 @@ def mark_messages_read(request):
             receiver=request.user
         ).update(read_status=True)
         
+        # update() skips post_save, so bump the inbox version here
+        bump_version(request.user.pk, 'messages')
+        
         return JsonResponse({'status': 'success'})
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
 @login_required
+@query_budget(5)
+@versioned_etag('messages')
 def get_unread_count(request):
     count = Message.objects.filter(
         receiver=request.user,
@@ -632,16 +741,8 @@ def profile_settings(request):
 def login_view(request):
     if request.user.is_authenticated:
         # Redirect based on user role
-        try:
-            request.user.owner
+        if request.principal.is_owner:
             return redirect('owner_dashboard')
-        except Owner.DoesNotExist:
-            pass
-        try:
-            request.user.client
-            return redirect('client_dashboard')
-        except Client.DoesNotExist:
-            pass
         return redirect('client_dashboard')
     
     if request.method == 'POST':
@@ -680,16 +781,8 @@ def login_view(request):
 
 def register_view(request):
     if request.user.is_authenticated:
-        try:
-            request.user.owner
+        if request.principal.is_owner:
             return redirect('owner_dashboard')
-        except Owner.DoesNotExist:
-            pass
-        try:
-            request.user.client
-            return redirect('client_dashboard')
-        except Client.DoesNotExist:
-            pass
         return redirect('client_dashboard')
     
     if request.method == 'POST':
@@ -798,39 +891,17 @@ def esewa_webhook(request):
                             import string
                             verification_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
                             
-                            # Update payment status
-                            client_payment.status = 'success'
-                            client_payment.esewa_ref_id = refId
-                            client_payment.verification_code = verification_code
-                            client_payment.paid_at = timezone.now()
-                            client_payment.save()
-                            
-                            # Send verification code via email/SMS (optional)
-                            try:
-                                from django.core.mail import send_mail
-                                send_mail(
-                                    'Room Unlock Code',
-                                    f'Your verification code: {verification_code}\nUse this code to unlock room chat.',
-                                    settings.DEFAULT_FROM_EMAIL,
-                                    [client_payment.client.user.email],
-                                    fail_silently=True,
-                                )
-                            except:
-                                pass
-                            
-                            # Send real-time unlock notification via WebSocket
-                            from channels.layers import get_channel_layer
-                            from asgiref.sync import async_to_sync
-                            
-                            channel_layer = get_channel_layer()
-                            async_to_sync(channel_layer.group_send)(
-                                f'client_{client_payment.client.user.id}',
-                                {
-                                    'type': 'payment_success',
-                                    'room_id': room_id,
-                                    'message': 'Payment successful! Chat unlocked.'
-                                }
-                            )
+                            # Update payment status; the code email and the
+                            # real-time unlock notification go out through
+                            # the outbox once this commits
+                            with transaction.atomic():
+                                client_payment.status = 'success'
+                                client_payment.esewa_ref_id = refId
+                                client_payment.paid_at = timezone.now()
+                                client_payment.save()
+                                emit_payment_succeeded(client_payment, verification_code=verification_code)
+                            # This response goes to eSewa, not the client's browser
+                            pin_to_primary(client_payment.client.user_id)
                             
                             return JsonResponse({'status': 'success'})
             
@@ -853,26 +924,28 @@ def esewa_success(request):
             room = get_object_or_404(Room, id=room_id)
             
             # Create or update ClientPayment record
-            client_payment, created = ClientPayment.objects.get_or_create(
-                client=request.user.client,
-                room=room,
-                defaults={
-                    'owner': room.owner,
-                    'amount': 30.00,
-                    'transaction_id': oid,
-                    'esewa_ref_id': refId,
-                    'verification_code': ''.join(__import__('random').choices(__import__('string').ascii_uppercase + __import__('string').digits, k=6)),
-                    'status': 'success',
-                    'paid_at': timezone.now()
-                }
-            )
-            
-            if not created:
-                client_payment.status = 'success'
-                client_payment.esewa_ref_id = refId
-                client_payment.verification_code = ''.join(__import__('random').choices(__import__('string').ascii_uppercase + __import__('string').digits, k=6))
-                client_payment.paid_at = timezone.now()
-                client_payment.save()
+            with transaction.atomic():
+                client_payment, created = ClientPayment.objects.get_or_create(
+                    client_id=request.principal.client_id,
+                    room=room,
+                    defaults={
+                        'owner': room.owner,
+                        'amount': 30.00,
+                        'transaction_id': oid,
+                        'esewa_ref_id': refId,
+                        'status': 'success',
+                        'paid_at': timezone.now()
+                    }
+                )
+                
+                if not created:
+                    client_payment.status = 'success'
+                    client_payment.esewa_ref_id = refId
+                    client_payment.paid_at = timezone.now()
+                    client_payment.save()
+                emit_payment_succeeded(client_payment)
+            # A GET sets no pin cookie, and the dashboard must see the unlock
+            pin_to_primary(request.user.pk)
             
             messages.success(request, 'Payment successful! Room unlocked.')
             return redirect(f'/client/dashboard/?payment=success&room={room_id}&open_chat=true')
@@ -917,22 +990,25 @@ def khalti_verify(request):
                 room = get_object_or_404(Room, id=room_id)
                 
                 # Update or create ClientPayment record
-                client_payment, created = ClientPayment.objects.get_or_create(
-                    client=request.user.client,
-                    room=room,
-                    defaults={
-                        'owner': room.owner,
-                        'amount': 30.00,
-                        'transaction_id': transaction_id,
-                        'status': 'success',
-                        'paid_at': timezone.now()
-                    }
-                )
-                
-                if not created:
-                    client_payment.status = 'success'
-                    client_payment.paid_at = timezone.now()
-                    client_payment.save()
+                with transaction.atomic():
+                    client_payment, created = ClientPayment.objects.get_or_create(
+                        client_id=request.principal.client_id,
+                        room=room,
+                        defaults={
+                            'owner': room.owner,
+                            'amount': 30.00,
+                            'transaction_id': transaction_id,
+                            'status': 'success',
+                            'paid_at': timezone.now()
+                        }
+                    )
+                    
+                    if not created:
+                        client_payment.status = 'success'
+                        client_payment.paid_at = timezone.now()
+                        client_payment.save()
+                    emit_payment_succeeded(client_payment)
+                pin_to_primary(request.user.pk)
                 
                 return JsonResponse({'success': True, 'message': 'Payment verified successfully'})
             else:
@@ -988,7 +1064,7 @@ LuxeRooms Team
                     messages.success(request, f'A 6-digit PIN has been sent to {email}. Please check your email.')
                     return redirect('password_reset_confirm')
                 except Exception as e:
-                    print(f'Email error: {e}')  # Debug print
+                    logger.exception('Password reset email failed', extra={'user_id': user.id})
                     messages.error(request, f'Failed to send email: {str(e)}')
                     
             except User.DoesNotExist:
@@ -1037,95 +1113,36 @@ def password_reset_confirm_view(request):
 
 
 @login_required
+@query_budget(4)
 def get_room_info(request, room_id):
-    try:
-        room = get_object_or_404(Room, id=room_id)
-        
-        # Get all images for the room
-        images = []
-        if room.images.exists():
-            images = [request.build_absolute_uri(img.image.url) for img in room.images.all()]
-        elif room.image:
-            images = [request.build_absolute_uri(room.image.url)]
-        
-        print(f"Room {room_id} coordinates from DB: lat={room.latitude}, lng={room.longitude}")
-        print(f"Room {room_id} coordinate types: lat={type(room.latitude)}, lng={type(room.longitude)}")
-        print(f"Room {room_id} coordinate values are None: lat={room.latitude is None}, lng={room.longitude is None}")
-        
-        # Convert Decimal to string for JSON serialization
-        latitude_str = str(room.latitude) if room.latitude is not None else None
-        longitude_str = str(room.longitude) if room.longitude is not None else None
-        print(f"Room {room_id} converted coordinates: lat_str={latitude_str}, lng_str={longitude_str}")
-        
-        response_data = {
-            'owner_name': room.owner.user.get_full_name() or room.owner.user.username,
-            'room_title': room.title,
-            'images': images,
-            'location': room.location,
-            'latitude': latitude_str,
-            'longitude': longitude_str
-        }
-        
-        print(f"API Response for room {room_id}: {response_data}")
-        return JsonResponse(response_data)
-    except Exception as e:
-        print(f"Error in get_room_info: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'error': str(e)}, status=400)
+    """Precomputed room detail document; see room_details.py"""
+    detail = get_room_detail(room_id)
+    if detail is None:
+        return JsonResponse({'error': 'Room not found'}, status=404)
+    
+    response = JsonResponse(detail['data'])
+    response['ETag'] = quote_etag(detail['etag'])
+    if request.GET.get('v') == str(detail['version']):
+        # The URL names this exact version, so it can never change
+        patch_cache_control(response, private=True, max_age=ROOM_DETAIL_IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, private=True, max_age=ROOM_DETAIL_MAX_AGE)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Room info', extra={'room_id': room_id, 'version': detail['version']})
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
 
 @login_required
+@query_budget(8)
+@versioned_etag('messages')
 def get_client_messages(request):
-    try:
-        client = request.user.client
-    except Client.DoesNotExist:
+    if not request.principal.is_client:
         return JsonResponse({'error': 'Client account required'}, status=403)
     
     try:
-        conversations = []
-        
-        # Get all rooms where client has messages
-        rooms_with_messages = Message.objects.filter(
-            Q(sender=request.user) | Q(receiver=request.user)
-        ).values_list('room', flat=True).distinct()
-        
-        for room_id in rooms_with_messages:
-            room = Room.objects.get(id=room_id)
-            
-            # Get latest message in this room
-            latest_message = Message.objects.filter(
-                room=room
-            ).filter(
-                Q(sender=request.user) | Q(receiver=request.user)
-            ).order_by('-timestamp').first()
-            
-            if latest_message:
-                unread_count = Message.objects.filter(
-                    room=room,
-                    receiver=request.user,
-                    read_status=False
-                ).count()
-                
-                try:
-                    profile_image = room.owner.user.userprofile.get_profile_image()
-                except:
-                    profile_image = None
-                
-                conversations.append({
-                    'room_id': room.id,
-                    'room_title': room.title,
-                    'owner_id': room.owner.user.id,
-                    'owner_name': room.owner.user.get_full_name() or room.owner.user.username,
-                    'profile_image': profile_image,
-                    'room_location': room.location,
-                    'last_message': latest_message.content[:50] + ('...' if len(latest_message.content) > 50 else ''),
-                    'last_message_time': latest_message.timestamp.isoformat(),
-                    'unread_count': unread_count
-                })
-        
-        conversations.sort(key=lambda x: x['last_message_time'], reverse=True)
-        return JsonResponse({'conversations': conversations})
-        
+        # Cached per inbox version; see inbox.py
+        version = get_version(request.user.pk, 'messages')
+        return JsonResponse({'conversations': client_conversations(request.user.pk, version)})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -1147,9 +1164,9 @@ def test_send_message(request):
         room = get_object_or_404(Room, id=room_id)
         
         # Simple logic: client sends to owner, owner sends to first client who messaged
-        if hasattr(request.user, 'client'):
+        if request.principal.is_client:
             receiver = room.owner.user
-        elif hasattr(request.user, 'owner'):
+        elif request.principal.is_owner:
             # Find any client who has messaged in this room
             client_message = Message.objects.filter(
                 room=room,
@@ -1186,254 +1203,231 @@ def test_send_message(request):
 
 @csrf_exempt
 @login_required
+@query_budget(7)
 def toggle_favorite(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'POST required'}, status=405)
     
+    client_id = request.principal.client_id
+    if client_id is None:
+        return JsonResponse({'error': 'Client account required'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        room_id = int(data.get('room_id'))
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'room_id required'}, status=400)
+    
     try:
-        client = request.user.client
-    except Client.DoesNotExist:
+        favorited = toggle_favorite_room(client_id, request.user.pk, room_id)
+        if favorited is None:
+            return JsonResponse({'error': 'Room not found'}, status=404)
+        return JsonResponse({'success': True, 'favorited': favorited})
+    except Exception as e:
+        logger.exception('Toggling favorite failed')
+        return JsonResponse({'error': str(e)}, status=500)
+
+@login_required
+@query_budget(9)
+def bulk_favorites(request):
+    """Add and remove many favorites at once: {"add": [ids], "remove": [ids]}"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    
+    client_id = request.principal.client_id
+    if client_id is None:
         return JsonResponse({'error': 'Client account required'}, status=403)
     
     try:
         data = json.loads(request.body)
-        room_id = data.get('room_id')
-        room = get_object_or_404(Room, id=room_id)
-        
-        favorite, created = FavoriteRoom.objects.get_or_create(
-            client=client,
-            room=room
-        )
-        
-        if not created:
-            favorite.delete()
-            return JsonResponse({'success': True, 'favorited': False})
-        else:
-            return JsonResponse({'success': True, 'favorited': True})
-            
+        add = [int(room_id) for room_id in data.get('add', [])]
+        remove = [int(room_id) for room_id in data.get('remove', [])]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'add and remove must be lists of room ids'}, status=400)
+    if len(add) + len(remove) > MAX_BULK_FAVORITES:
+        return JsonResponse({'error': f'At most {MAX_BULK_FAVORITES} rooms per request'}, status=400)
+    
+    try:
+        update_favorites(client_id, request.user.pk, add=add, remove=remove)
+        # The resulting set, so the dashboard can reconcile optimistic updates
+        return JsonResponse({'success': True, 'favorites': favorite_room_ids(client_id)})
     except Exception as e:
+        logger.exception('Bulk favorite update failed')
         return JsonResponse({'error': str(e)}, status=500)
 
 @login_required
+@query_budget(5)
+@versioned_etag('favorites')
 def get_favorites(request):
-    try:
-        client = request.user.client
-    except Client.DoesNotExist:
+    client_id = request.principal.client_id
+    if client_id is None:
         return JsonResponse({'error': 'Client account required'}, status=403)
     
     try:
-        favorites = FavoriteRoom.objects.filter(client=client).select_related('room')
-        favorite_rooms = [fav.room.id for fav in favorites]
-        return JsonResponse({'favorites': favorite_rooms})
+        return JsonResponse({'favorites': favorite_room_ids(client_id)})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+@query_budget(2)
+def locality_autocomplete(request):
+    """Locality name suggestions for a prefix, served from memory"""
+    suggestions = [
+        {'id': locality['id'], 'name': locality['name'], 'slug': locality['slug']}
+        for locality in get_locality_table().complete(request.GET.get('q', ''))
+    ]
+    response = JsonResponse({'localities': suggestions})
+    patch_cache_control(response, public=True, max_age=300)
+    return response
+
 @login_required
-def get_owner_messages(request):
+@query_budget(6)
+@replica_reads
+def room_facets_api(request):
+    """Facet counts for the dashboard filters (see search.room_facets)"""
+    return JsonResponse(room_facets(request.GET, request.principal.client_id))
+
+@login_required
+@query_budget(10)
+def get_recommendations_api(request):
+    client_id = request.principal.client_id
+    if client_id is None:
+        return JsonResponse({'error': 'Client account required'}, status=403)
+    
     try:
-        owner = request.user.owner
-    except Owner.DoesNotExist:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    
+    recommended = get_recommendations(client_id)
+    return JsonResponse({'recommendations': [
+        {'room_id': room_id, 'score': score}
+        for room_id, score in zip(recommended['ids'][:limit], recommended['scores'][:limit])
+    ]})
+
+@login_required
+@query_budget(8)
+@versioned_etag('messages')
+def get_owner_messages(request):
+    owner_id = request.principal.owner_id
+    if owner_id is None:
         return JsonResponse({'error': 'Owner account required'}, status=403)
     
     try:
-        conversations = []
-        client_ids = set()
-        
-        # Get unique clients who have messaged the owner
-        unique_clients = Message.objects.filter(
-            room__owner=owner
-        ).filter(
-            Q(sender__client__isnull=False, receiver=request.user) | Q(sender=request.user, receiver__client__isnull=False)
-        ).values_list('sender', 'receiver').distinct()
-        
-        for sender_id, receiver_id in unique_clients:
-            if sender_id != request.user.id:
-                client_ids.add(sender_id)
-            if receiver_id != request.user.id:
-                client_ids.add(receiver_id)
-        
-        for client_id in client_ids:
-            client_user = User.objects.get(id=client_id)
-            
-            # Get latest message between this specific client and owner
-            latest_message = Message.objects.filter(
-                room__owner=owner
-            ).filter(
-                Q(sender=client_user, receiver=request.user) | Q(sender=request.user, receiver=client_user)
-            ).order_by('-timestamp').first()
-                
-            if latest_message:
-                unread_count = Message.objects.filter(
-                    room__owner=owner,
-                    sender=client_user,
-                    receiver=request.user,
-                    read_status=False
-                ).count()
-                
-                try:
-                    profile_image = client_user.userprofile.get_profile_image()
-                except:
-                    profile_image = None
-                
-                conversations.append({
-                    'room_id': latest_message.room.id,
-                    'room_title': latest_message.room.title,
-                    'client_id': client_user.id,
-                    'room_location': latest_message.room.location,
-                    'client_name': client_user.get_full_name() or client_user.username,
-                    'profile_image': profile_image,
-                    'last_message': latest_message.content[:50] + ('...' if len(latest_message.content) > 50 else ''),
-                    'last_message_time': latest_message.timestamp.isoformat(),
-                     'unread_count': unread_count
-                })
-        
-        conversations.sort(key=lambda x: x['last_message_time'], reverse=True)
-        return JsonResponse({'conversations': conversations})
-        
+        version = get_version(request.user.pk, 'messages')
+        return JsonResponse({'conversations': owner_conversations(owner_id, request.user.pk, version)})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @login_required
 def book_room(request):
+    """Request a room, or cancel a pending request (see bookings.py)"""
     if request.method != 'POST':
         return JsonResponse({'error': 'POST required'}, status=405)
     
-    try:
-        client = request.user.client
-    except Client.DoesNotExist:
+    client_id = request.principal.client_id
+    if client_id is None:
         return JsonResponse({'error': 'Client account required'}, status=403)
     
     try:
         data = json.loads(request.body)
-        room_id = data.get('room_id')
-        room = get_object_or_404(Room, id=room_id)
-        
-        # Check if already booked
-        existing_booking = Booking.objects.filter(client=client, room=room).first()
-        
-        if existing_booking:
-            if existing_booking.status == 'pending':
-                # Cancel booking
-                existing_booking.status = 'cancelled'
-                existing_booking.save()
-                
-                # Send cancellation email to owner
-                try:
-                    send_mail(
-                        f'Booking Cancelled - {room.title}',
-                        f'''Dear {room.owner.user.get_full_name() or room.owner.user.username},
-
-A booking request has been cancelled for your property:
-
-Property: {room.title}
-Location: {room.location}
-Price: ₹{room.price}/month
-
-Client: {client.user.get_full_name() or client.user.username}
-Email: {client.user.email}
-
-The client has cancelled their booking request.
-
-Best regards,
-LuxeRooms Team''',
-                        settings.DEFAULT_FROM_EMAIL,
-                        [room.owner.user.email],
-                        fail_silently=False,
-                    )
-                except Exception as e:
-                    print(f'Email error: {e}')
-                
-                return JsonResponse({'success': True, 'action': 'cancelled', 'status': None})
-            elif existing_booking.status == 'cancelled':
-                # Reactivate booking
-                existing_booking.status = 'pending'
-                existing_booking.save()
-                
-                # Send email to owner
-                try:
-                    send_mail(
-                        f'New Booking Request - {room.title}',
-                        f'''Dear {room.owner.user.get_full_name() or room.owner.user.username},
-
-You have received a new booking request for your property:
-
-Property: {room.title}
-Location: {room.location}
-Price: ₹{room.price}/month
-
-Client Details:
-Name: {client.user.get_full_name() or client.user.username}
-Email: {client.user.email}
-Phone: {client.phone}
-
-Please contact the client to discuss availability and booking details.
-
-Best regards,
-LuxeRooms Team''',
-                        settings.DEFAULT_FROM_EMAIL,
-                        [room.owner.user.email],
-                        fail_silently=False,
-                    )
-                except Exception as e:
-                    print(f'Email error: {e}')
-                
-                return JsonResponse({'success': True, 'action': 'booked', 'status': 'pending'})
-            else:
-                return JsonResponse({'error': 'Booking already confirmed'}, status=400)
-        
-        # Create new booking
-        booking = Booking.objects.create(
-            client=client,
-            room=room,
-            owner=room.owner,
-            status='pending'
-        )
-        
-        # Send email to owner
-        try:
-            send_mail(
-                f'New Booking Request - {room.title}',
-                f'''Dear {room.owner.user.get_full_name() or room.owner.user.username},
-
-You have received a new booking request for your property:
-
-Property: {room.title}
-Location: {room.location}
-Price: ₹{room.price}/month
-
-Client Details:
-Name: {client.user.get_full_name() or client.user.username}
-Email: {client.user.email}
-Phone: {client.phone}
+        room = get_object_or_404(Room, id=data.get('room_id'))
+        status = request_booking(client_id, room)
+    except InvalidTransition:
+        return JsonResponse({'error': 'Booking already confirmed'}, status=400)
+    except Http404:
+        return JsonResponse({'error': 'Room not found'}, status=404)
+    except Exception as e:
+        logger.exception('Booking request failed')
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    if status == 'cancelled':
+        return JsonResponse({'success': True, 'action': 'cancelled', 'status': None})
+    return JsonResponse({'success': True, 'action': 'booked', 'status': status})
 
-Please contact the client to discuss availability and booking details.
+@login_required
+@query_budget(5)
+@versioned_etag('bookings')
+def get_owner_bookings(request):
+    """The owner's booking requests, pending first"""
+    owner_id = request.principal.owner_id
+    if owner_id is None:
+        return JsonResponse({'error': 'Owner account required'}, status=403)
+    
+    status = request.GET.get('status')
+    bookings = Booking.objects.filter(owner_id=owner_id)
+    if status:
+        bookings = bookings.filter(status=status)
+    bookings = bookings.order_by(
+        Case(When(status='pending', then=0), default=1, output_field=IntegerField()), '-created_at'
+    ).values(
+        'id', 'status', 'created_at', 'room_id', 'room__title',
+        'client__user__username', 'client__user__email', 'client__phone',
+    )
+    return JsonResponse({'bookings': [
+        {
+            'id': booking['id'],
+            'status': booking['status'],
+            'created_at': booking['created_at'].isoformat(),
+            'room_id': booking['room_id'],
+            'room_title': booking['room__title'],
+            'client_name': booking['client__user__username'],
+            'client_email': booking['client__user__email'],
+            'client_phone': booking['client__phone'],
+        }
+        for booking in bookings
+    ]})
 
-Best regards,
-LuxeRooms Team''',
-                settings.DEFAULT_FROM_EMAIL,
-                [room.owner.user.email],
-                fail_silently=False,
-            )
-        except Exception as e:
-            print(f'Email error: {e}')
-        
-        return JsonResponse({'success': True, 'action': 'booked', 'status': 'pending'})
-        
+@login_required
+@query_budget(12)
+def update_owner_bookings(request):
+    """Confirm or reject pending bookings: {"booking_ids": [...], "action": "confirm"|"reject"}"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    
+    owner_id = request.principal.owner_id
+    if owner_id is None:
+        return JsonResponse({'error': 'Owner account required'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        booking_ids = [int(booking_id) for booking_id in data.get('booking_ids', [])]
+        action = data.get('action')
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'booking_ids must be a list of ids'}, status=400)
+    if action not in OWNER_BOOKING_ACTIONS:
+        return JsonResponse({'error': 'action must be confirm or reject'}, status=400)
+    if not booking_ids or len(booking_ids) > MAX_BULK_BOOKINGS:
+        return JsonResponse({'error': f'Between 1 and {MAX_BULK_BOOKINGS} bookings per request'}, status=400)
+    
+    try:
+        # Bookings that aren't this owner's or are no longer pending are skipped
+        updated, skipped = owner_update_bookings(owner_id, booking_ids, action)
     except Exception as e:
+        logger.exception('Owner booking update failed')
         return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({'success': True, 'updated': updated, 'skipped': skipped})
 
 @login_required
+@versioned_etag('bookings')
 def get_booking_status(request, room_id):
+    client_id = request.principal.client_id
+    if client_id is None:
+        return JsonResponse({'has_booking': False, 'status': None})
+    
     try:
-        client = request.user.client
-        booking = Booking.objects.filter(client=client, room_id=room_id).first()
+        booking = Booking.objects.filter(client_id=client_id, room_id=room_id).first()
         
         if booking and booking.status != 'cancelled':
             return JsonResponse({'has_booking': True, 'status': booking.status})
         else:
             return JsonResponse({'has_booking': False, 'status': None})
             
-    except Client.DoesNotExist:
-        return JsonResponse({'has_booking': False, 'status': None})
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+def metrics(request):
+    """Prometheus scrape endpoint for RequestMetricsMiddleware"""
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        return HttpResponse(status=403)
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4')
\ No newline at end of file